@@ -4,7 +4,9 @@ import os
 
 # The root directory for copying files from, typically the `minecraft` folder of your instance.
 # The `os.path.expanduser` function handles the '~' character correctly.
-ROOT_COPY_PATH = os.path.expanduser("~/Library/Application Support/PrismLauncher/instances/dp2/minecraft")
+# Can be overridden with the DP2_ROOT_COPY_PATH environment variable, e.g. for benchmarks.
+ROOT_COPY_PATH = os.path.expanduser(os.environ.get(
+    "DP2_ROOT_COPY_PATH", "~/Library/Application Support/PrismLauncher/instances/dp2/minecraft"))
 
 # A list of additional directories and files to copy from the ROOT_COPY_PATH.
 # These will be copied to the current working directory.
@@ -15,6 +17,45 @@ ADDITIONAL_COPY_PATHS = [
     "global_packs"
 ]
 
+# How files are copied from the ROOT_COPY_PATH: "reflink" clones files where the
+# filesystem supports it, "hardlink" links them, and "copy" always copies.
+# Falls back to a plain copy. Only use "hardlink" if nothing edits the copies in
+# place, as the instance's own files would change too.
+COPY_MODE = "reflink"
+
+# Whether configs are canonicalised as they are copied: comments, blank lines
+# and whitespace are stripped from TOML, JSON, JSON5 and .cfg files, which are
+# rewritten in a stable form to shrink client downloads. Files that cannot be
+# canonicalised without changing their values are copied unchanged.
+CANONICALISE_CONFIGS = False
+
+# The copied directories whose files are canonicalised.
+CANONICALISE_DIRS = [
+    "config"
+]
+
+# Whether canonicalised TOML and JSON files have their keys sorted.
+CANONICALISE_SORT_KEYS = True
+
+# Whether resourcepack and datapack zips are repacked as they are copied:
+# entries are sorted and get a fixed timestamp, so identical contents always
+# give identical zips. Zips that cannot be read are copied unchanged.
+NORMALISE_PACKS = True
+
+# The copied directories whose zips are repacked.
+NORMALISE_PACK_DIRS = [
+    "resourcepacks",
+    "datapacks",
+    "global_packs"
+]
+
+# The deflate level repacked entries are compressed with, from 1 (fastest) to 9 (smallest).
+PACK_COMPRESS_LEVEL = 9
+
+# Entries left out of repacked zips, matched against every part of their path.
+# Leave empty to keep everything.
+PACK_JUNK_NAMES = ["__MACOSX", ".DS_Store", "Thumbs.db", "desktop.ini"]
+
 # Directories to sanitise the filenames from
 SANITISE_DIRS = [
     "resourcepacks",
@@ -35,12 +76,126 @@ UNKNOWN_MODS_DIR = "unknown-mods"
 CLIENT_PATCH_FILE = "client_patch.txt"
 SERVER_BLACKLIST_FILE = "server_blacklist.txt"
 
+# The directory holding persistent build state, such as the build manifest.
+BUILD_STATE_DIR = ".build"
+
+# The build manifest recording the source and output hashes of the last build,
+# used to only re-process the mods and files whose inputs changed.
+BUILD_MANIFEST_FILE = os.path.join(BUILD_STATE_DIR, "manifest.json")
+
+# The persistent cache of file hashes keyed on path, size, mtime and inode,
+# shared by every stage that needs to hash files.
+HASH_CACHE_FILE = os.path.join(BUILD_STATE_DIR, "hash_cache.json")
+
+# The number of threads used to hash files that are not in the hash cache.
+HASH_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+
+# The number of build stages that can run at once. Stages only run together
+# when they do not touch the same paths. Set to 1 to run them one by one.
+STAGE_WORKERS = 4
+
+# The Chrome trace file recording the timings of each stage of the last build.
+BUILD_TRACE_FILE = os.path.join(BUILD_STATE_DIR, "trace.json")
+
+# The directory the per-stage cProfile output is written to with --profile.
+PROFILE_DIR = os.path.join(BUILD_STATE_DIR, "profile")
+
+# The file the benchmark baseline is saved to and compared against.
+BENCHMARK_BASELINE_FILE = os.path.join(BUILD_STATE_DIR, "bench_baseline.json")
+
+# In watch mode, how long to wait for a burst of changes to settle before
+# rebuilding, and how often to scan for changes where inotify is unavailable.
+WATCH_DEBOUNCE = 0.3
+WATCH_POLL_INTERVAL = 1.0
+
+# A content-addressed store of downloaded mod jars, keyed by their download hash.
+CONTENT_STORE_DIR = os.path.join(BUILD_STATE_DIR, "store")
+
+# The download hashes already verified in full, and the URL each was verified at.
+VERIFIED_URLS_FILE = os.path.join(BUILD_STATE_DIR, "verified_urls.json")
+
+# Limits for verifying mod downloads: requests in flight overall and per host,
+# retries for failed requests and the timeout in seconds for each network read.
+VERIFY_CONCURRENCY = 32
+VERIFY_PER_HOST = 8
+VERIFY_RETRIES = 3
+VERIFY_TIMEOUT = 60
+
+# Where the server pack is exported to. Mod jars in it are hardlinks into the content store.
+SERVER_EXPORT_DIR = os.path.join(BUILD_STATE_DIR, "server")
+
+# The CurseForge CDN URL for mods without a download URL, formatted with the
+# first four and remaining digits of the file ID and the filename.
+CURSEFORGE_DOWNLOAD_URL = "https://mediafilez.forgecdn.net/files/{0}/{1}/{2}"
+
+# Published alongside pack.toml so clients can update from the index of the
+# release they have: a compressed copy of the current index, and a delta
+# manifest from each earlier release to the one after it.
+RELEASES_DIR = "releases"
+RELEASE_INDEX_FILE = os.path.join(RELEASES_DIR, "index.json.gz")
+RELEASE_DELTAS_DIR = os.path.join(RELEASES_DIR, "deltas")
+
+# How many releases back delta manifests are kept for. Older clients fall back
+# to the full compressed index.
+RELEASE_DELTA_HISTORY = 50
+
+# A single zip of every file in the index that is not a mod, published with
+# each release so a fresh install fetches one object instead of one per file,
+# and a manifest of the index hash of each bundled file to check it against.
+BUNDLE_FILE = os.path.join(RELEASES_DIR, "bundle.zip")
+BUNDLE_MANIFEST_FILE = os.path.join(RELEASES_DIR, "bundle.json")
+
+# The deflate level of bundled files, and the files already compressed, which
+# are stored as they are.
+BUNDLE_COMPRESS_LEVEL = 9
+BUNDLE_STORED_SUFFIXES = [".zip", ".jar", ".png", ".ogg"]
+
+# Where the signatures of the release files are written, each under the
+# signed file's own path with ".sig" added. pack.toml's signature stays in
+# SIG_FILE, where unsup looks for it.
+SIGNATURES_DIR = os.path.join(RELEASES_DIR, "signatures")
+
+# The cache of verified hashes verify_instance.py keeps inside each instance it
+# checks, so files that have not changed since the last check are not re-read.
+VERIFY_CACHE_NAME = ".pack-verify.json"
+
+# The directories of an instance the pack owns outright: any file in them that
+# the pack does not install is reported as extra.
+VERIFY_EXTRA_DIRS = ["mods"]
+
+# The mod ID and version index built from the metadata inside each mod jar,
+# cached so only new or changed jars are scanned.
+JAR_INDEX_FILE = os.path.join(BUILD_STATE_DIR, "jar_index.json")
+
+# Mod IDs that mods may depend on but are provided by the game or mod loader
+# rather than by a jar in the pack.
+JAR_PROVIDED_MOD_IDS = ["minecraft", "forge", "java", "fabricloader", "connector"]
+
+# Additional packs built from the same mods as the main pack, each written as a
+# packwiz pack to its own output directory. Files shared with the main pack are
+# hardlinked from it. A profile keeps the mods whose side is in "sides", leaving
+# out any listed by base filename in its optional "exclude_file".
+PROFILES = {
+    "server": {
+        "output": "profiles/server",
+        "sides": ["server", "both"],
+    },
+    "lite": {
+        "output": "profiles/lite",
+        "sides": ["client", "both"],
+        "exclude_file": "lite_exclude.txt",
+    },
+}
+
 # The name of the signature file.
 SIG_FILE = "unsup.sig"
 
 # The location of the signify secret key used for signing.
 SIGNIFY_SECRET_KEY = "sig/dp2.sec"
 
+# The unsup configuration holding the public key clients check pack.toml with.
+UNSUP_CONFIG_FILE = "unsup.ini"
+
 # The main packwiz configuration file to be signed.
 PACKWIZ_CONFIG_FILE = "pack.toml"
 
@@ -66,6 +221,8 @@ UNKNOWN_MODS_TOML_DATA = [
 
 # --- Scripts to run ---
 # A list of the python scripts to be run in order.
+# Scripts providing a `transform` function are applied in-process to the shared
+# .pw.toml model, which is written back once after the last script has run.
 SCRIPTS = [
     "strip_toml.py",
     "fix_urls.py",
@@ -76,4 +233,56 @@ SCRIPTS = [
 
 CLIENT_PATCH_FILE = "client_patch.txt"
 SERVER_PATCH_FILE = "server_patch.txt"
-SERVER_BLACKLIST_FILE = "server_blacklist.txt"
\ No newline at end of file
+SERVER_BLACKLIST_FILE = "server_blacklist.txt"
+
+# --- Side Rules ---
+# The patch lists applied by update_side.py, with the side each sets and its
+# priority. Every line is a pattern: a base filename, a glob such as
+# '*-shaders', or a regex with a 're:' prefix. A 'name:', 'modrinth:' or
+# 'curseforge:' prefix matches the mod's name or project ID instead.
+# When several rules match a mod, the highest priority wins.
+SIDE_RULE_FILES = [
+    (CLIENT_PATCH_FILE, "both", 10),
+    (SERVER_PATCH_FILE, "server", 20),
+    (SERVER_BLACKLIST_FILE, "client", 30),
+]
+
+# Further rules, one '<side> [priority] <pattern>' per line. Rules without a
+# priority have priority 0, below the patch lists.
+SIDE_RULES_FILE = "side_rules.txt"
+
+# Every file side rules are read from.
+SIDE_RULE_INPUTS = [path for path, _, _ in SIDE_RULE_FILES] + [SIDE_RULES_FILE]
+
+# Which rule set the side of each mod in the last build.
+SIDE_RULES_REPORT_FILE = os.path.join(BUILD_STATE_DIR, "side_rules.json")
+# Which entries were found duplicated across the repacked packs in the last build.
+PACK_DUPLICATES_REPORT_FILE = os.path.join(BUILD_STATE_DIR, "pack_duplicates.json")
+
+# The SQLite database recording the pack's mods and files at every build, for
+# pack_db.py queries such as which mods changed since a release.
+PACK_DB_FILE = os.path.join(BUILD_STATE_DIR, "pack.db")
+
+# --- Update Check ---
+# The Modrinth API check_updates.py asks for newer mod versions.
+MODRINTH_API_URL = os.environ.get("DP2_MODRINTH_API_URL", "https://api.modrinth.com/v2")
+
+# Cached API responses, and how many seconds they are used before being
+# revalidated with their ETag.
+UPDATE_CACHE_FILE = os.path.join(BUILD_STATE_DIR, "modrinth_cache.json")
+UPDATE_CACHE_TTL = 3600
+
+# The most file hashes looked up in one bulk request.
+UPDATE_BATCH_SIZE = 500
+
+# The updates found by the last update check.
+UPDATE_REPORT_FILE = os.path.join(BUILD_STATE_DIR, "updates.json")
+
+# --- Pack Server ---
+# The address and port serve_pack.py serves the pack and its jar cache on.
+SERVE_HOST = "0.0.0.0"
+SERVE_PORT = 8740
+
+# The URL clients reach serve_pack.py at, which the mod downloads it serves
+# point to. Defaults to this machine's host name and SERVE_PORT.
+SERVE_PUBLIC_URL = os.environ.get("DP2_SERVE_PUBLIC_URL")
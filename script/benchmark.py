@@ -0,0 +1,274 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import tempfile
+import platform
+import subprocess
+import tracemalloc
+import contextlib
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import (BENCHMARK_BASELINE_FILE, UNKNOWN_MODS_TOML_DATA, UNKNOWN_MODS_DIR, MODS_DIR,
+                    SOURCE_MODS_DIR_NAME, SANITISE_DIRS, CLIENT_PATCH_FILE, SERVER_PATCH_FILE,
+                    SERVER_BLACKLIST_FILE, PACKWIZ_CONFIG_FILE)
+from mod_model import load_mods
+import strip_toml
+import fix_urls
+import update_side
+import check_mods
+import sanitise_filenames
+
+# The pack sizes, in mods, benchmarked when no sizes are given.
+DEFAULT_SIZES = [400, 2000, 20000]
+
+# The shape of a generated pack relative to its mod count, modelled on ours:
+# roughly two config files per mod and a handful of resourcepack/datapack zips.
+CONFIG_FILES_PER_MOD = 2
+ZIPS_PER_DIR = 4
+ZIP_ENTRIES = 200
+UNKNOWN_JAR_SIZE = 256 * 1024
+
+MOD_TRANSFORMS = [strip_toml, fix_urls, update_side, check_mods]
+
+def random_id(rng, length=8):
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789') for _ in range(length))
+
+def make_pw_toml(rng, slug):
+    """
+    Returns the text of a .pw.toml file as PrismLauncher writes it: most are
+    Modrinth mods carrying the x-prismlauncher keys, the rest CurseForge mods,
+    and a few have URLs with characters fix_urls.py has to encode.
+    """
+    jar_name = f"{slug}-1.20.1-{rng.randint(1, 9)}.{rng.randint(0, 20)}.jar"
+    if rng.random() < 0.02:
+        jar_name = f"{slug} [Forge] 1.20.1.jar"
+    lines = [
+        f"filename = '{jar_name}'",
+        f"name = '{slug.replace('-', ' ').title()}'",
+        f"side = '{rng.choice(['both', 'both', 'both', 'client', 'server'])}'",
+        "x-prismlauncher-loaders = [ 'forge', 'neoforge' ]",
+        "x-prismlauncher-mc-versions = [",
+        "  '1.20',",
+        "  '1.20.1'",
+        "]",
+        "x-prismlauncher-release-type = 'release'",
+        "",
+        "[download]",
+    ]
+    if rng.random() < 0.7:
+        mod_id, version = random_id(rng), random_id(rng)
+        lines += [
+            f"hash = '{rng.getrandbits(512):0128x}'",
+            "hash-format = 'sha512'",
+            "mode = 'url'",
+            f"url = 'https://cdn.modrinth.com/data/{mod_id}/versions/{version}/{jar_name}'",
+            "",
+            "[update.modrinth]",
+            f"mod-id = '{mod_id}'",
+            f"version = '{version}'",
+        ]
+    else:
+        lines += [
+            f"hash = '{rng.getrandbits(160):040x}'",
+            "hash-format = 'sha1'",
+            "mode = 'metadata:curseforge'",
+            "",
+            "[update.curseforge]",
+            f"file-id = {rng.randint(1000000, 9999999)}",
+            f"project-id = {rng.randint(100000, 999999)}",
+        ]
+    return '\n'.join(lines) + '\n'
+
+def make_config_text(rng, extension):
+    """Returns a commented config file in the given format."""
+    keys = [random_id(rng, 10) for _ in range(rng.randint(5, 40))]
+    if extension == 'json':
+        return json.dumps({key: rng.randint(0, 1000) for key in keys}, indent=2)
+    if extension == 'cfg':
+        return ''.join(f"#Comment describing {key}\n{key}={rng.randint(0, 1000)}\n\n" for key in keys)
+    return ''.join(f"\t#Comment describing {key}\n\t{key} = {rng.randint(0, 1000)}\n" for key in keys)
+
+def make_zip(zip_path, rng):
+    """Writes a resourcepack style zip with small texture and model entries."""
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('pack.mcmeta', json.dumps({'pack': {'pack_format': 15, 'description': 'Benchmark'}}))
+        for i in range(ZIP_ENTRIES):
+            archive.writestr(f"assets/minecraft/textures/block/{i}.png", rng.randbytes(rng.randint(64, 2048)))
+
+def generate_pack(workdir, mod_count, seed=0):
+    """
+    Generates a synthetic PrismLauncher instance and pack directory shaped
+    like ours. Returns the instance path and the pack path.
+    """
+    rng = random.Random(seed)
+    instance_path = os.path.join(workdir, 'instance')
+    pack_path = os.path.join(workdir, 'pack')
+
+    index_path = os.path.join(instance_path, SOURCE_MODS_DIR_NAME)
+    os.makedirs(index_path)
+    slugs = [f"mod-{i:05d}-{random_id(rng, 4).lower()}" for i in range(mod_count)]
+    for slug in slugs:
+        with open(os.path.join(index_path, f"{slug}.pw.toml"), 'w') as f:
+            f.write(make_pw_toml(rng, slug))
+
+    for i in range(mod_count * CONFIG_FILES_PER_MOD):
+        extension = rng.choice(['toml', 'toml', 'cfg', 'json'])
+        config_path = os.path.join(instance_path, 'config', slugs[i % mod_count], f"{i}.{extension}")
+        os.makedirs(os.path.dirname(config_path), exist_ok=True)
+        with open(config_path, 'w') as f:
+            f.write(make_config_text(rng, extension))
+
+    for directory in SANITISE_DIRS:
+        os.makedirs(os.path.join(instance_path, directory))
+        for i in range(ZIPS_PER_DIR):
+            make_zip(os.path.join(instance_path, directory, f"Pack [{i}] v1.{i}.zip"), rng)
+
+    os.makedirs(os.path.join(pack_path, UNKNOWN_MODS_DIR))
+    for mod_data in UNKNOWN_MODS_TOML_DATA:
+        with open(os.path.join(pack_path, UNKNOWN_MODS_DIR, mod_data['filename']), 'wb') as f:
+            f.write(rng.randbytes(UNKNOWN_JAR_SIZE))
+
+    for patch_file, share in [(CLIENT_PATCH_FILE, 0.05), (SERVER_PATCH_FILE, 0.01), (SERVER_BLACKLIST_FILE, 0.01)]:
+        with open(os.path.join(pack_path, patch_file), 'w') as f:
+            f.write('\n'.join(rng.sample(slugs, max(1, int(mod_count * share)))))
+
+    shutil.copy(os.path.join(parent_dir, PACKWIZ_CONFIG_FILE), pack_path)
+    shutil.copy(os.path.join(parent_dir, '.packwizignore'), pack_path)
+    return instance_path, pack_path
+
+def measure(func):
+    """Runs a function, returning its wall time and peak Python memory use."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+def result(elapsed, peak, items):
+    return {'seconds': round(elapsed, 6), 'per_second': round(items / elapsed, 1) if elapsed else None,
+            'peak_bytes': peak}
+
+def bench_stages(instance_path, pack_path, mod_count):
+    """Benchmarks every mod transform and sanitise_filenames.py in-process."""
+    results = {}
+    cwd = os.getcwd()
+    os.chdir(pack_path)
+    try:
+        shutil.copytree(os.path.join(instance_path, SOURCE_MODS_DIR_NAME), MODS_DIR)
+        mods = []
+        elapsed, peak = measure(lambda: mods.extend(load_mods(MODS_DIR)))
+        results['load_mods'] = result(elapsed, peak, mod_count)
+
+        for module in MOD_TRANSFORMS:
+            elapsed, peak = measure(lambda: module.transform(mods))
+            results[module.__name__] = result(elapsed, peak, mod_count)
+
+        zip_count = 0
+        for directory in SANITISE_DIRS:
+            shutil.copytree(os.path.join(instance_path, directory), directory)
+            zip_count += len(os.listdir(directory))
+        elapsed, peak = measure(sanitise_filenames.main)
+        results['sanitise_filenames'] = result(elapsed, peak, zip_count)
+    finally:
+        os.chdir(cwd)
+        for directory in [MODS_DIR] + SANITISE_DIRS:
+            shutil.rmtree(os.path.join(pack_path, directory), ignore_errors=True)
+    return results
+
+def run_pipeline(instance_path, pack_path, extra_args):
+    """
+    Runs start.py against a generated pack in a child process. Returns its
+    wall time and peak resident memory in bytes.
+    """
+    env = dict(os.environ, DP2_ROOT_COPY_PATH=instance_path)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(parent_dir, 'start.py'), '--no-sign'] + extra_args,
+                               cwd=pack_path, env=env, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    if process.returncode != 0:
+        raise RuntimeError(f"start.py failed with exit code {process.returncode}")
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak = usage.ru_maxrss if platform.system() == 'Darwin' else usage.ru_maxrss * 1024
+    return elapsed, peak
+
+def bench_pipeline(instance_path, pack_path, mod_count):
+    """Benchmarks a clean full build followed by a no-change incremental build."""
+    results = {}
+    elapsed, peak = run_pipeline(instance_path, pack_path, ['--clean'])
+    results['pipeline_clean'] = result(elapsed, peak, mod_count)
+    elapsed, peak = run_pipeline(instance_path, pack_path, [])
+    results['pipeline_incremental'] = result(elapsed, peak, mod_count)
+    return results
+
+def print_results(results, baseline):
+    """Prints the results, with the change in time against the baseline if there is one."""
+    print(f"\n{'Size':>6} {'Benchmark':<22} {'Seconds':>9} {'Items/s':>10} {'Peak MiB':>9} {'vs baseline':>12}")
+    for size, benchmarks in results.items():
+        for name, values in benchmarks.items():
+            previous = baseline.get(size, {}).get(name)
+            change = '-'
+            if previous and previous['seconds']:
+                change = f"{(values['seconds'] - previous['seconds']) / previous['seconds']:+.1%}"
+            per_second = values['per_second'] if values['per_second'] is not None else '-'
+            print(f"{size:>6} {name:<22} {values['seconds']:>9.3f} {per_second:>10} "
+                  f"{values['peak_bytes'] / (1024 * 1024):>9.1f} {change:>12}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the pipeline against synthetic packs.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help="The pack sizes to benchmark, in mods.")
+    parser.add_argument('--stages-only', action='store_true', help="Skip the full pipeline benchmarks.")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help=f"Save the results as the baseline in '{BENCHMARK_BASELINE_FILE}'.")
+    parser.add_argument('--output', help="Also write the results to this JSON file.")
+    parser.add_argument('--keep', action='store_true', help="Keep the generated packs.")
+    args = parser.parse_args()
+
+    baseline_path = os.path.join(parent_dir, BENCHMARK_BASELINE_FILE)
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+
+    results = {}
+    for size in sorted(args.sizes):
+        workdir = tempfile.mkdtemp(prefix=f"dp2-bench-{size}-")
+        try:
+            print(f"Generating a pack with {size} mods in {workdir}...")
+            instance_path, pack_path = generate_pack(workdir, size)
+            print(f"Benchmarking {size} mods...")
+            results[str(size)] = bench_stages(instance_path, pack_path, size)
+            if not args.stages_only:
+                results[str(size)].update(bench_pipeline(instance_path, pack_path, size))
+        finally:
+            if not args.keep:
+                shutil.rmtree(workdir)
+
+    print_results(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(baseline_path), exist_ok=True)
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=1)
+        print(f"\nSaved the baseline to {baseline_path}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import os
+import sys
+import json
+import hashlib
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+import config
+from config import BUILD_MANIFEST_FILE, SCRIPTS, SIDE_RULE_INPUTS
+
+# Bump this whenever the manifest layout changes so old manifests are discarded.
+MANIFEST_VERSION = 2
+
+def hash_bytes(data):
+    """Returns the SHA256 hex digest of some bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+def hash_text(text):
+    """Returns the SHA256 hex digest of some text, encoded as UTF-8."""
+    return hash_bytes(text.encode('utf-8'))
+
+def hash_file(file_path):
+    """Returns the SHA256 hex digest of a file's contents."""
+    sha256_hash = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for byte_block in iter(lambda: f.read(1024 * 1024), b""):
+            sha256_hash.update(byte_block)
+    return sha256_hash.hexdigest()
+
+def config_fingerprint():
+    """
+    Returns a hash of everything besides the source files that affects the
+    build output: the script list and sources, the side rule files and the
+    unknown mods configuration. If this changes, every mod is rebuilt.
+    """
+    fingerprint = hashlib.sha256()
+    fingerprint.update(json.dumps({
+        'scripts': SCRIPTS,
+        'unknown_mods': config.UNKNOWN_MODS_TOML_DATA,
+        'unknown_mods_url_base': config.UNKNOWN_MODS_URL_BASE,
+    }, sort_keys=True).encode('utf-8'))
+
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    inputs = [os.path.join(script_dir, script) for script in SCRIPTS]
+    # Modules the scripts build on
+    inputs += [os.path.join(script_dir, module) for module in ('mod_model.py', 'pw_toml.py', 'side_rules.py')]
+    inputs += SIDE_RULE_INPUTS
+    for file_path in inputs:
+        fingerprint.update(file_path.encode('utf-8'))
+        if os.path.exists(file_path):
+            fingerprint.update(hash_file(file_path).encode('utf-8'))
+
+    return fingerprint.hexdigest()
+
+def empty_manifest():
+    return {'version': MANIFEST_VERSION, 'config': None, 'mods': {}}
+
+def load_manifest(manifest_path=BUILD_MANIFEST_FILE):
+    """
+    Loads the build manifest, returning an empty one if it is missing,
+    unreadable or was written by an older version of the pipeline.
+    """
+    if not os.path.exists(manifest_path):
+        return empty_manifest()
+
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read build manifest '{manifest_path}': {e}. Rebuilding everything.")
+        return empty_manifest()
+
+    if manifest.get('version') != MANIFEST_VERSION:
+        return empty_manifest()
+    return manifest
+
+def save_manifest(manifest, manifest_path=BUILD_MANIFEST_FILE):
+    """Writes the build manifest atomically."""
+    os.makedirs(os.path.dirname(manifest_path) or '.', exist_ok=True)
+    tmp_path = manifest_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+def is_up_to_date(record, source_hash, dest_path):
+    """
+    Checks whether an output recorded in the manifest is still valid for the
+    given source hash. The destination file must exist with the recorded
+    size and mtime, so hand edits to the output are picked up too.
+    """
+    if record is None or record.get('source') != source_hash:
+        return False
+    try:
+        stat = os.stat(dest_path)
+    except OSError:
+        return False
+    return stat.st_size == record.get('size') and stat.st_mtime_ns == record.get('mtime')
+
+def make_record(source_hash, dest_path, output_hash):
+    """Builds a manifest record for an output that has just been written."""
+    stat = os.stat(dest_path)
+    return {'source': source_hash, 'output': output_hash, 'size': stat.st_size, 'mtime': stat.st_mtime_ns}
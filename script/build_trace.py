@@ -0,0 +1,141 @@
+import os
+import re
+import sys
+import json
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import BUILD_TRACE_FILE, PROFILE_DIR
+
+class Stage:
+    """The measurements of a single pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.start = 0.0
+        self.wall_time = 0.0
+        self.cpu_time = 0.0
+        self.files_read = 0
+        self.files_written = 0
+        self.bytes_hashed = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.thread = 0
+
+    @property
+    def cache_hit_rate(self):
+        lookups = self.cache_hits + self.cache_misses
+        return self.cache_hits / lookups if lookups else None
+
+    def to_dict(self):
+        return {
+            'wall_time': round(self.wall_time, 6),
+            'cpu_time': round(self.cpu_time, 6),
+            'files_read': self.files_read,
+            'files_written': self.files_written,
+            'bytes_hashed': self.bytes_hashed,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+            'cache_hit_rate': self.cache_hit_rate,
+        }
+
+class BuildTrace:
+    """
+    Records the wall time, CPU time, file counts and hash cache activity of
+    each pipeline stage, and writes them out as a Chrome trace file that can
+    be loaded in chrome://tracing or Perfetto. With profiling enabled, every
+    stage also runs under cProfile.
+    """
+
+    def __init__(self, hash_cache=None, profile=False):
+        self.hash_cache = hash_cache
+        self.profile = profile
+        self.stages = []
+        self.origin = time.perf_counter()
+        self.lock = threading.Lock()
+        # Each thread that runs stages gets its own track in the trace
+        self.threads = {}
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Times the enclosed block as a stage. The yielded Stage can be used to
+        record the files the stage read and wrote.
+        """
+        stage = Stage(name)
+        cache = self.hash_cache
+        # Stages run side by side, so only this thread's CPU time and hashing are counted,
+        # along with the hash pool's CPU time spent on this thread's behalf
+        cache_before = cache.thread_totals() if cache else (0, 0, 0, 0.0)
+        profiler = cProfile.Profile() if self.profile else None
+
+        stage.start = time.perf_counter() - self.origin
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        if profiler:
+            profiler.enable()
+        try:
+            yield stage
+        finally:
+            if profiler:
+                profiler.disable()
+            stage.cpu_time = time.thread_time() - cpu_start
+            stage.wall_time = time.perf_counter() - wall_start
+            if cache:
+                hits, misses, bytes_hashed, pool_cpu_time = cache.thread_totals()
+                stage.cache_hits = hits - cache_before[0]
+                stage.cache_misses = misses - cache_before[1]
+                stage.bytes_hashed = bytes_hashed - cache_before[2]
+                stage.cpu_time += pool_cpu_time - cache_before[3]
+            with self.lock:
+                stage.thread = self.threads.setdefault(threading.get_ident(), len(self.threads))
+                self.stages.append(stage)
+            if profiler:
+                self.write_profile(stage.name, profiler)
+
+    def write_profile(self, name, profiler):
+        """Dumps a stage's profile to the profile directory."""
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        profile_path = os.path.join(PROFILE_DIR, re.sub(r'[^\w.-]+', '_', name) + '.prof')
+        pstats.Stats(profiler).dump_stats(profile_path)
+
+    def write(self, trace_path=BUILD_TRACE_FILE):
+        """Writes the recorded stages as a Chrome trace file."""
+        events = []
+        for stage in self.stages:
+            events.append({
+                'name': stage.name,
+                'cat': 'stage',
+                'ph': 'X',
+                'ts': round(stage.start * 1e6),
+                'dur': round(stage.wall_time * 1e6),
+                'pid': os.getpid(),
+                'tid': stage.thread,
+                'args': stage.to_dict(),
+            })
+
+        os.makedirs(os.path.dirname(trace_path) or '.', exist_ok=True)
+        with open(trace_path, 'w') as f:
+            json.dump({
+                'traceEvents': events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'total_wall_time': round(time.perf_counter() - self.origin, 6)},
+            }, f, indent=1)
+
+    def print_summary(self):
+        """Prints a table of every stage's wall and CPU time."""
+        print(f"\n{'Stage':<28} {'Wall (s)':>9} {'CPU (s)':>9} {'Read':>6} {'Written':>8} {'Cache hits':>11}")
+        for stage in sorted(self.stages, key=lambda stage: stage.start):
+            hit_rate = stage.cache_hit_rate
+            hits = f"{hit_rate:.0%}" if hit_rate is not None else "-"
+            print(f"{stage.name:<28} {stage.wall_time:>9.3f} {stage.cpu_time:>9.3f} "
+                  f"{stage.files_read:>6} {stage.files_written:>8} {hits:>11}")
@@ -0,0 +1,240 @@
+import os
+import re
+import sys
+import json
+import toml
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import CANONICALISE_SORT_KEYS
+from build_manifest import hash_bytes, is_up_to_date, make_record
+from sync_tree import copy_file
+
+# Bump when the canonical output changes, so every config is rewritten.
+CANONICAL_VERSION = 3
+
+BARE_KEY = re.compile(r'^[A-Za-z0-9_-]+$')
+
+class CanonicaliseError(Exception):
+    """Raised when a file cannot be canonicalised without changing its meaning."""
+
+def toml_key(key):
+    return key if BARE_KEY.match(key) else toml_string(key)
+
+def toml_string(value):
+    # JSON string escapes are valid TOML basic string escapes, apart from DEL
+    return json.dumps(value, ensure_ascii=False).replace('\x7f', '\\u007f')
+
+def toml_value(value):
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    if isinstance(value, str):
+        return toml_string(value)
+    if isinstance(value, list):
+        return '[' + ','.join(toml_value(item) for item in value) + ']'
+    if isinstance(value, dict):
+        return '{' + ','.join(f"{toml_key(key)}={toml_value(item)}" for key, item in sort_items(value)) + '}'
+    raise CanonicaliseError(f"unsupported TOML value {value!r}")
+
+def is_table_array(value):
+    return isinstance(value, list) and value and all(isinstance(item, dict) for item in value)
+
+def sort_items(table):
+    return sorted(table.items()) if CANONICALISE_SORT_KEYS else list(table.items())
+
+def emit_toml_table(table, path, lines):
+    """Emits a table's values, then its sub-tables and arrays of tables, under `path`."""
+    for key, value in sort_items(table):
+        if not isinstance(value, dict) and not is_table_array(value):
+            lines.append(f"{toml_key(key)}={toml_value(value)}")
+    for key, value in sort_items(table):
+        sub_path = path + [toml_key(key)]
+        if isinstance(value, dict):
+            lines.append(f"[{'.'.join(sub_path)}]")
+            emit_toml_table(value, sub_path, lines)
+        elif is_table_array(value):
+            for item in value:
+                lines.append(f"[[{'.'.join(sub_path)}]]")
+                emit_toml_table(item, sub_path, lines)
+
+def canonical_toml(text):
+    data = toml.loads(text)
+    lines = []
+    emit_toml_table(data, [], lines)
+    output = '\n'.join(lines) + '\n'
+    if toml.loads(output) != data:
+        raise CanonicaliseError("the canonical TOML does not parse to the same values")
+    return output
+
+def skip_json5_space(text, i):
+    """Returns the index of the first character at or after i that is not whitespace or part of a comment."""
+    while i < len(text):
+        if text[i].isspace():
+            i += 1
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = len(text) if end == -1 else end
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            if end == -1:
+                raise CanonicaliseError("unterminated comment")
+            i = end + 2
+        else:
+            break
+    return i
+
+def is_trailing_comma(text, i):
+    """Checks whether the comma at i is followed by nothing but whitespace and comments before a ']' or '}'."""
+    end = skip_json5_space(text, i + 1)
+    return end < len(text) and text[end] in ']}'
+
+def strip_json5(text):
+    """Removes comments and trailing commas outside strings, leaving plain JSON where the rest of the file allows."""
+    output = []
+    i = 0
+    quote = None
+    while i < len(text):
+        char = text[i]
+        if quote:
+            output.append(char)
+            if char == '\\':
+                output.append(text[i + 1:i + 2])
+                i += 1
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+            output.append(char)
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = len(text) if end == -1 else end
+            continue
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            if end == -1:
+                raise CanonicaliseError("unterminated comment")
+            i = end + 2
+            continue
+        elif char == ',' and is_trailing_comma(text, i):
+            # Trailing commas are dropped
+            pass
+        else:
+            output.append(char)
+        i += 1
+    return ''.join(output)
+
+def reject_duplicate_keys(pairs):
+    keys = [key for key, _ in pairs]
+    if len(keys) != len(set(keys)):
+        raise CanonicaliseError("duplicate keys")
+    return dict(pairs)
+
+def canonical_json(text):
+    try:
+        data = json.loads(text, object_pairs_hook=reject_duplicate_keys)
+    except ValueError:
+        # Many mods read JSON leniently, with comments and trailing commas
+        data = json.loads(strip_json5(text), object_pairs_hook=reject_duplicate_keys)
+    # Numbers too large for a float would come out as Infinity, which is not
+    # JSON, so such files are left as they are
+    return json.dumps(data, ensure_ascii=False, sort_keys=CANONICALISE_SORT_KEYS, separators=(',', ':'),
+                      allow_nan=False) + '\n'
+
+def canonical_cfg(text):
+    """
+    Strips comment lines, blank lines and trailing whitespace from a Forge
+    style .cfg file. Lines inside '<' ... '>' list blocks are values, so they
+    are kept as they are.
+    """
+    lines = []
+    in_list = False
+    for line in text.splitlines():
+        stripped = line.strip()
+        if in_list:
+            in_list = stripped != '>'
+            lines.append(line.rstrip())
+        elif stripped and not stripped.startswith('#'):
+            in_list = stripped.endswith('<')
+            lines.append(line.rstrip())
+    return '\n'.join(lines) + '\n'
+
+CANONICALISERS = {
+    '.toml': canonical_toml,
+    '.json': canonical_json,
+    '.json5': canonical_json,
+    '.cfg': canonical_cfg,
+}
+
+def canonicalise(file_path, text):
+    """Returns the canonical text of a config file, raising CanonicaliseError if it cannot be canonicalised."""
+    canonicaliser = CANONICALISERS[os.path.splitext(file_path)[1].lower()]
+    try:
+        return canonicaliser(text)
+    except (ValueError, TypeError, IndexError, RecursionError, toml.TomlDecodeError) as e:
+        raise CanonicaliseError(str(e))
+
+class ConfigCanonicaliser:
+    """
+    A converter for sync_tree that writes canonical config files instead of
+    copying them: comments and whitespace are stripped and keys are sorted
+    where the format allows. Outputs are recorded in the build manifest
+    against their source hash so unchanged sources are skipped, and files are
+    only rewritten if their canonical text changed, so edits that change
+    nothing semantically leave the output and its hash alone.
+    """
+
+    # The build manifest key the records are kept under.
+    MANIFEST_KEY = 'configs'
+
+    def __init__(self, hash_cache, records):
+        self.hash_cache = hash_cache
+        self.records = records
+        self.canonicalised = 0
+        self.failed = 0
+
+    def handles(self, rel_path):
+        return os.path.splitext(rel_path)[1].lower() in CANONICALISERS
+
+    def source_key(self, source_path):
+        return f"{CANONICAL_VERSION}:{int(CANONICALISE_SORT_KEYS)}:{self.hash_cache.hash_file(source_path)}"
+
+    def is_up_to_date(self, source_path, dest_path):
+        record = self.records.get(os.path.normpath(dest_path))
+        return is_up_to_date(record, self.source_key(source_path), dest_path)
+
+    def report(self):
+        if self.canonicalised or self.failed:
+            print(f"Canonicalised {self.canonicalised} configs ({self.failed} copied unchanged).")
+
+    def convert(self, source_path, dest_path):
+        """Writes the canonical form of a file, copying it unchanged if it cannot be canonicalised."""
+        with open(source_path, 'rb') as f:
+            data = f.read()
+        try:
+            output = canonicalise(source_path, data.decode('utf-8-sig')).encode('utf-8')
+            self.canonicalised += 1
+        except (UnicodeDecodeError, CanonicaliseError) as e:
+            print(f"Warning: Copying '{source_path}' unchanged, it could not be canonicalised: {e}")
+            output = None
+            self.failed += 1
+
+        if output is None:
+            copy_file(source_path, dest_path)
+            output = data
+        else:
+            existing = None
+            if os.path.isfile(dest_path):
+                with open(dest_path, 'rb') as f:
+                    existing = f.read()
+            if existing != output:
+                os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+                with open(dest_path, 'wb') as f:
+                    f.write(output)
+        self.records[os.path.normpath(dest_path)] = make_record(self.source_key(source_path), dest_path,
+                                                                hash_bytes(output))
@@ -1,6 +1,16 @@
 import os
+import sys
 import toml
 
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import MODS_DIR
+from mod_model import load_mods
+
 ## Updated Check for Malformed URLs
 
 def check_for_malformed_url(file_path, data):
@@ -47,33 +57,35 @@ def check_for_missing_keys(file_path, data):
 
 ## Main Logic
 
-def main():
-    mods_dir = 'mods'
-    
-    if not os.path.exists(mods_dir):
-        print(f"Error: The directory '{mods_dir}' does not exist.")
-        return
-
-    for filename in os.listdir(mods_dir):
-        if filename.endswith('.pw.toml'):
-            file_path = os.path.join(mods_dir, filename)
-            print(f"Checking {file_path}...")
+def transform(mods):
+    """
+    Runs all checks against every loaded .pw.toml file. Nothing is modified.
+    """
+    for mod in mods:
+        file_path = mod.path
+        print(f"Checking {file_path}...")
+        
+        try:
+            data = mod.data
             
-            try:
-                with open(file_path, 'r') as file:
-                    data = toml.load(file)
-                
-                # Run all checks
-                issues = check_for_missing_keys(file_path, data)
-                if not issues:
-                    check_for_malformed_url(file_path, data)
-
-            except toml.TomlDecodeError as e:
-                print(f"Error parsing TOML in {file_path}: {e}")
-            except Exception as e:
-                print(f"An unexpected error occurred with {file_path}: {e}")
+            # Run all checks
+            issues = check_for_missing_keys(file_path, data)
+            if not issues:
+                check_for_malformed_url(file_path, data)
+
+        except toml.TomlDecodeError as e:
+            print(f"Error parsing TOML in {file_path}: {e}")
+        except Exception as e:
+            print(f"An unexpected error occurred with {file_path}: {e}")
             
     print("Finished checking all files.")
 
+def main():
+    if not os.path.exists(MODS_DIR):
+        print(f"Error: The directory '{MODS_DIR}' does not exist.")
+        return
+
+    transform(load_mods(MODS_DIR))
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
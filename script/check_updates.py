@@ -0,0 +1,258 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+import toml
+from urllib.parse import quote
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import (MODS_DIR, PACKWIZ_CONFIG_FILE, ROOT_COPY_PATH, SOURCE_MODS_DIR_NAME, MODRINTH_API_URL,
+                    UPDATE_CACHE_FILE, UPDATE_CACHE_TTL, UPDATE_BATCH_SIZE, UPDATE_REPORT_FILE,
+                    VERIFY_PER_HOST, VERIFY_RETRIES, VERIFY_TIMEOUT)
+from mod_model import load_mods, write_mods
+from http_client import HttpClient, HttpError, with_retries
+
+# Modrinth asks API clients for a user agent that identifies them.
+USER_AGENT = 'ubkh/diggerpack2 (update check)'
+
+# Hash formats the bulk version_files lookup accepts.
+BULK_HASH_FORMATS = ('sha1', 'sha512')
+
+class ResponseCache:
+    """
+    A persistent cache of API responses keyed on the request. Responses
+    younger than the TTL are used without a request; older ones are
+    revalidated with their ETag, so an unchanged response costs a 304.
+    """
+
+    def __init__(self, cache_path=UPDATE_CACHE_FILE, ttl=UPDATE_CACHE_TTL):
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self.entries = {}
+        self.fresh = 0
+        self.revalidated = 0
+        self.fetched = 0
+        if os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Warning: Could not read update cache '{cache_path}': {e}. Starting empty.")
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f, separators=(',', ':'), sort_keys=True)
+        os.replace(tmp_path, self.cache_path)
+
+    @staticmethod
+    def key(method, url, body):
+        return f"{method} {url} {hashlib.sha256(body or b'').hexdigest()}"
+
+    async def request(self, client, method, url, body=None, refresh=False):
+        """Returns the parsed JSON response to a request, from the cache where it is still valid."""
+        key = self.key(method, url, body)
+        entry = self.entries.get(key)
+        if entry is not None and not refresh and time.time() - entry['fetched'] < self.ttl:
+            self.fresh += 1
+            return entry['body']
+
+        headers = {'Accept': 'application/json'}
+        if body is not None:
+            headers['Content-Type'] = 'application/json'
+        if entry is not None and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+
+        async def send():
+            async with client.request(method, url, headers, body) as response:
+                return response.status, response.headers.get('etag'), await response.read()
+
+        status, etag, data = await with_retries(send, VERIFY_RETRIES)
+        if status == 304 and entry is not None:
+            self.revalidated += 1
+            entry['fetched'] = time.time()
+            return entry['body']
+        if status != 200:
+            raise HttpError(f"HTTP {status} for {method} {url}")
+        self.fetched += 1
+        result = json.loads(data)
+        self.entries[key] = {'etag': etag, 'fetched': time.time(), 'body': result}
+        return result
+
+def pack_versions(pack_root='.'):
+    """Returns the Minecraft version and the mod loaders named in pack.toml."""
+    with open(os.path.join(pack_root, PACKWIZ_CONFIG_FILE), 'r') as f:
+        versions = toml.load(f).get('versions', {})
+    loaders = sorted(name for name in versions if name != 'minecraft')
+    return versions.get('minecraft'), loaders
+
+def modrinth_mods(mods):
+    """
+    Returns the mods that update from Modrinth, split into those that can be
+    looked up in bulk by the hash of their current file, grouped by hash
+    format, and the rest, which are looked up by project.
+    """
+    by_hash = {hash_format: {} for hash_format in BULK_HASH_FORMATS}
+    by_project = []
+    for mod in mods:
+        modrinth = mod.data.get('update', {}).get('modrinth', {})
+        if not modrinth.get('mod-id'):
+            continue
+        download = mod.data.get('download', {})
+        hash_format = download.get('hash-format', '')
+        if hash_format in by_hash and download.get('hash'):
+            by_hash[hash_format][download['hash'].lower()] = mod
+        else:
+            by_project.append(mod)
+    return by_hash, by_project
+
+def matches_pack(version, game_version, loaders):
+    return game_version in version.get('game_versions', []) and bool(set(loaders) & set(version.get('loaders', [])))
+
+async def latest_by_hash(client, cache, hashes, hash_format, game_version, loaders, refresh):
+    """Looks up the latest compatible version of every file hash, UPDATE_BATCH_SIZE hashes per request."""
+    hashes = sorted(hashes)
+    batches = [hashes[i:i + UPDATE_BATCH_SIZE] for i in range(0, len(hashes), UPDATE_BATCH_SIZE)]
+    results = await asyncio.gather(*(
+        cache.request(client, 'POST', f"{MODRINTH_API_URL}/version_files/update", json.dumps({
+            'hashes': batch, 'algorithm': hash_format, 'loaders': loaders, 'game_versions': [game_version],
+        }, sort_keys=True).encode('utf-8'), refresh)
+        for batch in batches
+    ))
+    latest = {}
+    for result in results:
+        latest.update(result)
+    return latest
+
+async def latest_by_project(client, cache, mod, game_version, loaders, refresh):
+    """Looks up the latest compatible version of a single project."""
+    project_id = mod.data['update']['modrinth']['mod-id']
+    query = f"loaders={quote(json.dumps(loaders))}&game_versions={quote(json.dumps([game_version]))}"
+    versions = await cache.request(client, 'GET', f"{MODRINTH_API_URL}/project/{quote(project_id)}/version?{query}",
+                                   refresh=refresh)
+    return max(versions, key=lambda version: version.get('date_published', ''), default=None)
+
+async def find_updates(mods, game_version, loaders, refresh=False):
+    """
+    Finds mods with a newer compatible version on Modrinth. All lookups run
+    concurrently on one pooled client, so the whole pack takes about one
+    round trip. Returns a list of (mod, latest version) and the number of
+    mods checked.
+    """
+    by_hash, by_project = modrinth_mods(mods)
+    cache = ResponseCache()
+    async with HttpClient(max_per_host=VERIFY_PER_HOST, timeout=VERIFY_TIMEOUT, user_agent=USER_AGENT) as client:
+        bulk_formats = [hash_format for hash_format in BULK_HASH_FORMATS if by_hash[hash_format]]
+        results = await asyncio.gather(
+            *(latest_by_hash(client, cache, by_hash[hash_format], hash_format, game_version, loaders, refresh)
+              for hash_format in bulk_formats),
+            *(latest_by_project(client, cache, mod, game_version, loaders, refresh) for mod in by_project),
+        )
+    cache.save()
+    print(f"Update cache: {cache.fresh} fresh, {cache.revalidated} revalidated, {cache.fetched} fetched.")
+
+    latest = []
+    for hash_format, result in zip(bulk_formats, results):
+        latest += [(mod, result.get(digest)) for digest, mod in by_hash[hash_format].items()]
+    latest += list(zip(by_project, results[len(bulk_formats):]))
+
+    updates = []
+    for mod, version in latest:
+        if version is None or not matches_pack(version, game_version, loaders):
+            continue
+        if version.get('id') != mod.data['update']['modrinth'].get('version'):
+            updates.append((mod, version))
+    updates.sort(key=lambda update: update[0].filename)
+    return updates, len(latest)
+
+def primary_file(version):
+    files = version.get('files', [])
+    return next((file for file in files if file.get('primary')), files[0] if files else None)
+
+def apply_update(mod, version):
+    """Points a .pw.toml file at a new version. Returns False if the version has no usable file."""
+    file = primary_file(version)
+    if file is None:
+        return False
+    download = mod.data.setdefault('download', {})
+    hash_format = download.get('hash-format') if download.get('hash-format') in file.get('hashes', {}) else 'sha512'
+    if hash_format not in file.get('hashes', {}):
+        return False
+    mod.data['filename'] = file['filename']
+    download['url'] = file['url']
+    download['hash-format'] = hash_format
+    download['hash'] = file['hashes'][hash_format]
+    mod.data['update']['modrinth']['version'] = version['id']
+    mod.save_data()
+    return True
+
+def write_report(updates, report_path=UPDATE_REPORT_FILE):
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump([{
+            'mod': mod.filename,
+            'current': mod.data.get('filename'),
+            'latest': (primary_file(version) or {}).get('filename'),
+            'version': version.get('version_number'),
+            'version_id': version.get('id'),
+        } for mod, version in updates], f, indent=1)
+
+def check_updates(mods, pack_root='.', refresh=False):
+    """Checks the mods for updates, printing and writing a report. Returns the updates found."""
+    game_version, loaders = pack_versions(pack_root)
+    if not game_version or not loaders:
+        print(f"Error: {PACKWIZ_CONFIG_FILE} does not name a Minecraft version and a mod loader.")
+        exit(1)
+
+    start = time.perf_counter()
+    try:
+        updates, checked = asyncio.run(find_updates(mods, game_version, loaders, refresh))
+    except (HttpError, OSError, asyncio.TimeoutError, ValueError) as e:
+        print(f"Error: Could not check for updates: {e}")
+        exit(1)
+
+    for mod, version in updates:
+        print(f"  {mod.data.get('filename')} -> {(primary_file(version) or {}).get('filename')} "
+              f"({version.get('version_number')})")
+    print(f"{len(updates)} of {checked} Modrinth mods have updates for Minecraft {game_version} "
+          f"({', '.join(loaders)}), checked in {time.perf_counter() - start:.2f}s.")
+    write_report(updates)
+    return updates
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the pack's Modrinth mods for updates.")
+    parser.add_argument("--apply", action="store_true",
+                        help="Update the source .pw.toml files in the instance, picked up by the next build.")
+    parser.add_argument("--refresh", action="store_true", help="Revalidate every cached response.")
+    args = parser.parse_args()
+
+    if not os.path.exists(MODS_DIR):
+        print(f"Error: The directory '{MODS_DIR}' does not exist.")
+        exit(1)
+
+    updates = check_updates(load_mods(MODS_DIR), refresh=args.refresh)
+    if not args.apply or not updates:
+        return
+
+    # The built .pw.toml files are regenerated from the instance's, so the bumps go there
+    source_mods = {mod.filename: mod for mod in load_mods(os.path.join(ROOT_COPY_PATH, SOURCE_MODS_DIR_NAME))}
+    applied = []
+    for mod, version in updates:
+        source_mod = source_mods.get(mod.filename)
+        if source_mod is None or not apply_update(source_mod, version):
+            print(f"Warning: Could not apply the update of {mod.filename}.")
+            continue
+        applied.append(source_mod)
+    print(f"Updated {write_mods(applied)} source .pw.toml files. Rebuild to pick them up.")
+
+if __name__ == "__main__":
+    main()
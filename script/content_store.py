@@ -0,0 +1,93 @@
+import os
+import sys
+import uuid
+import stat
+import hashlib
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import CONTENT_STORE_DIR, COPY_MODE
+from sync_tree import copy_file
+
+# Stored files are read-only, as exports hardlink them into place.
+STORED_FILE_MODE = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+
+class HashMismatchError(Exception):
+    """Raised when content written to the store does not match its expected hash."""
+
+class StoreWriter:
+    """
+    Streams content into the store. The content is hashed as it is written
+    and only moved into place by commit() if the hash matches.
+    """
+
+    def __init__(self, store, algorithm, digest):
+        self.store = store
+        self.algorithm = algorithm
+        self.digest = digest.lower()
+        self.hash = hashlib.new(algorithm)
+        self.size = 0
+        os.makedirs(store.tmp_dir, exist_ok=True)
+        self.tmp_path = os.path.join(store.tmp_dir, uuid.uuid4().hex)
+        self.file = open(self.tmp_path, 'wb')
+
+    def write(self, data):
+        self.hash.update(data)
+        self.size += len(data)
+        self.file.write(data)
+
+    def commit(self):
+        """Moves the content into the store, returning its path."""
+        self.file.close()
+        actual = self.hash.hexdigest()
+        if actual != self.digest:
+            os.remove(self.tmp_path)
+            raise HashMismatchError(f"expected {self.algorithm} {self.digest}, got {actual}")
+        dest_path = self.store.path_for(self.algorithm, self.digest)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        os.chmod(self.tmp_path, STORED_FILE_MODE)
+        os.replace(self.tmp_path, dest_path)
+        return dest_path
+
+    def abort(self):
+        self.file.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+class ContentStore:
+    """
+    A content-addressed file store laid out as <root>/<algorithm>/<ab>/<hash>.
+    Content only ever enters the store after its hash has been verified.
+    """
+
+    def __init__(self, root=CONTENT_STORE_DIR):
+        self.root = root
+        self.tmp_dir = os.path.join(root, 'tmp')
+
+    def path_for(self, algorithm, digest):
+        digest = digest.lower()
+        return os.path.join(self.root, algorithm, digest[:2], digest)
+
+    def has(self, algorithm, digest):
+        return os.path.exists(self.path_for(algorithm, digest))
+
+    def add(self, source_path, algorithm, digest):
+        """
+        Adds a local file whose hash the caller has already checked, returning
+        its path in the store.
+        """
+        dest_path = self.path_for(algorithm, digest)
+        if not os.path.exists(dest_path):
+            # A hardlink would share the source's inode, so making the stored
+            # file read-only would lock the source too, and any later edit to
+            # the source would change the stored content under its hash
+            copy_file(source_path, dest_path, 'copy' if COPY_MODE == 'copy' else 'reflink')
+            os.chmod(dest_path, STORED_FILE_MODE)
+        return dest_path
+
+    def writer(self, algorithm, digest):
+        return StoreWriter(self, algorithm, digest)
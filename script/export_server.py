@@ -0,0 +1,188 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+import toml
+from urllib.parse import quote
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import (PACKWIZ_CONFIG_FILE, ROOT_COPY_PATH, SERVER_EXPORT_DIR,
+                    CURSEFORGE_DOWNLOAD_URL)
+from mod_model import ModFile
+from refresh import read_index_entries
+from hash_cache import HashCache
+from content_store import ContentStore
+from sync_tree import copy_file, is_in_sync
+from verify_urls import Download, SUPPORTED_HASH_FORMATS, verify_downloads
+
+# Lists the files written by the last export, so files dropped from the pack
+# can be removed without touching worlds, logs or other server files.
+EXPORT_MANIFEST_NAME = '.pack-export.json'
+
+def curseforge_url(mod_data):
+    """Builds the CDN URL of a CurseForge mod, which packwiz stores without one."""
+    file_id = str(mod_data.get('update', {}).get('curseforge', {}).get('file-id', ''))
+    if not file_id:
+        return None
+    return CURSEFORGE_DOWNLOAD_URL.format(file_id[:4], file_id[4:].lstrip('0') or '0', quote(mod_data['filename']))
+
+def read_pack_index(pack_root='.'):
+    """Returns the parsed [[files]] entries of the pack index."""
+    with open(os.path.join(pack_root, PACKWIZ_CONFIG_FILE), 'r') as f:
+        index_path = os.path.join(pack_root, toml.load(f)['index']['file'])
+    _, entries = read_index_entries(index_path)
+    if not entries:
+        print(f"Error: The pack index '{index_path}' is missing or empty. Run start.py first.")
+        exit(1)
+    return [toml.loads('\n'.join(lines)) for lines in entries.values()]
+
+def resolve_server_files(pack_root='.'):
+    """
+    Applies the side filter to the pack index. Returns a list of
+    (destination path, Download) pairs for the server's mod jars, the plain
+    files to copy, and the number of client-only mods left out.
+    """
+    jars = []
+    files = []
+    client_only = 0
+    for entry in read_pack_index(pack_root):
+        rel_path = entry['file']
+        if not entry.get('metafile'):
+            files.append(rel_path)
+            continue
+
+        with open(os.path.join(pack_root, rel_path), 'r') as f:
+            mod = ModFile(rel_path, f.read())
+        if mod.data.get('side', 'both') == 'client':
+            client_only += 1
+            continue
+
+        download = mod.data.get('download', {})
+        url = download.get('url') or curseforge_url(mod.data)
+        dest_path = os.path.join(os.path.dirname(rel_path), mod.data['filename'])
+        jars.append((dest_path, Download(rel_path, url, download.get('hash-format', ''), download.get('hash', ''))))
+    return jars, files, client_only
+
+def store_local_jars(jars, store, hash_cache):
+    """
+    Adds jars missing from the store that are already in the instance's mods
+    folder, if their hashes match. Returns the number added.
+    """
+    candidates = {}
+    for dest_path, download in jars:
+        local_path = os.path.join(ROOT_COPY_PATH, dest_path)
+        if not store.has(download.hash_format, download.digest) and os.path.isfile(local_path):
+            candidates.setdefault(download.hash_format, []).append((local_path, download))
+
+    added = 0
+    for algorithm, pairs in candidates.items():
+        hashes = hash_cache.hash_files([local_path for local_path, _ in pairs], algorithm)
+        for local_path, download in pairs:
+            if hashes[local_path] == download.digest:
+                store.add(local_path, algorithm, download.digest)
+                added += 1
+    return added
+
+def download_jars(jars, store):
+    """Downloads every jar missing from the store in parallel. Returns the number of failures."""
+    missing = {}
+    failures = 0
+    for _, download in jars:
+        if store.has(download.hash_format, download.digest) or download.key in missing:
+            continue
+        if download.hash_format not in SUPPORTED_HASH_FORMATS or not download.url:
+            print(f"Error: {download.mod_path} has no usable download URL or hash.")
+            failures += 1
+            continue
+        missing[download.key] = download
+
+    print(f"Downloading {len(missing)} jars missing from the content store...")
+    for download, error in asyncio.run(verify_downloads(list(missing.values()), full=True, store=store)):
+        if error is not None:
+            print(f"Error: {download.mod_path}: {download.url}: {error}")
+            failures += 1
+    return failures
+
+def load_export_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, EXPORT_MANIFEST_NAME), 'r') as f:
+            return set(json.load(f)['files'])
+    except (OSError, ValueError, KeyError):
+        return set()
+
+def save_export_manifest(output_dir, exported):
+    with open(os.path.join(output_dir, EXPORT_MANIFEST_NAME), 'w') as f:
+        json.dump({'files': sorted(exported)}, f, indent=1)
+
+def export_server(output_dir=SERVER_EXPORT_DIR, pack_root='.'):
+    """
+    Exports a ready-to-run server directory. Mod jars are hardlinked from the
+    content store, so only jars new to the store are ever downloaded. Other
+    pack files are copied, since the server rewrites its configs in place.
+    Returns the number of jars that could not be fetched.
+    """
+    store = ContentStore()
+    hash_cache = HashCache()
+
+    jars, files, client_only = resolve_server_files(pack_root)
+    print(f"Exporting {len(jars)} server mods and {len(files)} other files "
+          f"({client_only} client-only mods left out) to '{output_dir}'.")
+
+    added = store_local_jars(jars, store, hash_cache)
+    if added:
+        print(f"Added {added} jars from '{ROOT_COPY_PATH}' to the content store.")
+    failures = download_jars(jars, store)
+
+    os.makedirs(output_dir, exist_ok=True)
+    exported = set()
+    linked = 0
+    for dest_path, download in jars:
+        store_path = store.path_for(download.hash_format, download.digest)
+        if not os.path.exists(store_path):
+            continue
+        exported.add(dest_path)
+        full_dest_path = os.path.join(output_dir, dest_path)
+        if os.path.exists(full_dest_path) and os.path.samefile(store_path, full_dest_path):
+            continue
+        copy_file(store_path, full_dest_path, 'hardlink')
+        linked += 1
+
+    copied = 0
+    for rel_path in files:
+        exported.add(rel_path)
+        source_path = os.path.join(pack_root, rel_path)
+        full_dest_path = os.path.join(output_dir, rel_path)
+        if not is_in_sync(source_path, full_dest_path, hash_cache):
+            copy_file(source_path, full_dest_path)
+            copied += 1
+
+    removed = 0
+    for rel_path in load_export_manifest(output_dir) - exported:
+        full_dest_path = os.path.join(output_dir, rel_path)
+        if os.path.lexists(full_dest_path):
+            os.remove(full_dest_path)
+            removed += 1
+    save_export_manifest(output_dir, exported)
+    hash_cache.save()
+
+    print(f"Linked {linked} jars, copied {copied} files and removed {removed} files no longer in the pack.")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Exports a ready-to-run server directory from the pack.")
+    parser.add_argument('--output', default=SERVER_EXPORT_DIR, help="The server directory to export to.")
+    args = parser.parse_args()
+
+    failures = export_server(args.output)
+    if failures:
+        print(f"Error: {failures} server mods could not be downloaded.")
+        exit(1)
+
+if __name__ == "__main__":
+    main()
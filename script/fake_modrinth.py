@@ -0,0 +1,133 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import MODS_DIR
+from mod_model import load_mods
+
+# A local stand-in for the parts of the Modrinth API check_updates.py uses, so
+# the update check can be tried without the network:
+#
+#     python script/fake_modrinth.py --bump-every 10 &
+#     DP2_MODRINTH_API_URL=http://127.0.0.1:8780/v2 python script/check_updates.py
+#
+# Every Modrinth mod in the pack is served with its current version as the
+# latest, apart from every Nth mod, which gets a made-up newer version.
+# Responses carry an ETag and honour If-None-Match.
+
+def fake_version(mod, bumped, game_version, loader):
+    """Builds a Modrinth version object for a mod: its current file, or a made-up newer one."""
+    download = mod.data['download']
+    modrinth = mod.data['update']['modrinth']
+    filename = mod.data['filename']
+    hashes = {download['hash-format']: download['hash']}
+    version_id = modrinth['version']
+    if bumped:
+        filename = filename[:-len('.jar')] + '-next.jar' if filename.endswith('.jar') else filename + '-next'
+        hashes = {hash_format: hashlib.new(hash_format, filename.encode('utf-8')).hexdigest()
+                  for hash_format in ('sha1', 'sha512')}
+        version_id = hashlib.sha1(version_id.encode('utf-8')).hexdigest()[:8]
+    return {
+        'id': version_id,
+        'project_id': modrinth['mod-id'],
+        'version_number': 'next' if bumped else 'current',
+        'date_published': '2026-01-01T00:00:00Z' if bumped else '2025-01-01T00:00:00Z',
+        'game_versions': [game_version],
+        'loaders': [loader],
+        'files': [{
+            'hashes': hashes,
+            'url': f"https://cdn.modrinth.com/data/{modrinth['mod-id']}/versions/{version_id}/{filename}",
+            'filename': filename,
+            'primary': True,
+        }],
+    }
+
+def build_fixture(mods, bump_every, game_version, loader):
+    """Returns the latest version of each Modrinth mod keyed on its file hashes and on its project ID."""
+    by_hash = {}
+    by_project = {}
+    modrinth_mods = [mod for mod in mods if mod.data.get('update', {}).get('modrinth', {}).get('mod-id')
+                     and mod.data.get('download', {}).get('hash')]
+    for i, mod in enumerate(modrinth_mods):
+        version = fake_version(mod, bump_every and i % bump_every == 0, game_version, loader)
+        download = mod.data['download']
+        by_hash.setdefault(download['hash-format'], {})[download['hash'].lower()] = version
+        by_project[mod.data['update']['modrinth']['mod-id']] = version
+    return by_hash, by_project
+
+class FakeModrinthHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def send_json(self, result):
+        body = json.dumps(result, sort_keys=True).encode('utf-8')
+        etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        self.server.requests += 1
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_not_found(self):
+        self.send_response(404)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if urlsplit(self.path).path != '/v2/version_files/update':
+            return self.send_not_found()
+        versions = self.server.by_hash.get(body.get('algorithm'), {})
+        self.send_json({digest: versions[digest] for digest in body.get('hashes', []) if digest in versions})
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        segments = parts.path.strip('/').split('/')
+        if len(segments) != 4 or segments[:2] != ['v2', 'project'] or segments[3] != 'version':
+            return self.send_not_found()
+        version = self.server.by_project.get(unquote(segments[2]))
+        loaders = json.loads(parse_qs(parts.query).get('loaders', ['[]'])[0])
+        self.send_json([version] if version is not None and set(loaders) & set(version['loaders']) else [])
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves a stand-in Modrinth API for check_updates.py.")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--bump-every", type=int, default=10, help="Give every Nth mod a newer version, 0 for none.")
+    parser.add_argument("--game-version", default="1.20.1")
+    parser.add_argument("--loader", default="forge")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), FakeModrinthHandler)
+    server.by_hash, server.by_project = build_fixture(load_mods(MODS_DIR), args.bump_every, args.game_version, args.loader)
+    server.verbose = args.verbose
+    server.requests = 0
+    print(f"Serving a fake Modrinth API for {len(server.by_project)} projects on http://127.0.0.1:{args.port}/v2")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nServed {server.requests} API requests.")
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,22 @@
 import os
-import toml
+import sys
 
-def fix_url_encoding(file_path):
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import MODS_DIR
+from mod_model import load_mods, write_mods
+
+def fix_url_encoding(mod):
     """
-    Reads a TOML file, fixes the URL encoding, and writes the changes back.
+    Fixes the URL encoding of a loaded .pw.toml file.
     Removes the 'url' field if it is empty.
     """
     try:
-        with open(file_path, 'r') as f:
-            data = toml.load(f)
+        data = mod.data
 
         if 'download' in data and 'url' in data['download']:
             original_url = data['download']['url']
@@ -16,36 +24,38 @@ def fix_url_encoding(file_path):
             # Check if the URL is empty before corrections
             if original_url.strip() == '':
                 del data['download']['url']
-                with open(file_path, 'w') as f:
-                    toml.dump(data, f)
-                print(f"Removed empty 'url' field in {file_path}")
+                mod.save_data()
+                print(f"Removed empty 'url' field in {mod.path}")
             else:
                 # Use string replace to fix only the specific characters that cause issues
                 corrected_url = original_url.replace(' ', '%20').replace('[', '%5B').replace(']', '%5D')
                 
-                # Check for changes before writing to avoid unnecessary file writes
+                # Check for changes before re-serialising to avoid unnecessary file writes
                 if original_url != corrected_url:
                     data['download']['url'] = corrected_url
-                    with open(file_path, 'w') as f:
-                        toml.dump(data, f)
-                    print(f"Fixed URL encoding in {file_path}")
+                    mod.save_data()
+                    print(f"Fixed URL encoding in {mod.path}")
 
     except Exception as e:
-        print(f"Error processing {file_path}: {e}")
+        print(f"Error processing {mod.path}: {e}")
+
+def transform(mods):
+    """
+    Fixes the URL encoding of every loaded .pw.toml file in place.
+    """
+    for mod in mods:
+        fix_url_encoding(mod)
+
+    print("Finished checking and fixing URLs in all .pw.toml files.")
 
 def main():
-    mods_dir = 'mods'
-    
-    if not os.path.exists(mods_dir):
-        print(f"Error: The directory '{mods_dir}' does not exist.")
+    if not os.path.exists(MODS_DIR):
+        print(f"Error: The directory '{MODS_DIR}' does not exist.")
         return
 
-    for filename in os.listdir(mods_dir):
-        if filename.endswith('.pw.toml'):
-            file_path = os.path.join(mods_dir, filename)
-            fix_url_encoding(file_path)
-
-    print("Finished checking and fixing URLs in all .pw.toml files.")
+    mods = load_mods(MODS_DIR)
+    transform(mods)
+    write_mods(mods)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import json
+import mmap
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import HASH_CACHE_FILE, HASH_WORKERS
+
+# Bump this whenever the cache layout changes so old caches are discarded.
+CACHE_VERSION = 1
+
+# Files at least this large are hashed through a memory map instead of reads.
+MMAP_THRESHOLD = 4 * 1024 * 1024
+
+# The read size used for files smaller than MMAP_THRESHOLD.
+READ_BUFFER_SIZE = 1024 * 1024
+
+def compute_hash(file_path, algorithm='sha256'):
+    """
+    Hashes a file without the cache. Large files are memory-mapped so the
+    hash is computed in one call, which also releases the GIL for threads.
+    """
+    file_hash = hashlib.new(algorithm)
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                file_hash.update(mapped)
+        else:
+            for byte_block in iter(lambda: f.read(READ_BUFFER_SIZE), b""):
+                file_hash.update(byte_block)
+    return file_hash.hexdigest(), size
+
+def stat_key(stat):
+    """The part of a file's stat result that must match for a cache hit."""
+    return {'size': stat.st_size, 'mtime': stat.st_mtime_ns, 'inode': stat.st_ino}
+
+class HashCache:
+    """
+    A persistent cache of file hashes keyed on path, size, mtime and inode.
+    Files that are unchanged since they were last hashed are never re-read,
+    and cache misses are hashed in parallel on a thread pool. The cache can
+    be shared by stages running on different threads.
+    """
+
+    def __init__(self, cache_path=HASH_CACHE_FILE, workers=HASH_WORKERS):
+        self.cache_path = cache_path
+        self.workers = workers
+        self.entries = {}
+        self.by_inode = None
+        self.hits = 0
+        self.misses = 0
+        self.bytes_hashed = 0
+        # The same counts for each thread alone, so stages running side by
+        # side only see their own lookups
+        self.thread_counts = threading.local()
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        """Loads the cache from disk, starting empty if it is missing or unreadable."""
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Could not read hash cache '{self.cache_path}': {e}. Starting empty.")
+            return
+        if data.get('version') == CACHE_VERSION:
+            self.entries = data.get('entries', {})
+
+    def save(self):
+        """Writes the cache atomically, dropping entries for files that no longer exist."""
+        with self.lock:
+            self.entries = {path: entry for path, entry in self.entries.items() if os.path.exists(path)}
+            os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+            tmp_path = self.cache_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'version': CACHE_VERSION, 'entries': self.entries}, f, sort_keys=True)
+            os.replace(tmp_path, self.cache_path)
+
+    def lookup(self, file_path, algorithm='sha256', stat=None):
+        """
+        Returns the cached hash of a file, or None if it is not cached or the
+        file changed since it was hashed.
+        """
+        key = os.path.normpath(file_path)
+        entry = self.entries.get(key)
+        if stat is None:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                return None
+        if entry is None or any(entry.get(field) != value for field, value in stat_key(stat).items()):
+            # Hardlinks of a cached file, such as profile packs, share its hashes
+            with self.lock:
+                entry = self.linked_entry(stat)
+        if entry is None or algorithm not in entry:
+            return None
+        return entry[algorithm]
+
+    def linked_entry(self, stat):
+        """Returns the entry of any cached path with the same inode, size and mtime."""
+        if self.by_inode is None:
+            self.by_inode = {(entry['inode'], entry['size'], entry['mtime']): entry for entry in self.entries.values()}
+        return self.by_inode.get((stat.st_ino, stat.st_size, stat.st_mtime_ns))
+
+    def store(self, file_path, algorithm, digest, stat):
+        """Records the hash of a file against its stat result."""
+        key = os.path.normpath(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or any(entry.get(field) != value for field, value in stat_key(stat).items()):
+                # The file changed, so hashes for other algorithms are stale too
+                entry = stat_key(stat)
+                self.entries[key] = entry
+                if self.by_inode is not None:
+                    self.by_inode[(stat.st_ino, stat.st_size, stat.st_mtime_ns)] = entry
+            entry[algorithm] = digest
+
+    def count(self, hits=0, misses=0, bytes_hashed=0, cpu_time=0.0):
+        """
+        Adds to the overall counts and to those of the calling thread. The CPU
+        time is that spent on the calling thread's behalf by the pool.
+        """
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            self.bytes_hashed += bytes_hashed
+        counts = self.thread_counts
+        counts.hits = getattr(counts, 'hits', 0) + hits
+        counts.misses = getattr(counts, 'misses', 0) + misses
+        counts.bytes_hashed = getattr(counts, 'bytes_hashed', 0) + bytes_hashed
+        counts.cpu_time = getattr(counts, 'cpu_time', 0.0) + cpu_time
+
+    def thread_totals(self):
+        """
+        Returns the hits, misses, bytes hashed and pool CPU time counted on
+        the calling thread so far.
+        """
+        counts = self.thread_counts
+        return (getattr(counts, 'hits', 0), getattr(counts, 'misses', 0), getattr(counts, 'bytes_hashed', 0),
+                getattr(counts, 'cpu_time', 0.0))
+
+    def hash_file(self, file_path, algorithm='sha256'):
+        """Returns the hash of a single file, using the cache where possible."""
+        return self.hash_files([file_path], algorithm)[file_path]
+
+    def hash_files(self, file_paths, algorithm='sha256'):
+        """
+        Returns a mapping of each path to its hash. Cached hashes are reused
+        and everything else is hashed in parallel.
+        """
+        results = {}
+        to_hash = []
+        for file_path in file_paths:
+            stat = os.stat(file_path)
+            digest = self.lookup(file_path, algorithm, stat)
+            if digest is None:
+                to_hash.append((file_path, stat))
+            else:
+                results[file_path] = digest
+                self.count(hits=1)
+
+        if not to_hash:
+            return results
+
+        def timed_hash(file_path):
+            # Workers are timed on their own threads, since the caller's CPU time does not include theirs
+            cpu_start = time.thread_time()
+            digest, size = compute_hash(file_path, algorithm)
+            return digest, size, time.thread_time() - cpu_start
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            hashed = executor.map(timed_hash, [path for path, _ in to_hash])
+            for (file_path, stat), (digest, size, cpu_time) in zip(to_hash, hashed):
+                results[file_path] = digest
+                self.store(file_path, algorithm, digest, stat)
+                self.count(misses=1, bytes_hashed=size, cpu_time=cpu_time)
+
+        return results
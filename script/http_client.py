@@ -0,0 +1,223 @@
+import ssl
+import asyncio
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit, urljoin
+
+# The size of the chunks response bodies are streamed in.
+CHUNK_SIZE = 1024 * 1024
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+MAX_REDIRECTS = 5
+
+class HttpError(Exception):
+    """Raised when a request fails at the HTTP or connection level."""
+
+class Response:
+    """
+    A streamed HTTP response. The body must be consumed with iter_chunks()
+    or read() before the connection can go back to the pool.
+    """
+
+    def __init__(self, url, version, status, reason, headers, reader, timeout, method):
+        self.url = url
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.reader = reader
+        self.timeout = timeout
+        self.complete = method == 'HEAD' or status in (204, 304) or 100 <= status < 200
+        connection = headers.get('connection', '').lower()
+        # HTTP/1.0 servers close the connection unless asked to keep it alive
+        self.keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+
+    async def _read(self, coroutine):
+        return await asyncio.wait_for(coroutine, self.timeout)
+
+    async def iter_chunks(self, chunk_size=CHUNK_SIZE):
+        """Yields the body in chunks without buffering all of it."""
+        if self.complete:
+            return
+
+        if self.headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size_line = await self._read(self.reader.readline())
+                size = int(size_line.split(b';')[0].strip(), 16)
+                if size == 0:
+                    # Skip any trailers up to the blank line ending the body
+                    while (await self._read(self.reader.readline())).strip():
+                        pass
+                    break
+                while size:
+                    data = await self._read(self.reader.read(min(size, chunk_size)))
+                    if not data:
+                        raise HttpError(f"Connection closed mid-body for {self.url}")
+                    size -= len(data)
+                    yield data
+                await self._read(self.reader.readline())
+        elif 'content-length' in self.headers:
+            remaining = int(self.headers['content-length'])
+            while remaining:
+                data = await self._read(self.reader.read(min(remaining, chunk_size)))
+                if not data:
+                    raise HttpError(f"Connection closed mid-body for {self.url}")
+                remaining -= len(data)
+                yield data
+        else:
+            # The body runs until the server closes the connection
+            self.keep_alive = False
+            while True:
+                data = await self._read(self.reader.read(chunk_size))
+                if not data:
+                    break
+                yield data
+
+        self.complete = True
+
+    async def read(self):
+        """Reads the whole body into memory."""
+        return b''.join([chunk async for chunk in self.iter_chunks()])
+
+class HttpClient:
+    """
+    A minimal asyncio HTTP/1.1 client that keeps a pool of keep-alive
+    connections per host and bounds the number of concurrent connections
+    to each host.
+    """
+
+    def __init__(self, max_per_host=8, timeout=60, user_agent='diggerpack2-build'):
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.user_agent = user_agent
+        self.idle = {}
+        self.limits = {}
+        self.ssl_context = ssl.create_default_context()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Closes every idle connection."""
+        for connections in self.idle.values():
+            for _, writer in connections:
+                writer.close()
+        self.idle.clear()
+
+    def _limit(self, key):
+        if key not in self.limits:
+            self.limits[key] = asyncio.Semaphore(self.max_per_host)
+        return self.limits[key]
+
+    async def _connect(self, key):
+        """Returns an idle pooled connection for the host, or opens a new one."""
+        connections = self.idle.get(key, [])
+        while connections:
+            reader, writer = connections.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+
+        scheme, host, port = key
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=self.ssl_context if scheme == 'https' else None,
+                                    limit=CHUNK_SIZE), self.timeout)
+        return reader, writer, False
+
+    async def _send(self, reader, writer, method, url, headers, body):
+        """Sends a request on a connection and reads the status line and headers."""
+        parts = urlsplit(url)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+        request_headers = {'Host': parts.netloc, 'User-Agent': self.user_agent, 'Accept-Encoding': 'identity'}
+        request_headers.update(headers or {})
+        if body is not None:
+            request_headers['Content-Length'] = str(len(body))
+
+        head = f"{method} {target} HTTP/1.1\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in request_headers.items())
+        writer.write((head + "\r\n").encode('latin-1') + (body or b''))
+        await writer.drain()
+
+        status_line = await asyncio.wait_for(reader.readline(), self.timeout)
+        if not status_line:
+            raise HttpError(f"Connection closed before a response for {url}")
+        version, status, *reason = status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+
+        response_headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            response_headers[name.strip().lower()] = value.strip()
+
+        return Response(url, version, int(status), reason[0] if reason else '', response_headers, reader,
+                        self.timeout, method)
+
+    @asynccontextmanager
+    async def request(self, method, url, headers=None, body=None):
+        """
+        Sends a request, following redirects, and yields the streamed
+        Response. The connection goes back to the pool afterwards if the body
+        was fully read.
+        """
+        for _ in range(MAX_REDIRECTS + 1):
+            parts = urlsplit(url)
+            if parts.scheme not in ('http', 'https'):
+                raise HttpError(f"Unsupported URL scheme in {url}")
+            key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+
+            async with self._limit(key):
+                reader, writer, reused = await self._connect(key)
+                response = None
+                try:
+                    try:
+                        response = await self._send(reader, writer, method, url, headers, body)
+                    except (HttpError, ConnectionError, asyncio.IncompleteReadError):
+                        if not reused:
+                            raise
+                        # The server closed the idle connection, so retry on a fresh one
+                        writer.close()
+                        reader, writer, _ = await self._connect(key)
+                        response = await self._send(reader, writer, method, url, headers, body)
+
+                    location = response.headers.get('location')
+                    if response.status in REDIRECT_STATUSES and location:
+                        async for _ in response.iter_chunks():
+                            pass
+                    else:
+                        yield response
+                finally:
+                    if response is not None and response.complete and response.keep_alive:
+                        self.idle.setdefault(key, []).append((reader, writer))
+                    else:
+                        writer.close()
+
+            if response.status in REDIRECT_STATUSES and location:
+                url = urljoin(url, location)
+                if response.status == 303:
+                    method, body = 'GET', None
+                continue
+            return
+
+        raise HttpError(f"Too many redirects for {url}")
+
+async def with_retries(func, retries, delay=0.5):
+    """Awaits func(), retrying HTTP and connection failures with exponential backoff."""
+    for attempt in range(retries + 1):
+        try:
+            return await func()
+        except (HttpError, OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+            if attempt == retries:
+                raise
+        await asyncio.sleep(delay * (2 ** attempt))
+
+def upstream_url(url, upstream=None):
+    """With an upstream mirror, the URL is fetched from <upstream>/<host>/<path> instead."""
+    if not upstream:
+        return url
+    parts = urlsplit(url)
+    return f"{upstream.rstrip('/')}/{parts.netloc}{parts.path}" + (f"?{parts.query}" if parts.query else "")
@@ -0,0 +1,251 @@
+import os
+import sys
+import json
+import zlib
+import struct
+import zipfile
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import BUNDLE_FILE, BUNDLE_MANIFEST_FILE, BUNDLE_COMPRESS_LEVEL, BUNDLE_STORED_SUFFIXES
+from release_delta import read_pack_index, write_json
+from build_manifest import hash_file
+
+# Bump when the bundle or manifest layout changes, so the bundle is rebuilt.
+BUNDLE_FORMAT_VERSION = 1
+
+# Every entry gets the earliest date a zip can store, 1980-01-01 00:00, in DOS format.
+DOS_TIME = 0
+DOS_DATE = (1 << 5) | 1
+
+# Unix permissions of every entry: rw-r--r--.
+ENTRY_ATTRIBUTES = 0o644 << 16
+
+# Entry names are UTF-8.
+UTF8_FLAG = 0x800
+
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<4sHHHHHHIIIHHHHHII')
+END_OF_CENTRAL_DIRECTORY = struct.Struct('<4sHHHHIIH')
+
+# Without ZIP64 records a zip holds at most this many entries and bytes.
+ZIP_MAX_ENTRIES = 0xFFFF
+ZIP_MAX_SIZE = 0xFFFFFFFF
+
+class BundleEntry:
+    """An entry written to the bundle, with what its central directory record needs."""
+
+    __slots__ = ('name', 'method', 'crc', 'compress_size', 'file_size', 'offset')
+
+    def __init__(self, name, method, crc, compress_size, file_size, offset):
+        self.name = name
+        self.method = method
+        self.crc = crc
+        self.compress_size = compress_size
+        self.file_size = file_size
+        self.offset = offset
+
+class BundleWriter:
+    """
+    Writes a zip with nothing in it but names, contents and fixed metadata,
+    so the same files always give the same bytes. Entries are either
+    compressed from a file or copied already compressed from another zip.
+    """
+
+    def __init__(self, path):
+        self.file = open(path, 'wb')
+        self.entries = []
+
+    def write_header(self, name, method, crc=0, compress_size=0, file_size=0):
+        encoded_name = name.encode('utf-8')
+        self.file.write(LOCAL_HEADER.pack(b'PK\x03\x04', 20, UTF8_FLAG, method, DOS_TIME, DOS_DATE,
+                                          crc, compress_size, file_size, len(encoded_name), 0))
+        self.file.write(encoded_name)
+
+    def add_file(self, name, source_path, method):
+        """Compresses a file into the bundle, streaming it through in chunks."""
+        offset = self.file.tell()
+        self.write_header(name, method)
+        crc = 0
+        file_size = 0
+        compress_size = 0
+        compressor = zlib.compressobj(BUNDLE_COMPRESS_LEVEL, zlib.DEFLATED, -15) if method == zipfile.ZIP_DEFLATED else None
+        with open(source_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                data = compressor.compress(chunk) if compressor else chunk
+                compress_size += len(data)
+                self.file.write(data)
+        if compressor:
+            data = compressor.flush()
+            compress_size += len(data)
+            self.file.write(data)
+
+        # The sizes are only known now, so the header is filled in afterwards
+        end = self.file.tell()
+        self.file.seek(offset)
+        self.write_header(name, method, crc, compress_size, file_size)
+        self.file.seek(end)
+        self.entries.append(BundleEntry(name, method, crc, compress_size, file_size, offset))
+
+    def add_raw(self, name, source_file, info):
+        """Copies an entry from another zip without decompressing it."""
+        source_file.seek(info.header_offset)
+        header = source_file.read(LOCAL_HEADER.size)
+        if len(header) != LOCAL_HEADER.size or header[:4] != b'PK\x03\x04':
+            raise zipfile.BadZipFile(f"bad local header for '{info.filename}'")
+        name_length, extra_length = struct.unpack('<HH', header[26:30])
+        source_file.seek(info.header_offset + LOCAL_HEADER.size + name_length + extra_length)
+
+        offset = self.file.tell()
+        self.write_header(name, info.compress_type, info.CRC, info.compress_size, info.file_size)
+        remaining = info.compress_size
+        while remaining:
+            chunk = source_file.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                raise zipfile.BadZipFile(f"'{info.filename}' is truncated")
+            self.file.write(chunk)
+            remaining -= len(chunk)
+        self.entries.append(BundleEntry(name, info.compress_type, info.CRC, info.compress_size, info.file_size, offset))
+
+    def close(self):
+        """Writes the central directory and closes the file."""
+        if len(self.entries) > ZIP_MAX_ENTRIES or self.file.tell() > ZIP_MAX_SIZE:
+            self.file.close()
+            raise ValueError(f"the bundle needs ZIP64, which is not supported ({len(self.entries)} entries)")
+        directory_offset = self.file.tell()
+        for entry in self.entries:
+            encoded_name = entry.name.encode('utf-8')
+            self.file.write(CENTRAL_HEADER.pack(b'PK\x01\x02', (3 << 8) | 20, 20, UTF8_FLAG, entry.method, DOS_TIME,
+                                                DOS_DATE, entry.crc, entry.compress_size, entry.file_size,
+                                                len(encoded_name), 0, 0, 0, 0, ENTRY_ATTRIBUTES, entry.offset))
+            self.file.write(encoded_name)
+        directory_size = self.file.tell() - directory_offset
+        self.file.write(END_OF_CENTRAL_DIRECTORY.pack(b'PK\x05\x06', 0, 0, len(self.entries), len(self.entries),
+                                                      directory_size, directory_offset, 0))
+        self.file.close()
+
+    def abort(self):
+        self.file.close()
+
+def compression_for(rel_path):
+    """Files that are already compressed are stored; everything else is deflated."""
+    if rel_path.lower().endswith(tuple(BUNDLE_STORED_SUFFIXES)):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+def compression_settings():
+    """Describes how entries are compressed, so a bundle made differently is not reused."""
+    return f"{BUNDLE_FORMAT_VERSION}:deflate-{BUNDLE_COMPRESS_LEVEL}:stored={','.join(sorted(BUNDLE_STORED_SUFFIXES))}"
+
+def load_bundle_manifest(manifest_path=BUNDLE_MANIFEST_FILE):
+    """Loads the manifest of the last bundle, or None if there is none."""
+    try:
+        with open(manifest_path, 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read the bundle manifest '{manifest_path}': {e}")
+        return None
+    return manifest if manifest.get('version') == BUNDLE_FORMAT_VERSION else None
+
+def reusable_entries(previous, bundle_path, hash_format):
+    """
+    Returns the entries of the last bundle that can be copied into the new
+    one, keyed on the index hash of their file. Nothing is reused unless the
+    bundle still matches its manifest and was compressed the same way.
+    """
+    if previous is None or not os.path.isfile(bundle_path):
+        return {}
+    if previous.get('compression') != compression_settings() or previous.get('hash-format') != hash_format:
+        return {}
+    if hash_file(bundle_path) != previous.get('bundle-hash'):
+        print(f"Warning: '{bundle_path}' does not match its manifest, so none of it is reused.")
+        return {}
+    try:
+        with zipfile.ZipFile(bundle_path) as archive:
+            infos = {info.filename: info for info in archive.infolist()}
+    except (OSError, zipfile.BadZipFile) as e:
+        print(f"Warning: Could not read '{bundle_path}': {e}")
+        return {}
+    return {digest: infos[rel_path] for rel_path, digest in previous['files'].items() if rel_path in infos}
+
+def build_bundle(pack_root='.', bundle_path=BUNDLE_FILE, manifest_path=BUNDLE_MANIFEST_FILE):
+    """
+    Bundles every file in the pack index that is not a mod into one zip, and
+    writes a manifest mapping each bundled path to its index hash so an
+    installer can fetch the bundle in one request and check each file
+    locally. Entries are sorted and carry fixed metadata, so the same files
+    always give the same bundle. Entries whose file is unchanged since the
+    last bundle are copied across compressed rather than compressed again.
+    Returns the manifest, and the number of entries compressed and reused,
+    or (None, 0, 0) if the index has not changed since the last bundle.
+    """
+    hash_format, index_hash, files = read_pack_index(pack_root)
+    bundle_path = os.path.join(pack_root, bundle_path)
+    manifest_path = os.path.join(pack_root, manifest_path)
+    previous = load_bundle_manifest(manifest_path)
+    if (previous is not None and previous.get('index-hash') == index_hash
+            and previous.get('compression') == compression_settings() and os.path.isfile(bundle_path)):
+        return None, 0, 0
+
+    bundled = [(rel_path, digest) for rel_path, digest, metafile in files if not metafile]
+    reusable = reusable_entries(previous, bundle_path, hash_format)
+    os.makedirs(os.path.dirname(bundle_path) or '.', exist_ok=True)
+    tmp_path = bundle_path + '.tmp'
+    writer = BundleWriter(tmp_path)
+    compressed = 0
+    reused = 0
+    previous_bundle = open(bundle_path, 'rb') if reusable else None
+    try:
+        for rel_path, digest in bundled:
+            info = reusable.get(digest)
+            if info is not None and info.compress_type == compression_for(rel_path):
+                writer.add_raw(rel_path, previous_bundle, info)
+                reused += 1
+            else:
+                writer.add_file(rel_path, os.path.join(pack_root, rel_path), compression_for(rel_path))
+                compressed += 1
+        writer.close()
+    except BaseException:
+        writer.abort()
+        os.remove(tmp_path)
+        raise
+    finally:
+        if previous_bundle is not None:
+            previous_bundle.close()
+    os.replace(tmp_path, bundle_path)
+
+    manifest = {
+        'version': BUNDLE_FORMAT_VERSION,
+        'index-hash': index_hash,
+        'hash-format': hash_format,
+        'compression': compression_settings(),
+        'bundle': os.path.basename(bundle_path),
+        'bundle-hash': hash_file(bundle_path),
+        'bundle-size': os.path.getsize(bundle_path),
+        'files': dict(bundled),
+    }
+    write_json(manifest_path, manifest)
+    return manifest, compressed, reused
+
+def main():
+    try:
+        manifest, compressed, reused = build_bundle()
+    except (OSError, ValueError, zipfile.BadZipFile) as e:
+        print(f"Error: Could not build the install bundle: {e}")
+        exit(1)
+    if manifest is None:
+        print("The index has not changed since the last bundle.")
+        return
+    print(f"Bundled {len(manifest['files'])} files into '{BUNDLE_FILE}' ({manifest['bundle-size'] / 1024:.0f} KiB): "
+          f"{compressed} compressed, {reused} reused from the last bundle.")
+
+if __name__ == "__main__":
+    main()
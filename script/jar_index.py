@@ -0,0 +1,276 @@
+import os
+import re
+import sys
+import json
+import time
+import zipfile
+import toml
+from concurrent.futures import ProcessPoolExecutor
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import (MODS_DIR, ROOT_COPY_PATH, SOURCE_MODS_DIR_NAME, UNKNOWN_MODS_DIR, JAR_INDEX_FILE,
+                    JAR_PROVIDED_MOD_IDS)
+from mod_model import load_mods
+from content_store import ContentStore
+
+# Bump to rescan every jar when the scan results change shape.
+JAR_INDEX_VERSION = 1
+
+FORGE_METADATA = 'META-INF/mods.toml'
+FABRIC_METADATA = 'fabric.mod.json'
+MANIFEST = 'META-INF/MANIFEST.MF'
+
+# Directories jar-in-jar dependencies are nested in by Forge's JarJar and by Fabric.
+NESTED_JAR_DIRS = ('META-INF/jarjar/', 'META-INF/jars/')
+
+# Old Fabric mod IDs that resolve to a different ID today.
+MOD_ID_ALIASES = {'fabric': 'fabric_api'}
+
+# Forge displayTest values of mods that only need to be on the client.
+CLIENT_ONLY_DISPLAY_TESTS = {'IGNORE_SERVER_VERSION'}
+
+def normalise_mod_id(mod_id):
+    """Normalises a mod ID so Fabric's dashed IDs match Forge's underscored ones."""
+    mod_id = mod_id.lower().replace('-', '_')
+    return MOD_ID_ALIASES.get(mod_id, mod_id)
+
+def mod_id(value):
+    """Checks a mod ID read from metadata is a string, as everything after the scan assumes."""
+    if not isinstance(value, str):
+        raise TypeError(f"mod ID {value!r} is not a string")
+    return value
+
+def manifest_version(jar):
+    """Returns the Implementation-Version of a jar's manifest, used for ${file.jarVersion}."""
+    try:
+        manifest = jar.read(MANIFEST).decode('utf-8', 'replace')
+    except KeyError:
+        return None
+    for line in manifest.splitlines():
+        if line.startswith('Implementation-Version:'):
+            return line.split(':', 1)[1].strip()
+    return None
+
+def read_forge_mods(jar, names):
+    """Reads the mods and mandatory dependencies declared in META-INF/mods.toml."""
+    if FORGE_METADATA not in names:
+        return []
+    metadata = toml.loads(jar.read(FORGE_METADATA).decode('utf-8', 'replace'))
+    dependencies = metadata.get('dependencies', {})
+
+    mods = []
+    for mod in metadata.get('mods', []):
+        version = str(mod.get('version', ''))
+        if '${' in version:
+            version = manifest_version(jar) or version
+        depends = []
+        for dependency in dependencies.get(mod.get('modId'), []):
+            if dependency.get('mandatory', dependency.get('type', '').lower() == 'required'):
+                depends.append([mod_id(dependency.get('modId', '')), dependency.get('side', 'BOTH').upper()])
+        mods.append({
+            'id': mod_id(mod.get('modId', '')),
+            'version': version,
+            'side': 'client' if mod.get('displayTest') in CLIENT_ONLY_DISPLAY_TESTS else None,
+            'depends': depends,
+        })
+    return mods
+
+def read_fabric_mods(jar, names):
+    """Reads the mod declared in fabric.mod.json, for Fabric mods loaded through a compatibility layer."""
+    if FABRIC_METADATA not in names:
+        return []
+    metadata = json.loads(jar.read(FABRIC_METADATA).decode('utf-8', 'replace'), strict=False)
+    environment = metadata.get('environment', '*')
+    return [{
+        'id': mod_id(metadata.get('id', '')),
+        'version': str(metadata.get('version', '')),
+        'side': environment if environment in ('client', 'server') else None,
+        'depends': [[mod_id(dependency), 'BOTH'] for dependency in metadata.get('depends', {})],
+        'provides': [mod_id(provided) for provided in metadata.get('provides', [])],
+    }]
+
+def read_jar_mods(jar):
+    names = set(jar.namelist())
+    return read_forge_mods(jar, names) + read_fabric_mods(jar, names), names
+
+def scan_jar(jar_path):
+    """
+    Reads the mod metadata of a jar. Opening the jar only reads its central
+    directory, and only the metadata members (and those of any jar-in-jar
+    dependencies) are decompressed. Returns the mods the jar declares and the
+    IDs of any mods nested inside it.
+    """
+    try:
+        with zipfile.ZipFile(jar_path) as jar:
+            mods, names = read_jar_mods(jar)
+            nested = []
+            for name in sorted(names):
+                if name.endswith('.jar') and name.startswith(NESTED_JAR_DIRS):
+                    with jar.open(name) as nested_file, zipfile.ZipFile(nested_file) as nested_jar:
+                        nested += [mod['id'] for mod in read_jar_mods(nested_jar)[0]]
+    except (OSError, zipfile.BadZipFile, ValueError, toml.TomlDecodeError, AttributeError, TypeError) as e:
+        # Metadata of the wrong shape, such as a list where a table belongs, is
+        # recorded against the jar rather than failing the whole scan
+        return {'error': f"{type(e).__name__}: {e}"}
+    return {'mods': mods, 'nested': nested}
+
+def find_jar(mod, store):
+    """Finds the jar of a .pw.toml file among the unknown mods, the instance's mods or the content store."""
+    filename = mod.data.get('filename', '')
+    download = mod.data.get('download', {})
+    candidates = [os.path.join(UNKNOWN_MODS_DIR, filename), os.path.join(ROOT_COPY_PATH, os.path.dirname(SOURCE_MODS_DIR_NAME), filename)]
+    if download.get('hash'):
+        candidates.append(store.path_for(download.get('hash-format', ''), download['hash']))
+    return next((path for path in candidates if os.path.isfile(path)), None)
+
+def load_jar_index(index_path=JAR_INDEX_FILE):
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, 'r') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return data.get('jars', {}) if data.get('version') == JAR_INDEX_VERSION else {}
+
+def save_jar_index(jars, index_path=JAR_INDEX_FILE):
+    os.makedirs(os.path.dirname(index_path) or '.', exist_ok=True)
+    tmp_path = index_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': JAR_INDEX_VERSION, 'jars': jars}, f, separators=(',', ':'))
+    os.replace(tmp_path, index_path)
+
+def scan_jars(jar_paths):
+    """
+    Scans jars across a process pool, reusing the results of jars whose size
+    and mtime are unchanged since the last scan. Returns a mapping of path to
+    scan result and the number of jars scanned.
+    """
+    cached = load_jar_index()
+    results = {}
+    pending = []
+    for jar_path in jar_paths:
+        stat = os.stat(jar_path)
+        key = os.path.normpath(jar_path)
+        entry = cached.get(key)
+        if entry is not None and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime_ns:
+            results[jar_path] = entry
+        else:
+            pending.append((jar_path, key, stat))
+
+    if pending:
+        paths = [jar_path for jar_path, _, _ in pending]
+        if len(pending) > 1:
+            with ProcessPoolExecutor() as executor:
+                scanned = list(executor.map(scan_jar, paths, chunksize=max(1, len(paths) // (4 * (os.cpu_count() or 1)))))
+        else:
+            scanned = [scan_jar(paths[0])]
+        for (jar_path, key, stat), result in zip(pending, scanned):
+            result.update({'size': stat.st_size, 'mtime': stat.st_mtime_ns})
+            results[jar_path] = result
+
+    save_jar_index({os.path.normpath(jar_path): result for jar_path, result in results.items()})
+    return results, len(pending)
+
+def name_key(name):
+    """Reduces a mod name or ID to lowercase letters and digits for loose matching."""
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+def on_server(side):
+    return side in ('both', 'server')
+
+def on_client(side):
+    return side in ('both', 'client')
+
+def analyse_mods(mods):
+    """
+    Builds a mod ID and version index from the jars of every mod, and reports
+    mod IDs shipped by more than one jar, mandatory dependencies no jar
+    provides, and `side` values that disagree with the jars.
+    Returns the number of problems found.
+    """
+    store = ContentStore()
+    jar_paths = {}
+    for mod in mods:
+        jar_path = find_jar(mod, store)
+        if jar_path is not None:
+            jar_paths[mod.filename] = jar_path
+
+    # Without a jar to read, a mod is assumed to provide any ID its name contains
+    unscanned_names = [name_key(mod.name) for mod in mods if mod.filename not in jar_paths]
+    unscanned_names += [name_key(mod.data.get('name', '')) for mod in mods if mod.filename not in jar_paths]
+
+    start = time.perf_counter()
+    results, scanned = scan_jars(sorted(set(jar_paths.values())))
+    print(f"Scanned {scanned} of {len(results)} jars in {time.perf_counter() - start:.2f}s "
+          f"({len(mods) - len(jar_paths)} mods have no local jar).")
+
+    problems = 0
+    sides = {mod.filename: mod.data.get('side', 'both') for mod in mods}
+    declared = []
+    # Mod ID to the .pw.toml files shipping it and its version in each
+    index = {}
+    provided = {normalise_mod_id(mod_id) for mod_id in JAR_PROVIDED_MOD_IDS}
+    for filename, jar_path in sorted(jar_paths.items()):
+        result = results[jar_path]
+        if 'error' in result:
+            print(f"Warning: Could not read '{jar_path}': {result['error']}")
+            continue
+        for jar_mod in result['mods']:
+            mod_id = normalise_mod_id(jar_mod['id'])
+            index.setdefault(mod_id, []).append((filename, jar_mod['version']))
+            provided.update(normalise_mod_id(mod_id) for mod_id in jar_mod.get('provides', []))
+            declared.append((filename, jar_mod))
+        provided.update(normalise_mod_id(mod_id) for mod_id in result['nested'])
+    provided.update(index)
+
+    for mod_id, shipped in sorted(index.items()):
+        if len({filename for filename, _ in shipped}) > 1:
+            problems += 1
+            versions = ', '.join(f"{filename} ({version})" for filename, version in shipped)
+            print(f"Error: Mod ID '{mod_id}' is shipped more than once: {versions}.")
+
+    for filename, jar_mod in declared:
+        side = sides[filename]
+        if jar_mod['side'] == 'client' and on_server(side):
+            problems += 1
+            print(f"Warning: {filename} has side '{side}' but its jar says it is client-only.")
+        elif jar_mod['side'] == 'server' and on_client(side):
+            problems += 1
+            print(f"Warning: {filename} has side '{side}' but its jar says it is server-only.")
+
+        for dependency_id, dependency_side in jar_mod['depends']:
+            dependency_id = normalise_mod_id(dependency_id)
+            if dependency_id not in provided and not any(name_key(dependency_id) in name for name in unscanned_names):
+                problems += 1
+                print(f"Error: {filename} requires '{dependency_id}', which no mod in the pack provides.")
+                continue
+            for dependency_filename, _ in index.get(dependency_id, []):
+                dependency_pack_side = sides[dependency_filename]
+                if on_server(side) and dependency_side in ('BOTH', 'SERVER') and not on_server(dependency_pack_side):
+                    problems += 1
+                    print(f"Warning: {filename} needs '{dependency_id}' on the server, "
+                          f"but {dependency_filename} has side '{dependency_pack_side}'.")
+                if on_client(side) and dependency_side in ('BOTH', 'CLIENT') and not on_client(dependency_pack_side):
+                    problems += 1
+                    print(f"Warning: {filename} needs '{dependency_id}' on the client, "
+                          f"but {dependency_filename} has side '{dependency_pack_side}'.")
+
+    print(f"Indexed {len(index)} mod IDs, {problems} problems found.")
+    return problems
+
+def main():
+    if not os.path.exists(MODS_DIR):
+        print(f"Error: The directory '{MODS_DIR}' does not exist.")
+        return
+
+    if analyse_mods(load_mods(MODS_DIR)):
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import os
+import sys
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import MODS_DIR
+import pw_toml
+
+PW_TOML_SUFFIX = '.pw.toml'
+
+class ModFile:
+    """
+    A single .pw.toml file held in memory while the pipeline runs.
+    Transforms edit either the raw text or the parsed data; the file is only
+    written back to disk if its text ends up different from what was read.
+    Edited data is patched into the text by pw_toml, so only the changed
+    values differ from the original.
+    """
+
+    def __init__(self, path, text):
+        self.path = path
+        self.original_text = text
+        self.text = text
+        self._data = None
+
+    @property
+    def filename(self):
+        return os.path.basename(self.path)
+
+    @property
+    def name(self):
+        """The base filename with the '.pw.toml' extension stripped."""
+        return self.filename[:-len(PW_TOML_SUFFIX)]
+
+    @property
+    def data(self):
+        """The parsed TOML document, parsed on first access."""
+        if self._data is None:
+            self._data = pw_toml.loads(self.text)
+        return self._data
+
+    def set_text(self, text):
+        """Replaces the raw text, dropping any previously parsed data."""
+        if text != self.text:
+            self.text = text
+            self._data = None
+
+    def save_data(self):
+        """Writes the parsed data back into the text after a transform has edited it."""
+        self.text = pw_toml.dumps(self._data, self.text)
+
+    @property
+    def changed(self):
+        return self.text != self.original_text
+
+def load_mods(mods_dir=MODS_DIR):
+    """
+    Reads every .pw.toml file in a directory into memory, sorted by filename.
+    """
+    mods = []
+    for filename in sorted(os.listdir(mods_dir)):
+        if filename.endswith(PW_TOML_SUFFIX):
+            file_path = os.path.join(mods_dir, filename)
+            with open(file_path, 'r') as f:
+                mods.append(ModFile(file_path, f.read()))
+    return mods
+
+def write_mods(mods):
+    """
+    Writes back only the mods whose text changed. Returns the number written.
+    """
+    written = 0
+    for mod in mods:
+        if mod.changed:
+            with open(mod.path, 'w') as f:
+                f.write(mod.text)
+            mod.original_text = mod.text
+            written += 1
+    return written
@@ -0,0 +1,218 @@
+import os
+import sys
+import json
+import zipfile
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import NORMALISE_PACK_DIRS, PACK_COMPRESS_LEVEL, PACK_JUNK_NAMES, PACK_DUPLICATES_REPORT_FILE
+from build_manifest import hash_file, is_up_to_date, make_record
+from sync_tree import copy_file
+
+# Bump when the repacked output changes, so every pack is repacked.
+NORMALISE_VERSION = 1
+
+# The timestamp every entry gets, the earliest a zip can store.
+FIXED_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+# Unix permissions of every entry: rw-r--r--.
+ENTRY_MODE = 0o644 << 16
+
+# The most duplicate entries printed; the report file lists them all.
+DUPLICATES_SHOWN = 10
+
+def is_junk(name):
+    """Checks whether an entry is, or is inside, one of the PACK_JUNK_NAMES."""
+    return any(part in PACK_JUNK_NAMES for part in name.split('/'))
+
+def pack_entries(archive):
+    """
+    Returns the file entries to keep, sorted by name. Directory entries are
+    dropped as they are implied by the file paths, and where a name appears
+    twice the last entry wins, as it does when the game reads the pack.
+    """
+    entries = {}
+    for info in archive.infolist():
+        if not info.is_dir() and not is_junk(info.filename):
+            entries[info.filename] = info
+    return [entries[name] for name in sorted(entries)]
+
+def normalise_zip(source_path, dest_path):
+    """
+    Repacks a zip deterministically: entries are sorted and written with a
+    fixed timestamp, fixed permissions and PACK_COMPRESS_LEVEL, so the same
+    contents always give the same bytes. Entries are read one at a time, so
+    memory use is bounded by the largest entry, not the size of the pack.
+    Returns the number of entries kept and dropped.
+    """
+    with zipfile.ZipFile(source_path) as source:
+        entries = pack_entries(source)
+        with zipfile.ZipFile(dest_path, 'w') as dest:
+            for info in entries:
+                dest_info = zipfile.ZipInfo(info.filename, FIXED_DATE_TIME)
+                dest_info.create_system = 3
+                dest_info.external_attr = ENTRY_MODE
+                dest_info.compress_type = zipfile.ZIP_DEFLATED
+                # ZipFile.open() ignores the archive's compression level for a
+                # ZipInfo, so each entry is written with writestr() instead
+                dest.writestr(dest_info, source.read(info), compresslevel=PACK_COMPRESS_LEVEL)
+        return len(entries), len(source.infolist()) - len(entries)
+
+class PackNormaliser:
+    """
+    A converter for sync_tree that repacks zips with normalise_zip instead
+    of copying them. Outputs are recorded in the build manifest against
+    their source hash so unchanged packs are skipped, and an output is only
+    replaced if its bytes changed. Zips that cannot be read are copied as
+    they are.
+    """
+
+    # The build manifest key the records are kept under.
+    MANIFEST_KEY = 'packs'
+
+    def __init__(self, hash_cache, records):
+        self.hash_cache = hash_cache
+        self.records = records
+        self.normalised = 0
+        self.failed = 0
+        self.dropped = 0
+        self.saved = 0
+
+    def handles(self, rel_path):
+        return rel_path.lower().endswith('.zip')
+
+    def source_key(self, source_path):
+        settings = f"{NORMALISE_VERSION}:{PACK_COMPRESS_LEVEL}:{','.join(sorted(PACK_JUNK_NAMES))}"
+        return f"{settings}:{self.hash_cache.hash_file(source_path)}"
+
+    def is_up_to_date(self, source_path, dest_path):
+        record = self.records.get(os.path.normpath(dest_path))
+        return is_up_to_date(record, self.source_key(source_path), dest_path)
+
+    def report(self):
+        """Prints what was repacked and, if any pack changed, the entries duplicated across packs."""
+        if self.normalised or self.failed:
+            print(f"Repacked {self.normalised} packs ({self.failed} copied unchanged), {self.dropped} junk entries "
+                  f"dropped, {self.saved / 1024:.0f} KiB saved.")
+            report_duplicates()
+
+    def convert(self, source_path, dest_path):
+        """Writes the repacked form of a zip, copying it unchanged if it cannot be read."""
+        os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+        tmp_path = dest_path + '.tmp'
+        try:
+            _, dropped = normalise_zip(source_path, tmp_path)
+        except (OSError, zipfile.BadZipFile, NotImplementedError, RuntimeError, ValueError) as e:
+            print(f"Warning: Copying '{source_path}' unchanged, it could not be repacked: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            copy_file(source_path, dest_path)
+            self.failed += 1
+            output_hash = self.hash_cache.hash_file(dest_path)
+        else:
+            self.normalised += 1
+            self.dropped += dropped
+            self.saved += os.path.getsize(source_path) - os.path.getsize(tmp_path)
+            output_hash = hash_file(tmp_path)
+            if os.path.isfile(dest_path) and self.hash_cache.hash_file(dest_path) == output_hash:
+                os.remove(tmp_path)
+            else:
+                os.replace(tmp_path, dest_path)
+        self.records[os.path.normpath(dest_path)] = make_record(self.source_key(source_path), dest_path, output_hash)
+
+def list_packs(directories):
+    """Returns the path of every zip in the given directories."""
+    packs = []
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(directory):
+            packs += [os.path.join(dirpath, filename) for filename in sorted(filenames) if filename.lower().endswith('.zip')]
+    return sorted(packs)
+
+def find_identical_packs(pack_paths):
+    """Groups packs with identical bytes, which repacked packs have whenever their contents match."""
+    by_hash = {}
+    for pack_path in pack_paths:
+        by_hash.setdefault(hash_file(pack_path), []).append(pack_path)
+    return [group for group in by_hash.values() if len(group) > 1]
+
+def find_duplicate_entries(pack_paths):
+    """
+    Finds entries with the same contents in more than one pack. Only each
+    zip's central directory is read: entries are compared by CRC-32 and size.
+    Returns a list of (size, wasted bytes, [(pack, entry name)]), the
+    biggest waste first.
+    """
+    by_content = {}
+    for pack_path in pack_paths:
+        try:
+            with zipfile.ZipFile(pack_path) as archive:
+                infos = archive.infolist()
+        except (OSError, zipfile.BadZipFile) as e:
+            print(f"Warning: Could not read '{pack_path}': {e}")
+            continue
+        for info in infos:
+            if not info.is_dir() and info.file_size > 0:
+                by_content.setdefault((info.CRC, info.file_size), []).append((pack_path, info.filename, info.compress_size))
+
+    duplicates = []
+    for (_, size), copies in by_content.items():
+        if len({pack_path for pack_path, _, _ in copies}) > 1:
+            compress_sizes = [compress_size for _, _, compress_size in copies]
+            duplicates.append((size, sum(compress_sizes) - min(compress_sizes), [(pack_path, name) for pack_path, name, _ in copies]))
+    duplicates.sort(key=lambda duplicate: (-duplicate[1], duplicate[2]))
+    return duplicates
+
+def report_duplicates(directories=NORMALISE_PACK_DIRS, report_path=PACK_DUPLICATES_REPORT_FILE):
+    """
+    Prints the packs shipped more than once and the entries duplicated
+    across the remaining packs, and writes them all to the report file.
+    Only the first of a set of identical packs is compared entry by entry.
+    """
+    pack_paths = list_packs(directories)
+    identical = find_identical_packs(pack_paths)
+    copies = {pack_path for group in identical for pack_path in group[1:]}
+    duplicates = find_duplicate_entries([pack_path for pack_path in pack_paths if pack_path not in copies])
+
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump({
+            'packs': identical,
+            'entries': [{'size': size, 'wasted': wasted, 'copies': [f"{pack_path}!{name}" for pack_path, name in entry_copies]}
+                        for size, wasted, entry_copies in duplicates],
+        }, f, indent=1)
+
+    for group in identical:
+        print(f"Identical packs: {', '.join(group)}.")
+    if duplicates:
+        total_wasted = sum(wasted for _, wasted, _ in duplicates)
+        print(f"Found {len(duplicates)} entries duplicated across packs, {total_wasted / 1024:.0f} KiB compressed "
+              f"(see '{report_path}'):")
+        for size, wasted, entry_copies in duplicates[:DUPLICATES_SHOWN]:
+            print(f"  {size} bytes, {wasted} wasted: " + ', '.join(f"{pack_path}!{name}" for pack_path, name in entry_copies))
+    return identical, duplicates
+
+def main():
+    print("Repacking packs...")
+    for pack_path in list_packs(NORMALISE_PACK_DIRS):
+        tmp_path = pack_path + '.tmp'
+        try:
+            kept, dropped = normalise_zip(pack_path, tmp_path)
+        except (OSError, zipfile.BadZipFile, NotImplementedError, RuntimeError, ValueError) as e:
+            print(f"Warning: Could not repack '{pack_path}': {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+        if hash_file(tmp_path) == hash_file(pack_path):
+            os.remove(tmp_path)
+            continue
+        print(f"Repacked '{pack_path}': {kept} entries, {dropped} dropped, "
+              f"{os.path.getsize(pack_path)} -> {os.path.getsize(tmp_path)} bytes.")
+        os.replace(tmp_path, pack_path)
+    report_duplicates()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+import os
+import sys
+import time
+import sqlite3
+import argparse
+import toml
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import PACK_DB_FILE, PACKWIZ_CONFIG_FILE
+from release_delta import read_pack_index
+
+# Bump when the schema changes; an older database is rebuilt from the next build.
+SCHEMA_VERSION = 1
+
+# Every row is valid from the build that first recorded it until last_build,
+# which is NULL while it is current. A build only adds rows for what changed,
+# so the history stays small however many builds are recorded, and questions
+# about the current pack or any past build are index lookups.
+SCHEMA = """
+CREATE TABLE builds (
+    id INTEGER PRIMARY KEY,
+    version TEXT,
+    index_hash TEXT,
+    created REAL NOT NULL
+);
+CREATE TABLE mods (
+    filename TEXT NOT NULL,
+    name TEXT,
+    side TEXT,
+    jar TEXT,
+    hash_format TEXT,
+    hash TEXT,
+    url TEXT,
+    modrinth_id TEXT,
+    modrinth_version TEXT,
+    curseforge_project INTEGER,
+    curseforge_file INTEGER,
+    first_build INTEGER NOT NULL REFERENCES builds(id),
+    last_build INTEGER REFERENCES builds(id)
+);
+CREATE UNIQUE INDEX mods_current ON mods(filename) WHERE last_build IS NULL;
+CREATE INDEX mods_side ON mods(side) WHERE last_build IS NULL;
+CREATE INDEX mods_hash ON mods(hash);
+CREATE INDEX mods_modrinth ON mods(modrinth_id);
+CREATE INDEX mods_first_build ON mods(first_build);
+CREATE INDEX mods_last_build ON mods(last_build);
+CREATE TABLE files (
+    path TEXT NOT NULL,
+    hash TEXT NOT NULL,
+    size INTEGER,
+    mtime INTEGER,
+    first_build INTEGER NOT NULL REFERENCES builds(id),
+    last_build INTEGER REFERENCES builds(id)
+);
+CREATE UNIQUE INDEX files_current ON files(path) WHERE last_build IS NULL;
+CREATE INDEX files_hash ON files(hash);
+CREATE INDEX files_first_build ON files(first_build);
+CREATE INDEX files_last_build ON files(last_build);
+"""
+
+MOD_COLUMNS = ('filename', 'name', 'side', 'jar', 'hash_format', 'hash', 'url', 'modrinth_id', 'modrinth_version',
+               'curseforge_project', 'curseforge_file')
+
+def mod_row(mod):
+    """The columns recorded for a mod, from its .pw.toml data."""
+    data = mod.data
+    download = data.get('download', {})
+    modrinth = data.get('update', {}).get('modrinth', {})
+    curseforge = data.get('update', {}).get('curseforge', {})
+    return (mod.filename, data.get('name'), data.get('side', 'both'), data.get('filename'),
+            download.get('hash-format'), download.get('hash', '').lower() or None, download.get('url'),
+            modrinth.get('mod-id'), modrinth.get('version'), curseforge.get('project-id'), curseforge.get('file-id'))
+
+def file_rows(files, pack_root='.'):
+    """The path, hash, size and mtime of every file in the pack index, from its entries."""
+    rows = []
+    for rel_path, digest, _ in files:
+        try:
+            stat = os.stat(os.path.join(pack_root, rel_path))
+        except OSError:
+            rows.append((rel_path, digest, None, None))
+            continue
+        rows.append((rel_path, digest, stat.st_size, stat.st_mtime_ns))
+    return rows
+
+class PackDatabase:
+    """
+    A SQLite record of the pack's mods and files across builds. Opened with
+    `with PackDatabase() as db:`; a database from an older schema is
+    replaced by an empty one.
+    """
+
+    def __init__(self, db_path=PACK_DB_FILE):
+        self.db_path = db_path
+        self.connection = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.db_path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(self.db_path)
+        # Lets queries run while a build is writing
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        if self.connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.reset()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.connection.close()
+        self.connection = None
+
+    def reset(self):
+        with self.connection:
+            for (table,) in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'").fetchall():
+                self.connection.execute(f"DROP TABLE {table}")
+            self.connection.executescript(SCHEMA)
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def latest_build(self):
+        """Returns the id, pack version and index hash of the last build recorded, or None."""
+        return self.connection.execute("SELECT id, version, index_hash FROM builds ORDER BY id DESC LIMIT 1").fetchone()
+
+    def build_for(self, version):
+        """Returns the id of the last build of a pack version, or of the build with that id, or None."""
+        row = self.connection.execute("SELECT id FROM builds WHERE version = ? ORDER BY id DESC LIMIT 1",
+                                      (version,)).fetchone()
+        if row is None and str(version).isdigit():
+            row = self.connection.execute("SELECT id FROM builds WHERE id = ?", (int(version),)).fetchone()
+        return row[0] if row is not None else None
+
+    def sync_table(self, table, key, columns, rows, build_id):
+        """
+        Brings a table's current rows in line with `rows`: rows that changed or
+        went away are closed at the previous build, and new or changed rows
+        are added from this one. Returns the number of rows added and closed.
+        """
+        current = {row[0]: row for row in self.connection.execute(
+            f"SELECT {', '.join(columns)} FROM {table} WHERE last_build IS NULL")}
+        wanted = {row[0]: row for row in rows}
+        closed = [(build_id - 1, row_key) for row_key, row in current.items() if wanted.get(row_key) != row]
+        added = [row + (build_id,) for row_key, row in wanted.items() if current.get(row_key) != row]
+        self.connection.executemany(f"UPDATE {table} SET last_build = ? WHERE {key} = ? AND last_build IS NULL", closed)
+        self.connection.executemany(
+            f"INSERT INTO {table} ({', '.join(columns)}, first_build) VALUES ({', '.join('?' * (len(columns) + 1))})",
+            added)
+        return len(added), len(closed)
+
+    def record_build(self, version, index_hash, mods, files):
+        """
+        Records a build of the pack from its mods and (path, hash, size, mtime)
+        file rows. Nothing is recorded if neither changed since the last build.
+        Returns the build id, and the number of mod and file rows that changed.
+        """
+        mod_rows = [mod_row(mod) for mod in mods]
+        with self.connection:
+            latest = self.latest_build()
+            build_id = (latest[0] if latest is not None else 0) + 1
+            mods_changed = sum(self.sync_table('mods', 'filename', MOD_COLUMNS, mod_rows, build_id))
+            # A new size or mtime alone is not a change to the pack
+            files_changed = sum(self.sync_table('files', 'path', ('path', 'hash'), [row[:2] for row in files], build_id))
+            if latest is not None and not mods_changed and not files_changed and latest[2] == index_hash:
+                build_id = latest[0]
+            else:
+                self.connection.execute("INSERT INTO builds (id, version, index_hash, created) VALUES (?, ?, ?, ?)",
+                                        (build_id, version, index_hash, time.time()))
+            self.connection.executemany("UPDATE files SET size = ?, mtime = ? WHERE path = ? AND last_build IS NULL",
+                                        [(size, mtime, path) for path, _, size, mtime in files])
+        return build_id, mods_changed, files_changed
+
+    def current_mods(self, side=None):
+        """Returns the current mods as dicts, optionally only those of one side."""
+        query = f"SELECT {', '.join(MOD_COLUMNS)} FROM mods WHERE last_build IS NULL"
+        parameters = ()
+        if side is not None:
+            query += " AND side = ?"
+            parameters = (side,)
+        return [dict(zip(MOD_COLUMNS, row)) for row in self.connection.execute(query + " ORDER BY filename", parameters)]
+
+    def mods_changed_since(self, build_id):
+        """
+        Returns the filenames of the mods added, changed and removed since a
+        build, each sorted. Only rows that started or ended after the build
+        are read.
+        """
+        started = {row[0] for row in self.connection.execute(
+            "SELECT filename FROM mods WHERE first_build > ? AND last_build IS NULL", (build_id,))}
+        ended = {row[0] for row in self.connection.execute(
+            "SELECT filename FROM mods WHERE first_build <= ? AND last_build >= ?", (build_id, build_id))}
+        return sorted(started - ended), sorted(started & ended), sorted(ended - started)
+
+    def find_hash(self, digest):
+        """Returns the current and past mods and files with a hash, as (kind, name, first build, last build)."""
+        digest = digest.lower()
+        return self.connection.execute(
+            "SELECT 'mod', filename, first_build, last_build FROM mods WHERE hash = ? "
+            "UNION ALL SELECT 'file', path, first_build, last_build FROM files WHERE hash = ? "
+            "ORDER BY 3", (digest, digest)).fetchall()
+
+    def builds(self):
+        return self.connection.execute("SELECT id, version, index_hash, created FROM builds ORDER BY id").fetchall()
+
+def pack_version(pack_root='.'):
+    with open(os.path.join(pack_root, PACKWIZ_CONFIG_FILE), 'r') as f:
+        return toml.load(f).get('version')
+
+def record_build(mods, pack_root='.', db_path=PACK_DB_FILE):
+    """Records the current pack in the database. Returns the build id and the number of mod and file rows changed."""
+    _, index_hash, files = read_pack_index(pack_root)
+    with PackDatabase(db_path) as db:
+        return db.record_build(pack_version(pack_root), index_hash, mods, file_rows(files, pack_root))
+
+def main():
+    parser = argparse.ArgumentParser(description="Queries the pack database start.py keeps.")
+    subparsers = parser.add_subparsers(dest="query", required=True)
+    subparsers.add_parser("builds", help="List the builds recorded.")
+    changed_parser = subparsers.add_parser("changed", help="List the mods changed since a pack version or build id.")
+    changed_parser.add_argument("since")
+    side_parser = subparsers.add_parser("side", help="List the current mods of one side.")
+    side_parser.add_argument("side", choices=["client", "server", "both"])
+    hash_parser = subparsers.add_parser("hash", help="Look up a hash among current and past mods and files.")
+    hash_parser.add_argument("digest")
+    args = parser.parse_args()
+
+    if not os.path.exists(PACK_DB_FILE):
+        print(f"Error: '{PACK_DB_FILE}' does not exist. Run start.py first.")
+        exit(1)
+
+    with PackDatabase() as db:
+        if args.query == "builds":
+            for build_id, version, index_hash, created in db.builds():
+                print(f"{build_id}\t{version}\t{index_hash[:12]}\t{time.strftime('%Y-%m-%d %H:%M', time.localtime(created))}")
+        elif args.query == "changed":
+            build_id = db.build_for(args.since)
+            if build_id is None:
+                print(f"Error: No build of '{args.since}' is recorded.")
+                exit(1)
+            added, changed, removed = db.mods_changed_since(build_id)
+            for label, filenames in (("Added", added), ("Changed", changed), ("Removed", removed)):
+                for filename in filenames:
+                    print(f"{label}: {filename}")
+            print(f"{len(added)} added, {len(changed)} changed and {len(removed)} removed since build {build_id}.")
+        elif args.query == "side":
+            mods = db.current_mods(args.side)
+            for mod in mods:
+                print(mod['filename'])
+            print(f"{len(mods)} {args.side} mods.")
+        elif args.query == "hash":
+            matches = db.find_hash(args.digest)
+            for kind, name, first_build, last_build in matches:
+                print(f"{kind} {name}: builds {first_build} to {last_build if last_build is not None else 'now'}")
+            if not matches:
+                print("The hash is not known.")
+                exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import os
+import sys
+import toml
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import MODS_DIR, PACKWIZ_CONFIG_FILE, SIG_FILE, PROFILES
+from mod_model import PW_TOML_SUFFIX, load_mods
+from hash_cache import HashCache
+from refresh import load_ignore_patterns, list_pack_files, refresh_pack, update_pack_index_hash
+from sync_tree import copy_file
+
+def read_name_list(path):
+    """Reads a list of mod base filenames, one per line."""
+    if not os.path.exists(path):
+        print(f"Warning: The file '{path}' does not exist.")
+        return set()
+    with open(path, 'r') as f:
+        return {line.strip() for line in f if line.strip()}
+
+def select_mods(profile, mods):
+    """Returns the mods a profile keeps, applying its side filter and exclude list."""
+    sides = set(profile.get('sides', ['client', 'server', 'both']))
+    excluded = read_name_list(profile['exclude_file']) if profile.get('exclude_file') else set()
+    return [mod for mod in mods if mod.data.get('side', 'both') in sides and mod.name not in excluded]
+
+def pack_index_file(pack_root):
+    """Returns the index filename named in a pack's pack.toml, and the pack.toml text."""
+    with open(os.path.join(pack_root, PACKWIZ_CONFIG_FILE), 'r') as f:
+        pack_text = f.read()
+    return toml.loads(pack_text)['index']['file'], pack_text
+
+def link_file(source_path, dest_path):
+    """Hardlinks a file into a profile unless it is already linked. Returns True if it was linked."""
+    if os.path.exists(dest_path) and os.path.samefile(source_path, dest_path):
+        return False
+    copy_file(source_path, dest_path, 'hardlink')
+    return True
+
+def build_profile(name, profile, mods, shared_files, hash_cache, pack_root='.'):
+    """
+    Writes one profile pack: the main pack's files and the profile's mods are
+    hardlinked into its output directory, files no longer in the profile are
+    removed, and its own pack.toml and index are refreshed.
+    Returns the number of files linked and removed.
+    """
+    output_dir = profile['output']
+    selected = select_mods(profile, mods)
+    rel_paths = list(shared_files)
+    rel_paths += [os.path.relpath(mod.path, pack_root).replace(os.sep, '/') for mod in selected]
+
+    linked = 0
+    for rel_path in rel_paths:
+        if link_file(os.path.join(pack_root, rel_path), os.path.join(output_dir, rel_path)):
+            linked += 1
+
+    # The profile's pack.toml follows the main one apart from its own index hash
+    index_file, pack_text = pack_index_file(pack_root)
+    pack_path = os.path.join(output_dir, PACKWIZ_CONFIG_FILE)
+    if os.path.exists(pack_path):
+        with open(pack_path, 'r') as f:
+            profile_pack_text = f.read()
+        index_hash = toml.loads(profile_pack_text)['index']['hash']
+        pack_text = update_pack_index_hash(pack_text, index_hash)
+    else:
+        profile_pack_text = None
+    if pack_text != profile_pack_text:
+        with open(pack_path, 'w', newline='\n') as f:
+            f.write(pack_text)
+
+    keep = set(rel_paths) | {PACKWIZ_CONFIG_FILE, index_file, SIG_FILE}
+    removed = 0
+    for rel_path in list_pack_files(output_dir, load_ignore_patterns(output_dir), keep):
+        os.remove(os.path.join(output_dir, rel_path))
+        removed += 1
+    for dirpath, _, _ in sorted(os.walk(output_dir), reverse=True):
+        if dirpath != output_dir and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+    print(f"Profile '{name}': {len(selected)} of {len(mods)} mods, {linked} files linked, {removed} removed.")
+    refresh_pack(hash_cache, output_dir)
+    return linked, removed
+
+def build_profiles(mods, hash_cache, profiles=PROFILES, pack_root='.'):
+    """
+    Builds every profile from one loaded mod model. The main pack's non-mod
+    files are listed once and shared by all profiles.
+    """
+    index_file, _ = pack_index_file(pack_root)
+    pack_files = list_pack_files(pack_root, load_ignore_patterns(pack_root), {PACKWIZ_CONFIG_FILE, index_file})
+    shared_files = [rel_path for rel_path in pack_files if not rel_path.endswith(PW_TOML_SUFFIX)]
+
+    for name, profile in profiles.items():
+        build_profile(name, profile, mods, shared_files, hash_cache, pack_root)
+
+def main():
+    if not os.path.exists(MODS_DIR):
+        print(f"Error: The directory '{MODS_DIR}' does not exist.")
+        return
+
+    hash_cache = HashCache()
+    build_profiles(load_mods(MODS_DIR), hash_cache)
+    hash_cache.save()
+
+if __name__ == "__main__":
+    main()
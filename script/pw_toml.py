@@ -0,0 +1,472 @@
+import os
+import re
+import sys
+import json
+import time
+import math
+import argparse
+import toml
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import MODS_DIR
+
+# A reader and writer for .pw.toml files. The files use a small, fixed part
+# of TOML: bare keys, [table] headers, strings, integers, booleans and arrays
+# of those, which a single regex-driven pass reads many times faster than the
+# toml package. Edited data is written back by patching the changed values
+# into the original text, so untouched keys keep their order, quoting and
+# layout and an unchanged file comes back byte for byte.
+#
+# Anything outside that subset is handed to the toml package, both for
+# reading and for writing, so every document still reads as it always did.
+
+class UnsupportedSyntax(Exception):
+    """Raised for TOML outside the subset the fast reader handles."""
+
+class Field:
+    """Where a key's value sits in the text, and how its strings are quoted."""
+
+    __slots__ = ('table', 'key', 'line_start', 'value_start', 'value_end', 'line_end', 'quote')
+
+    def __init__(self, table, key, line_start, value_start, value_end, line_end, quote):
+        self.table = table
+        self.key = key
+        self.line_start = line_start
+        self.value_start = value_start
+        self.value_end = value_end
+        self.line_end = line_end
+        self.quote = quote
+
+class Document:
+    """
+    A parsed .pw.toml file: its data, the position of every value, and the
+    offsets new keys are inserted at, for each table.
+    """
+
+    __slots__ = ('text', 'data', 'fields', 'headers', 'table_ends')
+
+    def __init__(self, text, data, fields, headers, table_ends):
+        self.text = text
+        self.data = data
+        # (table path, key) -> Field, in document order
+        self.fields = fields
+        # Table path -> (start, end) of its [header] line
+        self.headers = headers
+        # Table path -> offset just after its last line, where new keys go
+        self.table_ends = table_ends
+
+BARE_KEY = re.compile(r'[A-Za-z0-9_-]+\Z')
+LINE_END = re.compile(r'[ \t]*(?:#[^\n]*)?(?:\n|\Z)')
+KEY_VALUE = re.compile(r'[ \t]*([A-Za-z0-9_-]+)[ \t]*=[ \t]*')
+HEADER = re.compile(r'[ \t]*\[[ \t]*([A-Za-z0-9_-]+(?:[ \t]*\.[ \t]*[A-Za-z0-9_-]+)*)[ \t]*\]')
+LITERAL_STRING = re.compile(r"'([^'\n\r]*)'")
+BASIC_STRING = re.compile(r'"((?:[^"\\\n\r]|\\.)*)"')
+INTEGER = re.compile(r'[+-]?(?:0|[1-9](?:_?[0-9])*)(?=[ \t]*(?:[#,\]\n]|\Z))')
+BOOLEAN = re.compile(r'(?:true|false)(?=[ \t]*(?:[#,\]\n]|\Z))')
+ARRAY_SPACE = re.compile(r'(?:[ \t\n]|#[^\n]*)*')
+ESCAPE = re.compile(r'\\(?:([btnfr"\\])|u([0-9A-Fa-f]{4})|U([0-9A-Fa-f]{8})|(.))')
+CONTROL = re.compile(r'[\x00-\x1f\x7f]')
+
+# One line of the common case: a key with a plain string, integer or boolean,
+# a table header, or a blank or comment line.
+SIMPLE_LINE = re.compile(
+    r"""^[ \t]*(?:([A-Za-z0-9_-]+)[ \t]*=[ \t]*(?:('[^'\n]*'|"[^"\\\n]*")|(-?(?:0|[1-9][0-9]*))|(true|false))"""
+    r"""|\[([A-Za-z0-9_-]+(?:\.[A-Za-z0-9_-]+)*)\])?[ \t]*(?:#[^\n]*)?$""", re.M)
+
+ESCAPES = {'b': '\b', 't': '\t', 'n': '\n', 'f': '\f', 'r': '\r', '"': '"', '\\': '\\'}
+ESCAPED = {value: '\\' + name for name, value in ESCAPES.items()}
+
+def unescape(match):
+    name, short, long, other = match.groups()
+    if other is not None:
+        raise UnsupportedSyntax(f"invalid escape '\\{other}'")
+    if name is not None:
+        return ESCAPES[name]
+    return chr(int(short or long, 16))
+
+def parse_scalar(text, pos):
+    """Reads a string, integer or boolean at `pos`. Returns its value, its end and its quote character."""
+    char = text[pos:pos + 1]
+    if char == "'":
+        if text.startswith("'''", pos):
+            raise UnsupportedSyntax("multi-line string")
+        match = LITERAL_STRING.match(text, pos)
+        if match is None or CONTROL.search(match.group(1).replace('\t', '')):
+            raise UnsupportedSyntax("unterminated string")
+        return match.group(1), match.end(), "'"
+    if char == '"':
+        if text.startswith('"""', pos):
+            raise UnsupportedSyntax("multi-line string")
+        match = BASIC_STRING.match(text, pos)
+        if match is None or CONTROL.search(match.group(1).replace('\t', '')):
+            raise UnsupportedSyntax("unterminated string")
+        value = match.group(1)
+        return (ESCAPE.sub(unescape, value) if '\\' in value else value), match.end(), '"'
+    match = INTEGER.match(text, pos)
+    if match is not None:
+        return int(match.group().replace('_', '')), match.end(), None
+    match = BOOLEAN.match(text, pos)
+    if match is not None:
+        return match.group() == 'true', match.end(), None
+    raise UnsupportedSyntax(f"value at offset {pos}")
+
+def parse_value(text, pos):
+    """Reads a scalar or an array of scalars of one type, which may span several lines."""
+    if not text.startswith('[', pos):
+        return parse_scalar(text, pos)
+    values = []
+    quote = None
+    pos = ARRAY_SPACE.match(text, pos + 1).end()
+    while not text.startswith(']', pos):
+        value, pos, value_quote = parse_scalar(text, pos)
+        if values and type(value) is not type(values[0]):
+            raise UnsupportedSyntax("array of mixed types")
+        values.append(value)
+        quote = quote or value_quote
+        pos = ARRAY_SPACE.match(text, pos).end()
+        if text.startswith(',', pos):
+            pos = ARRAY_SPACE.match(text, pos + 1).end()
+        elif not text.startswith(']', pos):
+            raise UnsupportedSyntax("unterminated array")
+    return values, pos + 1, quote
+
+def table_for(root, path):
+    """Returns the dict of a table, creating it and its parents as needed."""
+    table = root
+    for part in path:
+        table = table.setdefault(part, {})
+        if not isinstance(table, dict):
+            raise UnsupportedSyntax(f"table '{table_name(path)}' redefines a key")
+    return table
+
+def parse(text):
+    """
+    Reads a .pw.toml document with its layout. Raises UnsupportedSyntax if it
+    uses TOML the fast reader does not handle.
+    """
+    if '\r' in text:
+        raise UnsupportedSyntax("carriage return")
+    data = {}
+    fields = {}
+    headers = {}
+    table_ends = {(): 0}
+    path = ()
+    table = data
+    pos = 0
+    length = len(text)
+    while pos < length:
+        line_start = pos
+        match = KEY_VALUE.match(text, pos)
+        if match is not None:
+            key = match.group(1)
+            if key in table:
+                raise UnsupportedSyntax(f"duplicate key '{key}'")
+            value, value_end, quote = parse_value(text, match.end())
+            end = LINE_END.match(text, value_end)
+            if end is None:
+                raise UnsupportedSyntax(f"text after the value of '{key}'")
+            table[key] = value
+            pos = end.end()
+            fields[(path, key)] = Field(path, key, line_start, match.end(), value_end, pos, quote)
+            table_ends[path] = pos
+            continue
+
+        match = HEADER.match(text, pos)
+        if match is not None:
+            end = LINE_END.match(text, match.end())
+            if end is None:
+                raise UnsupportedSyntax("text after a table header")
+            path = tuple(part.strip() for part in match.group(1).split('.'))
+            if path in headers:
+                raise UnsupportedSyntax(f"table '{table_name(path)}' defined twice")
+            table = table_for(data, path)
+            pos = end.end()
+            headers[path] = (line_start, pos)
+            table_ends[path] = pos
+            continue
+
+        end = LINE_END.match(text, pos)
+        if end is None or end.end() == pos:
+            raise UnsupportedSyntax(f"line at offset {pos}")
+        pos = end.end()
+    return Document(text, data, fields, headers, table_ends)
+
+def read_simple(text):
+    """
+    Reads a document made only of simple lines in one regex pass, without
+    recording where anything is. Returns None for any other document.
+    """
+    lines = SIMPLE_LINE.findall(text)
+    if len(lines) != text.count('\n') + 1 or '\r' in text:
+        return None
+    data = {}
+    table = data
+    headers = set()
+    for key, string, integer, boolean, header in lines:
+        if key:
+            if key in table:
+                return None
+            table[key] = string[1:-1] if string else int(integer) if integer else boolean == 'true'
+        elif header:
+            if header in headers:
+                return None
+            headers.add(header)
+            try:
+                table = table_for(data, tuple(header.split('.')))
+            except UnsupportedSyntax:
+                return None
+    return data
+
+def loads(text):
+    """
+    Reads a .pw.toml document. Positions are only worked out when a document
+    is written back, so reading takes a single regex pass for most files.
+    Documents beyond the fast reader are read with the toml package.
+    """
+    data = read_simple(text)
+    if data is not None:
+        return data
+    try:
+        return parse(text).data
+    except UnsupportedSyntax:
+        return toml.loads(text)
+
+def encode_string(value, quote):
+    """Writes a string in the given quote style where it can be, as a basic string otherwise."""
+    if quote == "'" and "'" not in value and not CONTROL.search(value.replace('\t', '')):
+        return f"'{value}'"
+    escaped = ''.join(ESCAPED.get(char) or (f"\\u{ord(char):04x}" if CONTROL.match(char) else char) for char in value)
+    return f'"{escaped}"'
+
+def encode_value(value, quote):
+    """Writes a value in TOML, or returns None for a value the writer does not handle."""
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value) if math.isfinite(value) else None
+    if isinstance(value, str):
+        return encode_string(value, quote)
+    if isinstance(value, list):
+        if any(isinstance(item, (list, dict)) for item in value):
+            return None
+        items = [encode_value(item, quote) for item in value]
+        return f"[{', '.join(items)}]" if None not in items else None
+    return None
+
+def flatten(data, path=()):
+    """Lists the values of a document as (table path, key, value), and the path of every table."""
+    values = []
+    tables = [path]
+    for key, value in data.items():
+        if isinstance(value, dict):
+            table_values, child_tables = flatten(value, path + (key,))
+            values += table_values
+            tables += child_tables
+        else:
+            values.append((path, key, value))
+    return values, tables
+
+def table_name(path):
+    return '.'.join(path)
+
+def document_quote(document):
+    """The quote style of the document's first string, which new strings follow."""
+    return next((field.quote for field in document.fields.values() if field.quote), '"')
+
+def document_value(document, path, key):
+    table = document.data
+    for part in path:
+        table = table[part]
+    return table[key]
+
+def patch(document, data):
+    """
+    Returns the text of `data` written over the document it was read from:
+    changed values are replaced where they stand, removed keys lose their
+    line, and new keys are added at the end of their table. Returns None if
+    the data cannot be written this way.
+    """
+    text = document.text
+    quote = document_quote(document)
+    values, tables = flatten(data)
+    edits = []
+    kept = set()
+    inserts = {}
+    new_tables = {}
+    for path, key, value in values:
+        if not BARE_KEY.match(key) or not all(BARE_KEY.match(part) for part in path):
+            return None
+        field = document.fields.get((path, key))
+        if field is not None:
+            kept.add((path, key))
+            current = document_value(document, path, key)
+            if type(value) is type(current) and value == current:
+                continue
+            encoded = encode_value(value, field.quote or quote)
+            if encoded is None:
+                return None
+            edits.append((field.value_start, field.value_end, encoded))
+            continue
+        encoded = encode_value(value, quote)
+        if encoded is None:
+            return None
+        # Tables that only exist as the parent of another, like [update], have no header to add keys under
+        if path == () or path in document.headers:
+            inserts.setdefault(path, []).append(f"{key} = {encoded}")
+        else:
+            new_tables.setdefault(path, []).append(f"{key} = {encoded}")
+
+    for (path, key), field in document.fields.items():
+        if (path, key) not in kept:
+            edits.append((field.line_start, field.line_end, ''))
+    table_paths = set(tables)
+    for path, (start, end) in document.headers.items():
+        if path not in table_paths:
+            edits.append((start, end, ''))
+
+    for path, lines in inserts.items():
+        at = document.table_ends[path]
+        if at == len(text) and text and not text.endswith('\n'):
+            edits.append((at, at, ''.join('\n' + line for line in lines)))
+        else:
+            edits.append((at, at, ''.join(line + '\n' for line in lines)))
+
+    if new_tables:
+        body = '\n\n'.join(f"[{table_name(path)}]\n" + '\n'.join(lines) for path, lines in new_tables.items())
+        if not text:
+            edits.append((0, 0, body + '\n'))
+        elif text.endswith('\n'):
+            edits.append((len(text), len(text), '\n' + body + '\n'))
+        else:
+            edits.append((len(text), len(text), '\n\n' + body))
+
+    # Applied from the end so earlier offsets stay valid
+    for start, end, replacement in sorted(edits, key=lambda edit: (edit[0], edit[1]), reverse=True):
+        text = text[:start] + replacement + text[end:]
+    return text
+
+def dumps(data, original_text=None):
+    """
+    Writes a .pw.toml document. Given the text it was read from, only the
+    changed values are rewritten; otherwise, or where the data cannot be
+    patched in, the whole document is written with the toml package.
+    """
+    if original_text is not None:
+        try:
+            document = parse(original_text)
+        except UnsupportedSyntax:
+            # Left as it is unless the data actually changed
+            if toml.loads(original_text) == data:
+                return original_text
+        else:
+            text = patch(document, data)
+            # The patched text must read back as the data, or it is not used
+            if text is not None and loads(text) == data:
+                return text
+    return toml.dumps(data)
+
+def edited_copies(data):
+    """Yields copies of a document with one value changed, one key removed or one key added."""
+    values, _ = flatten(data)
+    for path, key, value in values:
+        for edit in ('change', 'remove'):
+            copy = json.loads(json.dumps(data))
+            table = copy
+            for part in path:
+                table = table[part]
+            if edit == 'remove':
+                del table[key]
+            elif isinstance(value, bool) or not isinstance(value, (str, int)):
+                continue
+            else:
+                table[key] = value + ("-edited" if isinstance(value, str) else 1)
+            yield f"{edit} {table_name(path + (key,))}", copy
+    for path in sorted({()} | {path for path, _, _ in values}):
+        copy = json.loads(json.dumps(data))
+        table_for(copy, path)['x-added'] = "it's added"
+        yield f"add {table_name(path + ('x-added',))}", copy
+
+def check_fidelity(mods_dir=MODS_DIR):
+    """
+    Checks the codec against every .pw.toml file in a directory: each must
+    read the same as with the toml package and write back unchanged, and
+    every single-key edit must read back as the edited data while changing
+    no more lines than it has to. Returns the number of failures.
+    """
+    failures = 0
+    edits = 0
+    fallbacks = 0
+    for filename in sorted(os.listdir(mods_dir)):
+        if not filename.endswith('.pw.toml'):
+            continue
+        with open(os.path.join(mods_dir, filename), 'r') as f:
+            text = f.read()
+        try:
+            data = parse(text).data
+        except UnsupportedSyntax as e:
+            print(f"Note: {filename} is read with the toml package: {e}")
+            fallbacks += 1
+            continue
+        if data != toml.loads(text) or loads(text) != data:
+            print(f"Error: {filename} reads differently from the toml package.")
+            failures += 1
+            continue
+        if dumps(data, text) != text:
+            print(f"Error: {filename} does not write back unchanged.")
+            failures += 1
+            continue
+        original_lines = text.splitlines()
+        for description, edited in edited_copies(data):
+            edits += 1
+            document = parse(text)
+            patched = patch(document, edited)
+            if patched is None or toml.loads(patched) != edited:
+                print(f"Error: {filename}: '{description}' does not read back as the edited data.")
+                failures += 1
+                continue
+            patched_lines = patched.splitlines()
+            changed = len(set(original_lines) ^ set(patched_lines))
+            if changed > 2 + description.startswith('add') * 2:
+                print(f"Error: {filename}: '{description}' changed {changed} lines.")
+                failures += 1
+    print(f"Checked {edits} edits: {failures} failures, {fallbacks} files left to the toml package.")
+    return failures
+
+def time_parsers(mods_dir=MODS_DIR, rounds=5):
+    """Prints how long reading every .pw.toml file takes with the codec and with the toml package."""
+    texts = []
+    for filename in sorted(os.listdir(mods_dir)):
+        if filename.endswith('.pw.toml'):
+            with open(os.path.join(mods_dir, filename), 'r') as f:
+                texts.append(f.read())
+    timings = {}
+    for name, reader in (('pw_toml', loads), ('toml', toml.loads)):
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                reader(text)
+        timings[name] = (time.perf_counter() - start) / rounds
+    print(f"Read {len(texts)} files in {timings['pw_toml'] * 1000:.1f}ms, {timings['toml'] * 1000:.1f}ms with the "
+          f"toml package ({timings['toml'] / timings['pw_toml']:.1f}x).")
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the .pw.toml codec against the pack's mods.")
+    parser.add_argument("mods_dir", nargs="?", default=MODS_DIR, help="The directory of .pw.toml files to check.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.mods_dir):
+        print(f"Error: The directory '{args.mods_dir}' does not exist.")
+        exit(1)
+    time_parsers(args.mods_dir)
+    if check_fidelity(args.mods_dir):
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+import os
+import re
+import sys
+import toml
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import PACKWIZ_CONFIG_FILE
+from hash_cache import HashCache
+
+# The ignore file read by packwiz, in .gitignore format.
+PACKWIZ_IGNORE_FILE = '.packwizignore'
+
+# Patterns packwiz always ignores, before the patterns in .packwizignore.
+DEFAULT_IGNORE_PATTERNS = [
+    '.git/**',
+    '.gitattributes',
+    '.gitignore',
+    '.packwizignore',
+    '.DS_Store',
+    '/*.zip',
+    '*.mrpack',
+    'packwiz.exe',
+    'packwiz',
+]
+
+METAFILE_SUFFIX = '.pw.toml'
+
+def glob_to_regex(pattern):
+    """Translates a .gitignore glob into a regular expression body."""
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i):
+            regex += '(?:.*/)?'
+            i += 3
+        elif pattern.startswith('/**', i) and i + 3 == len(pattern):
+            regex += '/.*'
+            i += 3
+        elif pattern.startswith('**', i):
+            regex += '.*'
+            i += 2
+        elif pattern[i] == '*':
+            regex += '[^/]*'
+            i += 1
+        elif pattern[i] == '?':
+            regex += '[^/]'
+            i += 1
+        elif pattern[i] == '[' and ']' in pattern[i + 1:]:
+            end = pattern.index(']', i + 1)
+            regex += '[' + pattern[i + 1:end].replace('\\', '\\\\') + ']'
+            i = end + 1
+        elif pattern[i] == '\\' and i + 1 < len(pattern):
+            regex += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            regex += re.escape(pattern[i])
+            i += 1
+    return regex
+
+def compile_ignore_patterns(lines):
+    """
+    Compiles .gitignore style lines into a list of
+    (regex, negated, directory_only) tuples.
+    """
+    patterns = []
+    for line in lines:
+        line = line.rstrip('\n').rstrip(' ')
+        if not line or line.startswith('#'):
+            continue
+
+        negated = line.startswith('!')
+        if negated:
+            line = line[1:]
+        directory_only = line.endswith('/')
+        line = line.rstrip('/')
+
+        # Patterns containing a slash are relative to the pack root
+        anchored = '/' in line
+        line = line.lstrip('/')
+        prefix = '^' if anchored else '^(?:.*/)?'
+        patterns.append((re.compile(prefix + glob_to_regex(line) + '$'), negated, directory_only))
+    return patterns
+
+def load_ignore_patterns(pack_root='.'):
+    """Returns the compiled default patterns followed by those in .packwizignore."""
+    lines = list(DEFAULT_IGNORE_PATTERNS)
+    ignore_path = os.path.join(pack_root, PACKWIZ_IGNORE_FILE)
+    if os.path.exists(ignore_path):
+        with open(ignore_path, 'r') as f:
+            lines += f.read().splitlines()
+    return compile_ignore_patterns(lines)
+
+def is_ignored(rel_path, is_dir, patterns):
+    """Checks a '/' separated path against the patterns; the last match wins."""
+    ignored = False
+    for regex, negated, directory_only in patterns:
+        if directory_only and not is_dir:
+            continue
+        if regex.match(rel_path):
+            ignored = not negated
+    return ignored
+
+def list_pack_files(pack_root, patterns, skip_files):
+    """
+    Walks the pack root and returns the sorted, '/' separated paths of every
+    file that packwiz would index.
+    """
+    pack_files = []
+    for dirpath, dirnames, filenames in os.walk(pack_root):
+        rel_dir = os.path.relpath(dirpath, pack_root).replace(os.sep, '/')
+        rel_dir = '' if rel_dir == '.' else rel_dir + '/'
+
+        # Prune ignored directories so their contents are never visited
+        dirnames[:] = [d for d in dirnames if not is_ignored(rel_dir + d, True, patterns)]
+        for filename in filenames:
+            rel_path = rel_dir + filename
+            if rel_path not in skip_files and not is_ignored(rel_path, False, patterns):
+                pack_files.append(rel_path)
+
+    return sorted(pack_files)
+
+def quote_toml_string(value):
+    """Quotes a value as a TOML basic string, as packwiz does."""
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"')
+    escaped = re.sub(r'[\x00-\x1f\x7f]', lambda m: '\\u%04X' % ord(m.group()), escaped)
+    return f'"{escaped}"'
+
+def read_index_entries(index_path):
+    """
+    Splits an existing index.toml into its hash format and the raw text of
+    each [[files]] entry, keyed on the entry's file path.
+    """
+    if not os.path.exists(index_path):
+        return None, {}
+
+    with open(index_path, 'r') as f:
+        text = f.read()
+
+    header, *blocks = text.split('\n[[files]]\n')
+    match = re.search(r'^hash-format = "(.*)"', header, re.MULTILINE)
+    hash_format = match.group(1) if match else None
+
+    entries = {}
+    for block in blocks:
+        lines = block.rstrip('\n').split('\n')
+        file_line = next((line for line in lines if line.startswith('file = ')), None)
+        if file_line is not None:
+            entries[toml.loads(file_line)['file']] = lines
+    return hash_format, entries
+
+def format_index_entry(rel_path, file_hash, previous_lines):
+    """
+    Returns the lines of an index entry. Unchanged entries are reused as they
+    are; changed entries keep any extra keys, such as 'preserve' or 'alias'.
+    """
+    hash_line = f'hash = {quote_toml_string(file_hash)}'
+    if previous_lines is not None:
+        if hash_line in previous_lines:
+            return previous_lines
+        return [hash_line if line.startswith('hash = ') else line for line in previous_lines]
+
+    lines = [f'file = {quote_toml_string(rel_path)}', hash_line]
+    if rel_path.endswith(METAFILE_SUFFIX):
+        lines.append('metafile = true')
+    return lines
+
+def update_pack_index_hash(pack_text, index_hash):
+    """Patches the hash in the [index] table of pack.toml, leaving everything else as it is."""
+    match = re.search(r'^\[index\]\n(?:(?!\[).*\n)*?hash = ".*"$', pack_text, re.MULTILINE)
+    if match is None:
+        raise ValueError(f"No [index] hash found in {PACKWIZ_CONFIG_FILE}")
+    section = re.sub(r'^hash = ".*"$', f'hash = {quote_toml_string(index_hash)}', match.group(), flags=re.MULTILINE)
+    return pack_text[:match.start()] + section + pack_text[match.end():]
+
+def refresh_pack(hash_cache, pack_root='.'):
+    """
+    Regenerates index.toml and the index hash in pack.toml, producing the
+    same output as `packwiz refresh`. Files are hashed in parallel through
+    the hash cache, and index entries whose hash did not change are reused.
+    Returns the number of entries that were added, changed or removed.
+    """
+    pack_path = os.path.join(pack_root, PACKWIZ_CONFIG_FILE)
+    with open(pack_path, 'r') as f:
+        pack_text = f.read()
+    pack_data = toml.loads(pack_text)
+    index_file = pack_data['index']['file']
+    hash_format = pack_data['index'].get('hash-format', 'sha256')
+    index_path = os.path.join(pack_root, index_file)
+
+    previous_format, previous_entries = read_index_entries(index_path)
+    if previous_format != hash_format:
+        previous_entries = {}
+
+    patterns = load_ignore_patterns(pack_root)
+    pack_files = list_pack_files(pack_root, patterns, {PACKWIZ_CONFIG_FILE, index_file})
+    file_hashes = hash_cache.hash_files([os.path.join(pack_root, rel_path) for rel_path in pack_files], hash_format)
+
+    blocks = []
+    changed = len(set(previous_entries) - set(pack_files))
+    for rel_path in pack_files:
+        previous_lines = previous_entries.get(rel_path)
+        lines = format_index_entry(rel_path, file_hashes[os.path.join(pack_root, rel_path)], previous_lines)
+        if lines is not previous_lines:
+            changed += 1
+        blocks.append('\n'.join(lines))
+
+    index_text = f'hash-format = {quote_toml_string(hash_format)}\n'
+    index_text += ''.join(f'\n[[files]]\n{block}\n' for block in blocks)
+    old_index = None
+    if os.path.exists(index_path):
+        with open(index_path, 'rb') as f:
+            old_index = f.read()
+    if old_index != index_text.encode('utf-8'):
+        with open(index_path, 'w', newline='\n') as f:
+            f.write(index_text)
+
+    index_hash = hash_cache.hash_file(index_path, hash_format)
+    new_pack_text = update_pack_index_hash(pack_text, index_hash)
+    if new_pack_text != pack_text:
+        with open(pack_path, 'w', newline='\n') as f:
+            f.write(new_pack_text)
+
+    print(f"Refreshed {index_file}: {len(pack_files)} files, {changed} entries added, changed or removed.")
+    return changed
+
+def main():
+    hash_cache = HashCache()
+    refresh_pack(hash_cache)
+    hash_cache.save()
+
+if __name__ == "__main__":
+    main()
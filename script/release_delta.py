@@ -0,0 +1,144 @@
+import os
+import sys
+import gzip
+import json
+import toml
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import (PACKWIZ_CONFIG_FILE, RELEASE_INDEX_FILE, RELEASE_DELTAS_DIR, RELEASE_DELTA_HISTORY)
+
+RELEASE_FORMAT_VERSION = 1
+
+def read_pack_index(pack_root='.'):
+    """
+    Returns the hash format, the index hash recorded in pack.toml and the
+    index entries sorted by path, each as a [path, hash, metafile] list.
+    """
+    with open(os.path.join(pack_root, PACKWIZ_CONFIG_FILE), 'r') as f:
+        index_info = toml.load(f)['index']
+    index = toml.load(os.path.join(pack_root, index_info['file']))
+    files = sorted([entry['file'], entry['hash'], bool(entry.get('metafile'))] for entry in index.get('files', []))
+    return index.get('hash-format', index_info['hash-format']), index_info['hash'], files
+
+def load_release_index(index_path=RELEASE_INDEX_FILE):
+    """Loads the compressed index of the last release, or None if there is none."""
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with gzip.open(index_path, 'rt') as f:
+            release = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Warning: Could not read the release index '{index_path}': {e}")
+        return None
+    return release if release.get('version') == RELEASE_FORMAT_VERSION else None
+
+def diff_indexes(old_files, new_files):
+    """
+    Diffs two path-sorted index entry lists in a single merge pass.
+    Returns the added, changed and removed entries; removed entries are paths.
+    """
+    added, changed, removed = [], [], []
+    i = j = 0
+    while i < len(old_files) or j < len(new_files):
+        if j == len(new_files) or (i < len(old_files) and old_files[i][0] < new_files[j][0]):
+            removed.append(old_files[i][0])
+            i += 1
+        elif i == len(old_files) or new_files[j][0] < old_files[i][0]:
+            added.append(new_files[j])
+            j += 1
+        else:
+            if old_files[i] != new_files[j]:
+                changed.append(new_files[j])
+            i += 1
+            j += 1
+    return added, changed, removed
+
+def write_json(path, data, compress=False):
+    """Writes compact JSON atomically. Compressed files get a fixed gzip timestamp so rebuilds are byte-identical."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    data = json.dumps(data, separators=(',', ':')).encode('utf-8')
+    if compress:
+        data = gzip.compress(data, compresslevel=9, mtime=0)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def prune_deltas(release_number, deltas_dir=RELEASE_DELTAS_DIR, history=RELEASE_DELTA_HISTORY):
+    """Removes delta manifests more than `history` releases old. Returns the number removed."""
+    if not os.path.isdir(deltas_dir):
+        return 0
+    removed = 0
+    for filename in os.listdir(deltas_dir):
+        delta_path = os.path.join(deltas_dir, filename)
+        try:
+            with open(delta_path, 'r') as f:
+                delta_release = json.load(f)['release']
+        except (OSError, ValueError, KeyError):
+            continue
+        if delta_release <= release_number - history:
+            os.remove(delta_path)
+            removed += 1
+    return removed
+
+def publish_release(pack_root='.'):
+    """
+    Publishes the current index as a new release if it changed since the last
+    one. The index is written pre-sorted and gzipped to RELEASE_INDEX_FILE, and
+    the changes from the previous release to a delta manifest in
+    RELEASE_DELTAS_DIR named after the previous index hash.
+
+    A client holding index hash H fetches deltas/H.json, applies it and
+    follows its "to" hash until it reaches the hash in the signed pack.toml,
+    falling back to the full index if a delta is missing.
+    Returns the new release number and its delta (None for the first
+    release), or (None, None) if nothing changed.
+    """
+    hash_format, index_hash, files = read_pack_index(pack_root)
+    previous = load_release_index(os.path.join(pack_root, RELEASE_INDEX_FILE))
+    if previous is not None and previous['index-hash'] == index_hash:
+        return None, None
+
+    release_number = previous['release'] + 1 if previous is not None else 1
+    delta = None
+    if previous is not None and previous['hash-format'] == hash_format:
+        added, changed, removed = diff_indexes(previous['files'], files)
+        delta = {
+            'version': RELEASE_FORMAT_VERSION,
+            'release': release_number,
+            'hash-format': hash_format,
+            'from': previous['index-hash'],
+            'to': index_hash,
+            'added': added,
+            'changed': changed,
+            'removed': removed,
+        }
+        write_json(os.path.join(pack_root, RELEASE_DELTAS_DIR, previous['index-hash'] + '.json'), delta)
+        prune_deltas(release_number, os.path.join(pack_root, RELEASE_DELTAS_DIR))
+
+    write_json(os.path.join(pack_root, RELEASE_INDEX_FILE), {
+        'version': RELEASE_FORMAT_VERSION,
+        'release': release_number,
+        'hash-format': hash_format,
+        'index-hash': index_hash,
+        'files': files,
+    }, compress=True)
+    return release_number, delta
+
+def main():
+    release_number, delta = publish_release()
+    if release_number is None:
+        print("The index has not changed since the last release.")
+    elif delta is None:
+        print(f"Published release {release_number} with no earlier release to diff against.")
+    else:
+        print(f"Published release {release_number}: {len(delta['added'])} added, "
+              f"{len(delta['changed'])} changed, {len(delta['removed'])} removed.")
+
+if __name__ == "__main__":
+    main()
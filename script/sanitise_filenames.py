@@ -11,6 +11,18 @@ sys.path.append(parent_dir)
 
 from config import SANITISE_DIRS
 
+# The paths main() reads and writes, so the build can run it alongside
+# stages that do not touch them.
+READS = SANITISE_DIRS
+WRITES = SANITISE_DIRS
+
+def sanitise_filename(filename):
+    """
+    Returns the filename with spaces replaced and square brackets removed.
+    """
+    sanitized_name = filename.replace(' ', '_')
+    return re.sub(r'[\[\]]', '', sanitized_name)
+
 def sanitize_and_update_filenames(directory):
     """
     Iterates through all .zip files in a directory, sanitizes their names,
@@ -25,8 +37,7 @@ def sanitize_and_update_filenames(directory):
             file_path = os.path.join(directory, filename)
             
             # Sanitize the filename
-            sanitized_name = filename.replace(' ', '_')
-            sanitized_name = re.sub(r'[\[\]]', '', sanitized_name)
+            sanitized_name = sanitise_filename(filename)
             
             # Only rename if a change is needed
             if filename != sanitized_name:
@@ -0,0 +1,136 @@
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import STAGE_WORKERS
+
+class StageCancelled(Exception):
+    """Raised inside a stage that stopped early because another stage failed."""
+
+class ScheduledStage:
+    """
+    A pipeline stage and the paths it reads and writes. Paths cover everything
+    below them, and in-memory state shared between stages is named
+    'state:<name>'.
+    """
+
+    def __init__(self, name, run, reads=(), writes=()):
+        self.name = name
+        self.run = run
+        self.reads = [normalise_resource(path) for path in reads]
+        self.writes = [normalise_resource(path) for path in writes]
+
+    def __repr__(self):
+        return f"ScheduledStage({self.name!r})"
+
+def normalise_resource(path):
+    """Makes paths absolute so paths given relative to the pack and to the instance compare."""
+    if path.startswith('state:'):
+        return path
+    return os.path.abspath(path).replace(os.sep, '/').rstrip('/')
+
+def overlaps(paths, other_paths):
+    """Checks whether any path in one list is, or is inside or above, a path in the other."""
+    for path in paths:
+        for other_path in other_paths:
+            if path == other_path or other_path.startswith(path + '/') or path.startswith(other_path + '/'):
+                return True
+    return False
+
+def stage_dependencies(stages):
+    """
+    Returns the stages each stage waits for: every earlier stage that writes
+    what it reads or writes, or reads what it writes. Everything else keeps
+    the order it was declared in only where it has to.
+    """
+    dependencies = {}
+    for i, stage in enumerate(stages):
+        dependencies[stage] = {
+            earlier for earlier in stages[:i]
+            if overlaps(earlier.writes, stage.reads + stage.writes) or overlaps(earlier.reads, stage.writes)
+        }
+    return dependencies
+
+def critical_path(stages, dependencies, durations):
+    """Returns the longest chain of dependent stages by wall time, and its length in seconds."""
+    finish = {}
+    chain = {}
+    for stage in stages:
+        before = max(dependencies[stage], key=lambda dependency: finish[dependency], default=None)
+        finish[stage] = durations.get(stage, 0.0) + (finish[before] if before is not None else 0.0)
+        chain[stage] = (chain[before] if before is not None else []) + [stage]
+    last = max(stages, key=lambda stage: finish[stage], default=None)
+    return (chain[last], finish[last]) if last is not None else ([], 0.0)
+
+def run_stages(stages, workers=STAGE_WORKERS, cancel=None):
+    """
+    Runs stages on a thread pool, starting each as soon as the stages it
+    depends on have finished, so the build takes as long as its longest chain
+    of dependent stages rather than the sum of them all. With one worker the
+    stages run one by one in the order given.
+
+    If a stage fails, no further stages are started and `cancel` is set so
+    running stages can stop early; once they have finished, the first
+    failure is re-raised. SystemExit from a stage's exit(1) is propagated
+    the same way.
+    """
+    cancel = cancel or threading.Event()
+    cancel.clear()
+    dependencies = stage_dependencies(stages)
+    pending = list(stages)
+    running = {}
+    finished = set()
+    durations = {}
+    failure = None
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        try:
+            while pending or running:
+                if failure is None:
+                    for stage in [stage for stage in pending if dependencies[stage] <= finished]:
+                        if len(running) >= max(1, workers):
+                            break
+                        pending.remove(stage)
+                        running[executor.submit(timed, stage)] = stage
+                if not running:
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    try:
+                        durations[stage] = future.result()
+                        finished.add(stage)
+                    except BaseException as e:
+                        if failure is None:
+                            failure = e
+                            cancel.set()
+                            print(f"Error: Stage '{stage.name}' failed, waiting for {len(running)} running stages.")
+        except BaseException:
+            # Interrupted while waiting, e.g. by Ctrl+C: let running stages stop early
+            cancel.set()
+            raise
+
+    if failure is not None:
+        if pending:
+            print(f"Cancelled {len(pending)} stages: {', '.join(stage.name for stage in pending)}.")
+        raise failure
+
+    chain, length = critical_path(stages, dependencies, durations)
+    if len(chain) < len(stages):
+        print(f"Critical path: {' -> '.join(stage.name for stage in chain)} ({length:.2f}s of "
+              f"{sum(durations.values()):.2f}s in total).")
+    return durations
+
+def timed(stage):
+    start = time.perf_counter()
+    stage.run()
+    return time.perf_counter() - start
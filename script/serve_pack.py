@@ -0,0 +1,447 @@
+import os
+import re
+import sys
+import socket
+import asyncio
+import hashlib
+import argparse
+import tempfile
+import threading
+import mimetypes
+import toml
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, quote, unquote
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import (PACKWIZ_CONFIG_FILE, SIG_FILE, SIGNIFY_SECRET_KEY, VERIFY_PER_HOST, VERIFY_RETRIES,
+                    VERIFY_TIMEOUT, SERVE_HOST, SERVE_PORT, SERVE_PUBLIC_URL)
+from mod_model import ModFile
+from refresh import format_index_entry, update_pack_index_hash
+from export_server import curseforge_url
+from content_store import ContentStore
+from http_client import HttpClient, upstream_url, with_retries
+from verify_urls import Download, SUPPORTED_HASH_FORMATS, verify_hash
+from signify import SignifyError, sign_files
+
+# Serves the pack to clients and servers on the local network, so each mod jar
+# is downloaded from upstream once rather than once per install:
+#
+#     python script/serve_pack.py --sign
+#
+# pack.toml, the index and every file in it are served from the pack, with
+# the download URL of each mod pointed at the server's jar cache under
+# /store/<hash format>/<hash>/<filename>. The cache is the content store, and
+# a jar missing from it is fetched from its upstream URL on first request and
+# checked against its hash before it is served. Range requests and
+# If-None-Match / If-Modified-Since are supported throughout.
+#
+# Rewriting the URLs changes pack.toml, so its signature no longer matches:
+# --sign signs the served pack.toml with the pack's secret key, or clients
+# have to drop public_key from their unsup.ini. Point unsup's source at
+# <public URL>/pack.toml.
+#
+# --upstream fetches every jar from <upstream>/<host>/<path> instead of its
+# own URL, so the server can be tried against a local stand-in:
+#
+#     python -m http.server 8000 --directory upstream &
+#     python script/serve_pack.py --upstream http://127.0.0.1:8000
+
+# Jars are content-addressed, so clients may cache them for good.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+HEX_DIGEST = re.compile(r'[0-9a-f]+')
+
+class ServedFile:
+    """A file the server answers with: held in memory, or read from disk when it is served."""
+
+    __slots__ = ('path', 'body', 'etag', 'mtime', 'content_type', 'cache_control')
+
+    def __init__(self, name, path, body, digest, mtime=None, cache_control='no-cache'):
+        self.path = path
+        self.body = body
+        self.etag = f'"{digest}"'
+        self.mtime = mtime
+        self.content_type = content_type(name)
+        self.cache_control = cache_control
+
+class Snapshot:
+    """The files served for one version of the pack, and the upstream download of each jar."""
+
+    __slots__ = ('paths', 'stamp', 'files', 'jars')
+
+    def __init__(self, paths, stamp, files, jars):
+        self.paths = paths
+        self.stamp = stamp
+        self.files = files
+        self.jars = jars
+
+def content_type(path):
+    if path.endswith('.toml'):
+        return 'application/toml'
+    if path.endswith('.jar'):
+        return 'application/java-archive'
+    return mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+def file_stamp(*paths):
+    """Changes whenever one of the files is rewritten, so the server knows to reload the pack."""
+    stamp = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            stamp.append(None)
+            continue
+        stamp.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(stamp)
+
+def rewrite_mod(mod, public_url, upstream=None):
+    """
+    Points a mod's download at the server's jar cache. Returns the Download
+    the cache is filled from, or None if the mod is left pointing upstream.
+    """
+    data = mod.data
+    download = data.get('download', {})
+    algorithm = download.get('hash-format')
+    digest = download.get('hash', '').lower()
+    url = download.get('url') or curseforge_url(data)
+    if algorithm not in SUPPORTED_HASH_FORMATS or not digest or not url:
+        return None
+    download['url'] = f"{public_url}/store/{algorithm}/{digest}/{quote(data['filename'])}"
+    # CurseForge mods are otherwise resolved through the CurseForge API
+    if download.get('mode', 'url') != 'url':
+        download['mode'] = 'url'
+    mod.save_data()
+    return Download(mod.path, upstream_url(url, upstream), algorithm, digest)
+
+def sign_pack(pack_body, secret_key_path=SIGNIFY_SECRET_KEY):
+    """Signs the served pack.toml, returning the contents of its signature file."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        pack_path = os.path.join(tmp_dir, PACKWIZ_CONFIG_FILE)
+        with open(pack_path, 'wb') as f:
+            f.write(pack_body)
+        sign_files([(pack_path, pack_path + '.sig')], secret_key_path)
+        with open(pack_path + '.sig', 'rb') as f:
+            return f.read()
+
+def load_snapshot(public_url, upstream=None, sign=False, pack_root='.'):
+    """
+    Reads the pack and builds what the server answers with. Mods are
+    rewritten to download from the server, so their index entries, the index
+    and its hash in pack.toml are rewritten to match; every other file is
+    served from the pack as it is.
+    """
+    pack_path = os.path.join(pack_root, PACKWIZ_CONFIG_FILE)
+    with open(pack_path, 'r') as f:
+        pack_text = f.read()
+    index_info = toml.loads(pack_text)['index']
+    index_file = index_info['file']
+    hash_format = index_info.get('hash-format', 'sha256')
+    index_path = os.path.join(pack_root, index_file)
+    paths = (pack_path, index_path)
+    stamp = file_stamp(*paths)
+    mtime = os.path.getmtime(pack_path)
+    with open(index_path, 'r') as f:
+        index_text = f.read()
+
+    header, *blocks = index_text.split('\n[[files]]\n')
+    files = {}
+    jars = {}
+    served_blocks = []
+    for block in blocks:
+        lines = block.rstrip('\n').split('\n')
+        entry = toml.loads('\n'.join(lines))
+        rel_path = entry['file']
+        source_path = os.path.join(pack_root, rel_path)
+        if entry.get('metafile'):
+            with open(source_path, 'r') as f:
+                mod = ModFile(source_path, f.read())
+            download = rewrite_mod(mod, public_url, upstream)
+            if download is not None:
+                jars[(download.hash_format, download.digest)] = download
+                body = mod.text.encode('utf-8')
+                digest = hashlib.new(hash_format, body).hexdigest()
+                files[rel_path] = ServedFile(rel_path, None, body, digest, mtime)
+                served_blocks.append(format_index_entry(rel_path, digest, lines))
+                continue
+        files[rel_path] = ServedFile(rel_path, source_path, None, entry['hash'])
+        served_blocks.append(lines)
+
+    index_text = header + ''.join('\n[[files]]\n' + '\n'.join(lines) + '\n' for lines in served_blocks)
+    index_body = index_text.encode('utf-8')
+    index_hash = hashlib.new(hash_format, index_body).hexdigest()
+    pack_body = update_pack_index_hash(pack_text, index_hash).encode('utf-8')
+    files[index_file] = ServedFile(index_file, None, index_body, index_hash, mtime)
+    files[PACKWIZ_CONFIG_FILE] = ServedFile(PACKWIZ_CONFIG_FILE, None, pack_body, hashlib.sha256(pack_body).hexdigest(),
+                                            mtime)
+    if sign:
+        sig_body = sign_pack(pack_body)
+        files[SIG_FILE] = ServedFile(SIG_FILE, None, sig_body, hashlib.sha256(sig_body).hexdigest(), mtime)
+    return Snapshot(paths, stamp, files, jars)
+
+def parse_http_date(value):
+    """Returns the timestamp of an HTTP date, or None if it is missing or malformed."""
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+def parse_range(header, size):
+    """
+    Parses a Range header into a (start, end) byte range, end exclusive.
+    Returns None for a header that is missing, malformed or asks for several
+    ranges, which is answered with the whole file, and False for a range that
+    starts past the end of the file.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition('=')
+    first, dash, last = spec.strip().partition('-')
+    if unit.strip() != 'bytes' or ',' in spec or not dash:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) + 1 if last else None
+            if end is not None and end <= start:
+                return None
+        else:
+            # A suffix range: the last N bytes
+            length = int(last)
+            if length <= 0:
+                return False
+            start, end = max(size - length, 0), size
+    except ValueError:
+        return None
+    if start >= size:
+        return False
+    return start, size if end is None else min(end, size)
+
+class PackRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self):
+        self.serve(True)
+
+    def do_HEAD(self):
+        self.serve(False)
+
+    def send_status(self, status, headers=()):
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def resolve(self):
+        """Returns the ServedFile for the request path, or None and the status to answer with."""
+        rel_path = unquote(urlsplit(self.path).path).lstrip('/')
+        snapshot = self.server.current_snapshot()
+        served = snapshot.files.get(rel_path)
+        if served is not None:
+            return served, None
+        segments = rel_path.split('/')
+        if len(segments) == 4 and segments[0] == 'store':
+            return self.server.jar(snapshot, segments[1], segments[2].lower(), segments[3])
+        return None, 404
+
+    def not_modified(self, served, mtime):
+        """If-None-Match takes precedence; If-Modified-Since is only used without it."""
+        if_none_match = self.headers.get('If-None-Match')
+        if if_none_match is not None:
+            tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+            return '*' in tags or served.etag in tags
+        since = parse_http_date(self.headers.get('If-Modified-Since'))
+        return since is not None and int(mtime) <= since
+
+    def requested_range(self, served, size, last_modified):
+        """The byte range asked for, ignored if If-Range names another version of the file."""
+        if_range = self.headers.get('If-Range')
+        if if_range is not None and if_range.strip() not in (served.etag, last_modified):
+            return None
+        return parse_range(self.headers.get('Range'), size)
+
+    def serve(self, send_body):
+        self.server.count(requests=1)
+        served, status = self.resolve()
+        if served is None:
+            return self.send_status(status)
+        if served.body is not None:
+            size, mtime = len(served.body), served.mtime
+        else:
+            try:
+                stat = os.stat(served.path)
+            except OSError:
+                return self.send_status(404)
+            size, mtime = stat.st_size, stat.st_mtime
+
+        last_modified = formatdate(mtime, usegmt=True)
+        validators = [('ETag', served.etag), ('Last-Modified', last_modified), ('Cache-Control', served.cache_control)]
+        if self.not_modified(served, mtime):
+            return self.send_status(304, validators)
+        byte_range = self.requested_range(served, size, last_modified)
+        if byte_range is False:
+            return self.send_status(416, [('Content-Range', f"bytes */{size}")])
+
+        start, end = byte_range or (0, size)
+        self.send_response(206 if byte_range else 200)
+        self.send_header('Content-Type', served.content_type)
+        self.send_header('Content-Length', str(end - start))
+        self.send_header('Accept-Ranges', 'bytes')
+        if byte_range:
+            self.send_header('Content-Range', f"bytes {start}-{end - 1}/{size}")
+        for name, value in validators:
+            self.send_header(name, value)
+        self.end_headers()
+        if not send_body:
+            return
+        if served.body is not None:
+            self.wfile.write(served.body[start:end])
+        elif end > start:
+            with open(served.path, 'rb') as f:
+                self.connection.sendfile(f, start, end - start)
+        self.server.count(bytes_sent=end - start)
+
+class PackServer(ThreadingHTTPServer):
+    """
+    Serves the pack with a thread per connection. Jars missing from the cache
+    are fetched on one event loop shared by every thread, so concurrent
+    requests for the same jar wait on a single download and upstream
+    connections are pooled.
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, public_url, upstream=None, sign=False, verbose=False, pack_root='.'):
+        self.public_url = public_url
+        self.upstream = upstream
+        self.sign = sign
+        self.verbose = verbose
+        self.pack_root = pack_root
+        self.snapshot = load_snapshot(public_url, upstream, sign, pack_root)
+        self.snapshot_lock = threading.Lock()
+        self.store = ContentStore()
+        # Guards the counters below, which every connection's thread updates
+        self.count_lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.fetched = 0
+        self.fills = {}
+        self.client = None
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        super().__init__(address, PackRequestHandler)
+
+    def count(self, requests=0, bytes_sent=0, fetched=0):
+        with self.count_lock:
+            self.requests += requests
+            self.bytes_sent += bytes_sent
+            self.fetched += fetched
+
+    def current_snapshot(self):
+        """Reloads the pack once pack.toml or the index has been rewritten, such as by a build."""
+        snapshot = self.snapshot
+        if file_stamp(*snapshot.paths) == snapshot.stamp:
+            return snapshot
+        with self.snapshot_lock:
+            stamp = file_stamp(*self.snapshot.paths)
+            if stamp != self.snapshot.stamp:
+                try:
+                    self.snapshot = load_snapshot(self.public_url, self.upstream, self.sign, self.pack_root)
+                    print(f"Reloaded the pack: {len(self.snapshot.files)} files, {len(self.snapshot.jars)} jars.")
+                except (OSError, ValueError, KeyError, SignifyError) as e:
+                    # Keep serving the last good pack until the next change
+                    print(f"Warning: Could not reload the pack, serving the previous one: {e}")
+                    self.snapshot.stamp = stamp
+            return self.snapshot
+
+    def jar(self, snapshot, algorithm, digest, filename):
+        """Returns the ServedFile for a jar in the cache, filling it from upstream first if needed."""
+        if algorithm not in SUPPORTED_HASH_FORMATS or not HEX_DIGEST.fullmatch(digest):
+            return None, 404
+        if not self.store.has(algorithm, digest):
+            download = snapshot.jars.get((algorithm, digest))
+            if download is None:
+                return None, 404
+            if asyncio.run_coroutine_threadsafe(self.fill(download), self.loop).result() is not None:
+                return None, 502
+        return ServedFile(filename, self.store.path_for(algorithm, digest), None, digest, cache_control=IMMUTABLE), None
+
+    async def fill(self, download):
+        """Fetches a jar into the cache, sharing one download between concurrent requests. Returns the error, if any."""
+        key = (download.hash_format, download.digest)
+        task = self.fills.get(key)
+        if task is None:
+            task = self.loop.create_task(self.fetch(download))
+            self.fills[key] = task
+            task.add_done_callback(lambda _: self.fills.pop(key, None))
+        return await task
+
+    async def fetch(self, download):
+        if self.client is None:
+            self.client = HttpClient(max_per_host=VERIFY_PER_HOST, timeout=VERIFY_TIMEOUT)
+        try:
+            error = await with_retries(lambda: verify_hash(self.client, download, self.store), VERIFY_RETRIES)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        if error is not None:
+            print(f"Warning: Could not fetch {download.url}: {error}")
+        else:
+            self.count(fetched=1)
+            if self.verbose:
+                print(f"Cached {download.url}")
+        return error
+
+def main():
+    parser = argparse.ArgumentParser(description="Serves the pack and a cache of its mod jars on the local network.")
+    parser.add_argument("--host", default=SERVE_HOST)
+    parser.add_argument("--port", type=int, default=SERVE_PORT)
+    parser.add_argument("--public-url", default=SERVE_PUBLIC_URL,
+                        help="The URL clients reach the server at. Defaults to this machine's host name and the port.")
+    parser.add_argument("--upstream", help="Fetch jars from <upstream>/<host>/<path> instead of their own URLs.")
+    parser.add_argument("--sign", action="store_true",
+                        help="Sign the served pack.toml, so clients checking the pack's public key accept it.")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    if not os.path.exists(PACKWIZ_CONFIG_FILE):
+        print(f"Error: '{PACKWIZ_CONFIG_FILE}' does not exist. Run this from the pack directory.")
+        exit(1)
+
+    public_url = args.public_url
+    if not public_url:
+        public_url = f"http://{socket.gethostname() if args.host in ('', '0.0.0.0') else args.host}:{args.port}"
+    public_url = public_url.rstrip('/')
+
+    try:
+        server = PackServer((args.host, args.port), public_url, args.upstream, args.sign, args.verbose)
+    except (OSError, ValueError, KeyError, SignifyError) as e:
+        print(f"Error: Could not start the pack server: {e}")
+        exit(1)
+
+    print(f"Serving {len(server.snapshot.files)} files and a cache of {len(server.snapshot.jars)} mod jars "
+          f"on {public_url}")
+    print(f"Point unsup's source at {public_url}/{PACKWIZ_CONFIG_FILE}")
+    if not args.sign:
+        print("Warning: The served pack.toml is unsigned, as its download URLs are rewritten. Use --sign, or "
+              "remove public_key from the unsup.ini of clients using this server.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\nServed {server.requests} requests ({server.bytes_sent / 1024 / 1024:.1f} MiB), "
+              f"fetched {server.fetched} jars from upstream.")
+
+if __name__ == "__main__":
+    main()
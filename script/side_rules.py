@@ -0,0 +1,260 @@
+import os
+import re
+import sys
+import fnmatch
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import SIDE_RULE_FILES, SIDE_RULES_FILE
+
+SIDES = ('client', 'server', 'both')
+
+# Priority of rules in SIDE_RULES_FILE that do not give one.
+DEFAULT_PRIORITY = 0
+
+# The mod fields a rule can match, and how to read each from a mod.
+FIELDS = {
+    'file': lambda mod: mod.name,
+    'name': lambda mod: mod.data.get('name'),
+    'modrinth': lambda mod: mod.data.get('update', {}).get('modrinth', {}).get('mod-id'),
+    'curseforge': lambda mod: mod.data.get('update', {}).get('curseforge', {}).get('project-id'),
+}
+
+# Leading global flags of a regex rule that can be scoped to its own pattern.
+LEADING_FLAGS = re.compile(r'\(\?([ims]+)\)')
+
+# The flags a regex rule can have and still share a combined regex: Unicode,
+# which every str pattern has, and those LEADING_FLAGS scopes.
+COMBINABLE_FLAGS = re.UNICODE | re.IGNORECASE | re.MULTILINE | re.DOTALL
+
+class RuleError(Exception):
+    """Raised for a rule that cannot be parsed or compiled."""
+
+class Rule:
+    """
+    A single side rule. The pattern is matched against one mod field: exactly,
+    as a glob if it contains glob characters, or as a regex with a 're:' prefix.
+    """
+
+    def __init__(self, side, priority, field, pattern, source, line_number, order):
+        self.side = side
+        self.priority = priority
+        self.field = field
+        self.pattern = pattern
+        self.source = source
+        self.line_number = line_number
+        self.order = order
+        if pattern.startswith('re:'):
+            self.kind = 'regex'
+            self.regex = pattern[len('re:'):]
+        elif any(char in pattern for char in '*?['):
+            self.kind = 'glob'
+            self.regex = fnmatch.translate(pattern)
+        else:
+            self.kind = 'exact'
+            self.regex = None
+        self.compiled = None
+        self.combinable = False
+        if self.regex is not None:
+            try:
+                self.compiled = re.compile(self.regex)
+            except re.error as e:
+                raise RuleError(f"{self}: invalid pattern: {e}")
+            self.combinable = self.make_combinable()
+
+    def make_combinable(self):
+        """
+        Readies the regex to be one alternative of a combined regex, returning
+        False if it has to be matched on its own. Capture groups would clash
+        with those of other rules, through shifted backreferences and repeated
+        names, and global flags would apply to every rule. Leading (?i), (?m)
+        and (?s) flags are scoped to the pattern instead.
+        """
+        if self.compiled.groups:
+            return False
+        flags = LEADING_FLAGS.match(self.regex)
+        regex = f"(?{flags.group(1)}:{self.regex[flags.end():]})" if flags is not None else self.regex
+        if self.compiled.flags & ~COMBINABLE_FLAGS:
+            return False
+        try:
+            re.compile(f"(?P<r{self.order}>{regex})|(?P<r{self.order + 1}>{regex})")
+        except re.error:
+            return False
+        self.regex = regex
+        return True
+
+    @property
+    def rank(self):
+        """Higher ranks win: priority first, then exact matches over patterns, then later rules."""
+        return (self.priority, self.kind == 'exact', self.order)
+
+    def __str__(self):
+        field = '' if self.field == 'file' else f"{self.field}:"
+        return f"{self.source}:{self.line_number} '{field}{self.pattern}'"
+
+def parse_pattern(text):
+    """Splits an optional 'field:' prefix off a pattern."""
+    field, separator, pattern = text.partition(':')
+    if separator and field in FIELDS:
+        return field, pattern
+    return 'file', text
+
+def read_rule_lines(path):
+    """Yields the line number and text of every non-blank, non-comment line in a rule file."""
+    with open(path, 'r') as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line_number, line
+
+def load_rules(rule_files=SIDE_RULE_FILES, rules_file=SIDE_RULES_FILE):
+    """
+    Loads the rules from the patch lists, where every line is a pattern given
+    the list's side and priority, and from the rules file, where every line is
+    '<side> [priority] <pattern>'.
+    """
+    rules = []
+    for path, side, priority in rule_files:
+        if not os.path.exists(path):
+            print(f"Warning: The file '{path}' does not exist. Skipping its side rules.")
+            continue
+        for line_number, line in read_rule_lines(path):
+            field, pattern = parse_pattern(line)
+            rules.append(Rule(side, priority, field, pattern, path, line_number, len(rules)))
+
+    if rules_file and os.path.exists(rules_file):
+        for line_number, line in read_rule_lines(rules_file):
+            parts = line.split(None, 2)
+            if len(parts) < 2 or parts[0] not in SIDES:
+                raise RuleError(f"{rules_file}:{line_number}: expected '<side> [priority] <pattern>', got '{line}'")
+            side, rest = parts[0], parts[1:]
+            priority = DEFAULT_PRIORITY
+            if len(rest) == 2 and re.fullmatch(r'-?\d+', rest[0]):
+                priority = int(rest[0])
+                rest = rest[1:]
+            field, pattern = parse_pattern(' '.join(rest))
+            rules.append(Rule(side, priority, field, pattern, rules_file, line_number, len(rules)))
+    return rules
+
+# Characters that end the literal prefix of a regex.
+REGEX_SPECIAL = set('.^$*+?{}[]\\|()')
+
+def literal_prefix(rule):
+    """
+    Returns the literal text every value matching a pattern rule starts with,
+    used to index the rule. Regexes with alternation are never indexed.
+    """
+    if rule.kind == 'glob':
+        return re.split(r'[*?\[]', rule.pattern, maxsplit=1)[0]
+    if '|' in rule.regex:
+        return ''
+    prefix = ''
+    for char in rule.regex:
+        if char in REGEX_SPECIAL:
+            # A quantifier makes the character before it optional
+            if char in '*?{' and prefix:
+                prefix = prefix[:-1]
+            break
+        prefix += char
+    return prefix
+
+def combine(rules):
+    """
+    Compiles pattern rules into one regex whose alternatives are in rank
+    order, so the first alternative that matches is the highest ranked rule.
+    Rules that cannot share a regex are kept apart with their own.
+    Returns the combined regex or None, a mapping of group name to rule,
+    and a list of (regex, rule) pairs for the rules kept apart.
+    """
+    rules = sorted(rules, key=lambda rule: rule.rank, reverse=True)
+    combined = [rule for rule in rules if rule.combinable]
+    regex = None
+    if combined:
+        try:
+            regex = re.compile('|'.join(f"(?P<r{rule.order}>{rule.regex})" for rule in combined))
+        except re.error:
+            combined = []
+    separate = [(rule.compiled, rule) for rule in rules if rule not in combined]
+    return regex, {f"r{rule.order}": rule for rule in combined}, separate
+
+def best_rule(rules):
+    return max(rules, key=lambda rule: rule.rank, default=None)
+
+def keep_best(table, key, rule):
+    """Stores a rule under a key unless a higher ranked rule already has it."""
+    if key not in table or rule.rank > table[key].rank:
+        table[key] = rule
+
+class SideRuleMatcher:
+    """
+    All rules compiled once into an indexed matcher. For each field, exact
+    rules and '*suffix' globs are looked up in hash tables, and other patterns
+    are grouped by their literal prefix into combined regexes, so a mod only
+    tries the patterns that share a prefix with it. Matching a mod costs a
+    handful of lookups per character of each field, however many rules there are.
+    """
+
+    def __init__(self, rules):
+        self.rules = rules
+        self.exact = {field: {} for field in FIELDS}
+        self.suffixes = {field: {} for field in FIELDS}
+        self.prefixed = {field: {} for field in FIELDS}
+
+        groups = {field: {} for field in FIELDS}
+        for rule in rules:
+            if rule.kind == 'exact':
+                keep_best(self.exact[rule.field], rule.pattern, rule)
+            elif rule.kind == 'glob' and rule.pattern.startswith('*') and not re.search(r'[*?\[]', rule.pattern[1:]):
+                keep_best(self.suffixes[rule.field], rule.pattern[1:], rule)
+            else:
+                groups[rule.field].setdefault(literal_prefix(rule), []).append(rule)
+
+        for field, prefix_groups in groups.items():
+            self.prefixed[field] = {prefix: combine(group) for prefix, group in prefix_groups.items()}
+
+    def match_field(self, field, value):
+        """Returns every rule candidate for one field value: at most one per index."""
+        candidates = [self.exact[field].get(value)]
+        suffixes = self.suffixes[field]
+        prefixed = self.prefixed[field]
+        for i in range(len(value) + 1):
+            if suffixes:
+                candidates.append(suffixes.get(value[i:]))
+            group = prefixed.get(value[:i]) if prefixed else None
+            if group is not None:
+                regex, group_rules, separate = group
+                match = regex.fullmatch(value) if regex is not None else None
+                if match is not None:
+                    candidates.append(group_rules[match.lastgroup])
+                candidates += [rule for rule_regex, rule in separate if rule_regex.fullmatch(value)]
+        return candidates
+
+    def match(self, mod):
+        """Returns the highest ranked rule matching a mod, or None."""
+        candidates = []
+        for field, read_field in FIELDS.items():
+            value = read_field(mod)
+            if value is not None:
+                candidates += self.match_field(field, str(value))
+        return best_rule(rule for rule in candidates if rule is not None)
+
+def apply_rules(matcher, mods):
+    """
+    Sets the side of every mod a rule matches in one pass. Returns a list of
+    (mod, winning rule, previous side) for each matched mod.
+    """
+    matches = []
+    for mod in mods:
+        rule = matcher.match(mod)
+        if rule is None:
+            continue
+        previous_side = mod.data.get('side')
+        if previous_side != rule.side:
+            mod.data['side'] = rule.side
+            mod.save_data()
+        matches.append((mod, rule, previous_side))
+    return matches
@@ -0,0 +1,357 @@
+import os
+import sys
+import base64
+import struct
+import getpass
+import hashlib
+import argparse
+import subprocess
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import SIGNIFY_SECRET_KEY, UNSUP_CONFIG_FILE, SIGNATURES_DIR
+
+# Reads and writes the key and signature files of OpenBSD's signify, and
+# signs and verifies with Ed25519 (RFC 8032) in pure Python, so the build can
+# sign every release file in one process instead of running signify for each.
+#
+#     public key:  "Ed" | key number (8) | public key (32)
+#     secret key:  "Ed" | "BK" | KDF rounds (4) | salt (16) | checksum (8) | key number (8) | seed and public key (64)
+#     signature:   "Ed" | key number (8) | signature (64)
+#
+# Each is base64 under an "untrusted comment:" line. Secret keys protected
+# with a passphrase need bcrypt_pbkdf, which is far too slow in pure Python,
+# so those are signed by the signify binary instead.
+
+COMMENT_PREFIX = 'untrusted comment: '
+PKALG = b'Ed'
+KDFALG = b'BK'
+
+# The curve: x^2 + y^2 = 1 + d*x^2*y^2 modulo P, with base point G of order L.
+P = 2 ** 255 - 19
+L = 2 ** 252 + 27742317777372353535851937790883648493
+D = -121665 * pow(121666, P - 2, P) % P
+SQRT_M1 = pow(2, (P - 1) // 4, P)
+
+class SignifyError(Exception):
+    """Raised for key and signature files that cannot be read or do not match."""
+
+class EncryptedKeyError(SignifyError):
+    """Raised for secret keys protected with a passphrase."""
+
+def point_add(a, b):
+    """Adds two points in extended coordinates (X, Y, Z, T) with x = X/Z, y = Y/Z and xy = T/Z."""
+    e = (a[1] - a[0]) * (b[1] - b[0]) % P
+    f = (a[1] + a[0]) * (b[1] + b[0]) % P
+    g = 2 * a[3] * b[3] * D % P
+    h = 2 * a[2] * b[2] % P
+    e, f, g, h = f - e, h - g, h + g, f + e
+    return (e * f % P, g * h % P, f * g % P, e * h % P)
+
+def point_double(a):
+    xx = a[0] * a[0] % P
+    yy = a[1] * a[1] % P
+    e = (a[0] + a[1]) ** 2 - xx - yy
+    g = yy - xx
+    f = g - 2 * a[2] * a[2]
+    h = -xx - yy
+    return (e * f % P, g * h % P, f * g % P, e * h % P)
+
+IDENTITY = (0, 1, 1, 0)
+
+def recover_x(y, sign):
+    if y >= P:
+        return None
+    x2 = (y * y - 1) * pow(D * y * y + 1, P - 2, P)
+    if x2 % P == 0:
+        return None if sign else 0
+    x = pow(x2, (P + 3) // 8, P)
+    if (x * x - x2) % P != 0:
+        x = x * SQRT_M1 % P
+    if (x * x - x2) % P != 0:
+        return None
+    return P - x if (x & 1) != sign else x
+
+def decode_point(data):
+    """Decodes a 32 byte point, or returns None if it is not on the curve."""
+    y = int.from_bytes(data, 'little')
+    sign = y >> 255
+    y &= (1 << 255) - 1
+    x = recover_x(y, sign)
+    return None if x is None else (x, y, 1, x * y % P)
+
+def encode_point(point):
+    z_inverse = pow(point[2], P - 2, P)
+    x = point[0] * z_inverse % P
+    y = point[1] * z_inverse % P
+    return (y | ((x & 1) << 255)).to_bytes(32, 'little')
+
+def points_equal(a, b):
+    return (a[0] * b[2] - b[0] * a[2]) % P == 0 and (a[1] * b[2] - b[1] * a[2]) % P == 0
+
+class FixedBase:
+    """
+    A point with its doublings worked out once, so multiplying it by a
+    scalar takes only additions. Worth it for the base point and for a
+    public key that checks more than one signature.
+    """
+
+    __slots__ = ('doublings',)
+
+    def __init__(self, point):
+        self.doublings = [point]
+        for _ in range(255):
+            point = point_double(point)
+            self.doublings.append(point)
+
+    def multiply(self, scalar):
+        result = IDENTITY
+        i = 0
+        while scalar:
+            if scalar & 1:
+                result = point_add(result, self.doublings[i])
+            scalar >>= 1
+            i += 1
+        return result
+
+BASE_Y = 4 * pow(5, P - 2, P) % P
+BASE_X = recover_x(BASE_Y, 0)
+BASE = FixedBase((BASE_X, BASE_Y, 1, BASE_X * BASE_Y % P))
+
+def hash_to_scalar(*parts):
+    return int.from_bytes(hashlib.sha512(b''.join(parts)).digest(), 'little') % L
+
+def expand_seed(seed):
+    digest = hashlib.sha512(seed).digest()
+    scalar = int.from_bytes(digest[:32], 'little')
+    scalar &= (1 << 254) - 8
+    scalar |= 1 << 254
+    return scalar, digest[32:]
+
+def ed25519_public_key(seed):
+    scalar, _ = expand_seed(seed)
+    return encode_point(BASE.multiply(scalar))
+
+def ed25519_sign(seed, message):
+    scalar, prefix = expand_seed(seed)
+    public_key = encode_point(BASE.multiply(scalar))
+    r = hash_to_scalar(prefix, message)
+    encoded_r = encode_point(BASE.multiply(r))
+    s = (r + hash_to_scalar(encoded_r, public_key, message) * scalar) % L
+    return encoded_r + s.to_bytes(32, 'little')
+
+def ed25519_verify(public_key, message, signature, public_point=None):
+    """Checks a signature. `public_point` may hold the key as a FixedBase, when checking several."""
+    if len(public_key) != 32 or len(signature) != 64:
+        return False
+    if public_point is None:
+        point = decode_point(public_key)
+        if point is None:
+            return False
+        public_point = FixedBase(point)
+    r = decode_point(signature[:32])
+    s = int.from_bytes(signature[32:], 'little')
+    if r is None or s >= L:
+        return False
+    h = hash_to_scalar(signature[:32], public_key, message)
+    return points_equal(BASE.multiply(s), point_add(r, public_point.multiply(h)))
+
+def read_base64_file(path, size):
+    """Reads a signify file: its untrusted comment and its decoded contents, which must be `size` bytes."""
+    try:
+        with open(path, 'r') as f:
+            lines = f.read().splitlines()
+    except OSError as e:
+        raise SignifyError(f"could not read '{path}': {e}")
+    if len(lines) < 2 or not lines[0].startswith(COMMENT_PREFIX):
+        raise SignifyError(f"'{path}' is not a signify file")
+    return lines[0][len(COMMENT_PREFIX):], decode_base64(lines[1], size, path)
+
+def decode_base64(text, size, source):
+    try:
+        data = base64.b64decode(text, validate=True)
+    except ValueError:
+        raise SignifyError(f"'{source}' is not valid base64")
+    if len(data) != size or data[:2] != PKALG:
+        raise SignifyError(f"'{source}' is not an Ed25519 signify key or signature")
+    return data
+
+class PublicKey:
+    """A signify public key, with its doublings worked out once for checking signatures."""
+
+    def __init__(self, keynum, key):
+        self.keynum = keynum
+        self.key = key
+        point = decode_point(key)
+        if point is None:
+            raise SignifyError("the public key is not a point on the curve")
+        self.point = FixedBase(point)
+
+    @classmethod
+    def from_base64(cls, text, source='public key'):
+        data = decode_base64(text.strip(), 42, source)
+        return cls(data[2:10], data[10:])
+
+    @classmethod
+    def read(cls, path):
+        _, data = read_base64_file(path, 42)
+        return cls(data[2:10], data[10:])
+
+    def verify(self, message, signature):
+        """Checks a signature read with read_signature."""
+        keynum, signature = signature
+        return keynum == self.keynum and ed25519_verify(self.key, message, signature, self.point)
+
+class SecretKey:
+    """A signify secret key without a passphrase."""
+
+    def __init__(self, keynum, seed, public_key):
+        self.keynum = keynum
+        self.seed = seed
+        self.public_key = public_key
+
+    @classmethod
+    def read(cls, path):
+        _, data = read_base64_file(path, 104)
+        kdfalg, rounds = data[2:4], struct.unpack('>I', data[4:8])[0]
+        checksum, keynum, secret = data[24:32], data[32:40], data[40:]
+        if kdfalg != KDFALG:
+            raise SignifyError(f"'{path}' uses an unknown key derivation")
+        if rounds:
+            raise EncryptedKeyError(f"'{path}' is protected with a passphrase")
+        if hashlib.sha512(secret).digest()[:8] != checksum:
+            raise SignifyError(f"the checksum of '{path}' does not match")
+        if ed25519_public_key(secret[:32]) != secret[32:]:
+            raise SignifyError(f"the public half of '{path}' does not match its seed")
+        return cls(keynum, secret[:32], secret[32:])
+
+    def sign(self, message):
+        return ed25519_sign(self.seed, message)
+
+def public_key_comment(secret_key_path):
+    """The comment signify gives signatures: the public key named after the secret key."""
+    name = os.path.basename(secret_key_path)
+    if name.endswith('.sec'):
+        name = name[:-len('.sec')]
+    return f"verify with {name}.pub"
+
+def write_signature(path, keynum, signature, comment):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(f"{COMMENT_PREFIX}{comment}\n{base64.b64encode(PKALG + keynum + signature).decode('ascii')}\n")
+    os.replace(tmp_path, path)
+
+def read_signature(path):
+    """Returns the key number and the signature in a signify signature file."""
+    _, data = read_base64_file(path, 74)
+    return data[2:10], data[10:]
+
+def read_unsup_public_key(config_path=UNSUP_CONFIG_FILE):
+    """Reads the public key unsup checks pack.toml with, from its 'public_key=signify ...' line."""
+    try:
+        with open(config_path, 'r') as f:
+            for line in f:
+                key, _, value = line.partition('=')
+                if key.strip() == 'public_key':
+                    kind, _, text = value.strip().partition(' ')
+                    if kind != 'signify':
+                        raise SignifyError(f"'{config_path}' has a {kind} key, not a signify key")
+                    return PublicKey.from_base64(text, config_path)
+    except OSError as e:
+        raise SignifyError(f"could not read '{config_path}': {e}")
+    raise SignifyError(f"'{config_path}' has no public_key")
+
+def signature_path(file_path):
+    """Where a signature is kept: release files are signed into SIGNATURES_DIR under their own path."""
+    return os.path.join(SIGNATURES_DIR, os.path.normpath(file_path) + '.sig')
+
+def sign_with_binary(pairs, secret_key_path):
+    """
+    Signs with the signify binary, for secret keys protected with a
+    passphrase. signify signs one file per call and reads the passphrase from
+    stdin when that is not a terminal, so it is asked for once and piped in.
+    """
+    passphrase = getpass.getpass(f"passphrase for {secret_key_path}: ")
+    for file_path, sig_path in pairs:
+        if os.path.exists(sig_path):
+            os.remove(sig_path)
+        os.makedirs(os.path.dirname(sig_path) or '.', exist_ok=True)
+        subprocess.run(["signify", "-S", "-s", secret_key_path, "-m", file_path, "-x", sig_path],
+                       input=passphrase + "\n", text=True, check=True)
+
+def sign_files(pairs, secret_key_path=SIGNIFY_SECRET_KEY):
+    """
+    Signs each file in a list of (file, signature file) pairs, reading the
+    secret key once. Falls back to the signify binary for a key protected
+    with a passphrase. Returns True if the signing was done in-process.
+    """
+    try:
+        secret_key = SecretKey.read(secret_key_path)
+    except EncryptedKeyError:
+        sign_with_binary(pairs, secret_key_path)
+        return False
+    comment = public_key_comment(secret_key_path)
+    for file_path, sig_path in pairs:
+        with open(file_path, 'rb') as f:
+            signature = secret_key.sign(f.read())
+        write_signature(sig_path, secret_key.keynum, signature, comment)
+    return True
+
+def verify_files(pairs, public_key):
+    """
+    Checks each file in a list of (file, signature file) pairs against one
+    public key, whose precomputed doublings are shared by every check.
+    Returns the files whose signature is missing or does not match, with why.
+    """
+    failures = []
+    for file_path, sig_path in pairs:
+        try:
+            signature = read_signature(sig_path)
+            with open(file_path, 'rb') as f:
+                message = f.read()
+        except (SignifyError, OSError) as e:
+            failures.append((file_path, str(e)))
+            continue
+        if signature[0] != public_key.keynum:
+            failures.append((file_path, "signed with a different key"))
+        elif not public_key.verify(message, signature):
+            failures.append((file_path, "the signature does not match"))
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Signs or verifies files in signify's format.")
+    parser.add_argument("action", choices=["sign", "verify"])
+    parser.add_argument("files", nargs="+", help="The files to sign or verify. Use FILE:SIG to give the signature file.")
+    parser.add_argument("--secret-key", default=SIGNIFY_SECRET_KEY, help="The signify secret key to sign with.")
+    parser.add_argument("--public-key", help=f"The signify public key to verify with, by default the one in {UNSUP_CONFIG_FILE}.")
+    args = parser.parse_args()
+
+    pairs = []
+    for argument in args.files:
+        file_path, _, sig_path = argument.partition(':')
+        pairs.append((file_path, sig_path or signature_path(file_path)))
+
+    try:
+        if args.action == "sign":
+            sign_files(pairs, args.secret_key)
+            print(f"Signed {len(pairs)} files.")
+            return
+        public_key = PublicKey.read(args.public_key) if args.public_key else read_unsup_public_key()
+    except (SignifyError, OSError, subprocess.CalledProcessError) as e:
+        print(f"Error: {e}")
+        exit(1)
+
+    failures = verify_files(pairs, public_key)
+    for file_path, reason in failures:
+        print(f"Error: {file_path}: {reason}")
+    print(f"Verified {len(pairs) - len(failures)} of {len(pairs)} files.")
+    if failures:
+        exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 import os
+import sys
 
-def strip_toml_lines(file_path):
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import MODS_DIR
+from mod_model import load_mods, write_mods
+
+def strip_toml_lines(text):
     """
-    Reads a TOML file, strips specific lines, and writes the changes back.
+    Strips specific lines from the text of a TOML file and returns the result.
     """
     lines_to_keep = []
-    
-    with open(file_path, 'r') as file:
-        lines = file.readlines()
+    lines = text.splitlines(keepends=True)
     
     i = 0
     while i < len(lines):
@@ -35,26 +43,31 @@ def strip_toml_lines(file_path):
         lines_to_keep.append(line)
         i += 1
 
-    with open(file_path, 'w') as file:
-        file.writelines(lines_to_keep)
+    return ''.join(lines_to_keep)
+
+def transform(mods):
+    """
+    Strips the lines from every loaded .pw.toml file in place.
+    """
+    for mod in mods:
+        stripped_text = strip_toml_lines(mod.text)
+        if stripped_text != mod.text:
+            mod.set_text(stripped_text)
+            print(f"Stripped lines from {mod.path}")
+            
+    print("All specified lines have been stripped from .pw.toml files.")
         
 def main():
     """
     Iterates through all .pw.toml files in the 'mods' directory and strips the lines.
     """
-    mods_dir = 'mods'
-    
-    if not os.path.exists(mods_dir):
-        print(f"Error: The directory '{mods_dir}' does not exist.")
+    if not os.path.exists(MODS_DIR):
+        print(f"Error: The directory '{MODS_DIR}' does not exist.")
         return
 
-    for filename in os.listdir(mods_dir):
-        if filename.endswith('.pw.toml'):
-            file_path = os.path.join(mods_dir, filename)
-            print(f"Processing {file_path}...")
-            strip_toml_lines(file_path)
-            
-    print("All specified lines have been stripped from .pw.toml files.")
+    mods = load_mods(MODS_DIR)
+    transform(mods)
+    write_mods(mods)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,167 @@
+import os
+import sys
+import errno
+import shutil
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import COPY_MODE
+
+# The Linux ioctl request that clones a file's extents (FICLONE).
+FICLONE = 0x40049409
+
+def reflink(source_path, dest_path):
+    """
+    Creates a copy-on-write clone of a file. Returns False if the platform
+    or filesystem does not support it.
+    """
+    if sys.platform == 'darwin':
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        if not hasattr(libc, 'clonefile'):
+            return False
+        return libc.clonefile(os.fsencode(source_path), os.fsencode(dest_path), 0) == 0
+
+    if sys.platform.startswith('linux'):
+        import fcntl
+        with open(source_path, 'rb') as source, open(dest_path, 'wb') as dest:
+            try:
+                fcntl.ioctl(dest.fileno(), FICLONE, source.fileno())
+                return True
+            except OSError as e:
+                if e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.EPERM):
+                    raise
+        os.remove(dest_path)
+    return False
+
+def copy_file(source_path, dest_path, mode=COPY_MODE):
+    """
+    Copies a file using the given mode, falling back to a plain copy where
+    the filesystem does not support it. The source mtime is always kept so
+    later size and mtime comparisons and the hash cache stay valid.
+    """
+    os.makedirs(os.path.dirname(dest_path) or '.', exist_ok=True)
+    if os.path.lexists(dest_path):
+        os.remove(dest_path)
+
+    if mode == 'hardlink':
+        try:
+            os.link(source_path, dest_path)
+            return
+        except OSError:
+            pass
+    elif mode == 'reflink':
+        if reflink(source_path, dest_path):
+            shutil.copystat(source_path, dest_path)
+            return
+
+    shutil.copy2(source_path, dest_path)
+
+def is_in_sync(source_path, dest_path, hash_cache):
+    """
+    Checks whether a destination file matches its source, comparing size and
+    mtime first and only falling back to a content hash when the sizes match
+    but the mtimes do not. Matching content gets the source mtime restored.
+    """
+    try:
+        dest_stat = os.stat(dest_path)
+    except FileNotFoundError:
+        return False
+    source_stat = os.stat(source_path)
+
+    if source_stat.st_size != dest_stat.st_size:
+        return False
+    if source_stat.st_mtime_ns == dest_stat.st_mtime_ns:
+        return True
+
+    hashes = hash_cache.hash_files([source_path, dest_path])
+    if hashes[source_path] != hashes[dest_path]:
+        return False
+    shutil.copystat(source_path, dest_path)
+    return True
+
+def sync_file(source_path, dest_path, rel_path, hash_cache, converter, mode):
+    """
+    Copies one file unless it is in sync. Files the converter handles are
+    written by it instead, and are in sync when it says they are up to date.
+    Returns True if the file was written.
+    """
+    if converter is not None and converter.handles(rel_path):
+        if converter.is_up_to_date(source_path, dest_path):
+            return False
+        converter.convert(source_path, dest_path)
+        return True
+    if is_in_sync(source_path, dest_path, hash_cache):
+        return False
+    copy_file(source_path, dest_path, mode)
+    return True
+
+def sync_tree(source_root, dest_root, hash_cache, rename=None, mode=COPY_MODE, converter=None):
+    """
+    Brings a destination directory in line with a source directory, rsync
+    style: new or changed files are copied, unchanged files are left alone
+    and files no longer in the source are deleted. `rename` optionally maps a
+    source relative path to the destination relative path, and `converter`
+    optionally writes some files in place of copying them.
+    Returns the number of files copied and removed.
+    """
+    dest_files = set()
+    copied = 0
+    for dirpath, _, filenames in os.walk(source_root):
+        for filename in sorted(filenames):
+            source_path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(source_path, source_root)
+            if rename is not None:
+                rel_path = rename(rel_path)
+            dest_files.add(rel_path)
+
+            dest_path = os.path.join(dest_root, rel_path)
+            if sync_file(source_path, dest_path, rel_path, hash_cache, converter, mode):
+                copied += 1
+
+    removed = 0
+    for dirpath, _, filenames in os.walk(dest_root, topdown=False):
+        for filename in filenames:
+            dest_path = os.path.join(dirpath, filename)
+            if os.path.relpath(dest_path, dest_root) not in dest_files:
+                os.remove(dest_path)
+                removed += 1
+        if dirpath != dest_root and not os.listdir(dirpath):
+            os.rmdir(dirpath)
+
+    return copied, removed
+
+def sync_paths(source_root, dest_root, rel_paths, hash_cache, rename=None, mode=COPY_MODE, converter=None):
+    """
+    Syncs only the given source relative paths, such as those reported by a
+    file watcher. Directories are synced with everything below them, and
+    paths that no longer exist in the source are deleted.
+    Returns the number of files copied and removed.
+    """
+    copied = 0
+    removed = 0
+    pending = list(rel_paths)
+    while pending:
+        rel_path = pending.pop()
+        source_path = os.path.join(source_root, rel_path)
+        dest_path = os.path.join(dest_root, rename(rel_path) if rename is not None else rel_path)
+
+        if os.path.isdir(source_path):
+            for dirpath, _, filenames in os.walk(source_path):
+                pending.extend(os.path.relpath(os.path.join(dirpath, filename), source_root) for filename in filenames)
+        elif os.path.isfile(source_path):
+            if sync_file(source_path, dest_path, rel_path, hash_cache, converter, mode):
+                copied += 1
+        elif os.path.isdir(dest_path):
+            for _, _, filenames in os.walk(dest_path):
+                removed += len(filenames)
+            shutil.rmtree(dest_path)
+        elif os.path.lexists(dest_path):
+            os.remove(dest_path)
+            removed += 1
+
+    return copied, removed
@@ -1,5 +1,6 @@
 import os
 import sys
+import json
 import toml
 
 # Get the path of the parent directory
@@ -8,7 +9,9 @@ parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
 # Add the parent directory to the system path
 sys.path.append(parent_dir)
 
-from config import MODS_DIR, CLIENT_PATCH_FILE, SERVER_PATCH_FILE, SERVER_BLACKLIST_FILE
+from config import MODS_DIR, SIDE_RULES_REPORT_FILE
+from mod_model import load_mods, write_mods
+from side_rules import RuleError, SideRuleMatcher, load_rules, apply_rules
 
 def get_base_filename(filename):
     """
@@ -18,6 +21,79 @@ def get_base_filename(filename):
         return filename[:-len('.pw.toml')]
     return filename
 
+def mod_exists(name):
+    """
+    Checks whether a .pw.toml file for the given base filename exists on disk.
+    """
+    return os.path.exists(os.path.join(MODS_DIR, name + '.pw.toml'))
+
+def update_report(matches, mods, report_path=SIDE_RULES_REPORT_FILE):
+    """
+    Records which rule set the side of each processed mod. Mods that were not
+    processed this time keep their entry from an earlier build.
+    """
+    report = {}
+    if os.path.exists(report_path):
+        try:
+            with open(report_path, 'r') as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            report = {}
+
+    processed = {mod.filename for mod in mods}
+    report = {filename: entry for filename, entry in report.items()
+              if filename in processed or mod_exists(get_base_filename(filename))}
+    for mod in mods:
+        report[mod.filename] = {'side': mod.data.get('side'), 'rule': None}
+    for mod, rule, _ in matches:
+        report[mod.filename]['rule'] = str(rule)
+
+    os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=1, sort_keys=True)
+
+def transform(mods):
+    """
+    Updates the 'side' key of every loaded .pw.toml file in place, using the
+    rules compiled from the patch lists and the side rules file.
+    """
+    try:
+        rules = load_rules()
+        matcher = SideRuleMatcher(rules)
+    except (OSError, RuleError) as e:
+        print(f"Error: Could not load the side rules: {e}")
+        exit(1)
+
+    print(f"\nStarting mod side update process with {len(rules)} rules...")
+
+    parsed = []
+    for mod in mods:
+        try:
+            mod.data
+            parsed.append(mod)
+        except toml.TomlDecodeError as e:
+            print(f"Error parsing TOML in {mod.path}: {e}")
+
+    matches = apply_rules(matcher, parsed)
+    for mod, rule, previous_side in matches:
+        if previous_side != rule.side:
+            print(f"Updated '{mod.name}' to side='{rule.side}' in {mod.path} (rule {rule})")
+    update_report(matches, parsed)
+
+    print(f"\nFinished mod side update process. {len(matches)} mods matched a rule.")
+
+    # Report exact rules that matched nothing. Mods that were not loaded may
+    # still exist from a previous build.
+    matched = {rule.order for _, rule, _ in matches}
+    unmatched = {}
+    for rule in rules:
+        if rule.kind == 'exact' and rule.field == 'file' and rule.order not in matched and not mod_exists(rule.pattern):
+            unmatched.setdefault(rule.source, []).append(rule.pattern)
+    for source, names in unmatched.items():
+        print(f"\nWarning: The following mods in '{source}' were not found:")
+        for name in names:
+            print(f"- {name}")
+
 def main():
     """
     Main function to orchestrate the process.
@@ -26,105 +102,9 @@ def main():
         print(f"Error: The directory '{MODS_DIR}' does not exist.")
         return
 
-    # Load mod names to be patched or blacklisted into sets for quick lookup
-    client_mods_to_patch = set()
-    server_mods_to_blacklist = set()
-    server_mods_to_patch = set()
-
-    if os.path.exists(CLIENT_PATCH_FILE):
-        with open(CLIENT_PATCH_FILE, 'r') as f:
-            for line in f:
-                mod_name = line.strip()
-                if mod_name:
-                    client_mods_to_patch.add(mod_name)
-    else:
-        print(f"Warning: The file '{CLIENT_PATCH_FILE}' does not exist. Skipping client patch.")
-
-    if os.path.exists(SERVER_PATCH_FILE):
-        with open(SERVER_PATCH_FILE, 'r') as f:
-            for line in f:
-                mod_name = line.strip()
-                if mod_name:
-                    server_mods_to_patch.add(mod_name)
-    else:
-        print(f"Warning: The file '{SERVER_PATCH_FILE}' does not exist. Skipping server patch.")
-
-    if os.path.exists(SERVER_BLACKLIST_FILE):
-        with open(SERVER_BLACKLIST_FILE, 'r') as f:
-            for line in f:
-                mod_name = line.strip()
-                if mod_name:
-                    server_mods_to_blacklist.add(mod_name)
-    else:
-        print(f"Warning: The file '{SERVER_BLACKLIST_FILE}' does not exist. Skipping server blacklist.")
-    
-    print("\nStarting mod side update process...")
-    
-    # Iterate through each .pw.toml file only once
-    for filename in os.listdir(MODS_DIR):
-        if filename.endswith('.pw.toml'):
-            file_path = os.path.join(MODS_DIR, filename)
-            
-            try:
-                with open(file_path, 'r') as f:
-                    data = toml.load(f)
-
-                # Use the filename as the unique identifier
-                mod_filename_in_file = get_base_filename(filename)
-                current_side = data.get('side')
-                updated = False
-
-                # Check if the mod is in the client patch list
-                if mod_filename_in_file in client_mods_to_patch:
-                    if current_side != 'both':
-                        data['side'] = 'both'
-                        updated = True
-                        print(f"Updated '{mod_filename_in_file}' to side='both' in {file_path}")
-                    client_mods_to_patch.remove(mod_filename_in_file)
-
-
-                # Check if the mod is in the server patch list
-                if mod_filename_in_file in server_mods_to_patch:
-                    if current_side != 'server':
-                        data['side'] = 'both'
-                        updated = True
-                        print(f"Updated '{mod_filename_in_file}' to side='both' in {file_path}")
-                    server_mods_to_patch.remove(mod_filename_in_file)
-
-                # Check if the mod is in the server blacklist
-                if mod_filename_in_file in server_mods_to_blacklist:
-                    if current_side != 'client':
-                        data['side'] = 'client'
-                        updated = True
-                        print(f"Updated '{mod_filename_in_file}' to side='client' in {file_path}")
-                    server_mods_to_blacklist.remove(mod_filename_in_file)
-
-                if updated:
-                    with open(file_path, 'w') as f:
-                        toml.dump(data, f)
-            
-            except toml.TomlDecodeError as e:
-                print(f"Error parsing TOML in {file_path}: {e}")
-            except Exception as e:
-                print(f"An unexpected error occurred with {file_path}: {e}")
-    
-    print("\nFinished mod side update process.")
-    
-    # Report any unhandled mods
-    if client_mods_to_patch:
-        print("\nWarning: The following mods were not found for client patching:")
-        for name in client_mods_to_patch:
-            print(f"- {name}")
-
-    if server_mods_to_patch:
-        print("\nWarning: The following mods were not found for server patching:")
-        for name in server_mods_to_patch:
-            print(f"- {name}")
-            
-    if server_mods_to_blacklist:
-        print("\nWarning: The following mods were not found for server blacklisting:")
-        for name in server_mods_to_blacklist:
-            print(f"- {name}")
+    mods = load_mods(MODS_DIR)
+    transform(mods)
+    write_mods(mods)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
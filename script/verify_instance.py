@@ -0,0 +1,219 @@
+import os
+import sys
+import time
+import argparse
+import toml
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import PACKWIZ_CONFIG_FILE, SIG_FILE, UNSUP_CONFIG_FILE, VERIFY_CACHE_NAME, VERIFY_EXTRA_DIRS
+from mod_model import ModFile
+from hash_cache import HashCache, compute_hash
+from content_store import ContentStore
+from sync_tree import copy_file
+from export_server import read_pack_index
+from verify_urls import SUPPORTED_HASH_FORMATS
+from signify import SignifyError, read_unsup_public_key, verify_files
+
+# The mod sides installed on each kind of instance.
+INSTANCE_SIDES = {
+    'client': ('client', 'both'),
+    'server': ('server', 'both'),
+    'both': ('client', 'server', 'both'),
+}
+
+class ExpectedFile:
+    """A file the pack installs: where it goes, its hash, and where a good copy can be found."""
+
+    def __init__(self, rel_path, algorithm, digest, preserve=False, pack_path=None):
+        self.rel_path = rel_path
+        self.algorithm = algorithm
+        self.digest = digest.lower()
+        self.preserve = preserve
+        # Plain pack files are restored from the pack, mod jars from the content store
+        self.pack_path = pack_path
+
+def check_pack_signature(pack_root='.'):
+    """Checks pack.toml against its signature and the public key in unsup.ini, where the pack has both."""
+    sig_path = os.path.join(pack_root, SIG_FILE)
+    config_path = os.path.join(pack_root, UNSUP_CONFIG_FILE)
+    if not os.path.exists(sig_path) or not os.path.exists(config_path):
+        print(f"Warning: Not checking the signature of {PACKWIZ_CONFIG_FILE}, the pack has no {SIG_FILE} or {UNSUP_CONFIG_FILE}.")
+        return
+    try:
+        failures = verify_files([(os.path.join(pack_root, PACKWIZ_CONFIG_FILE), sig_path)], read_unsup_public_key(config_path))
+    except SignifyError as e:
+        failures = [(PACKWIZ_CONFIG_FILE, str(e))]
+    for file_path, reason in failures:
+        print(f"Error: '{file_path}' does not match its signature: {reason}.")
+        exit(1)
+
+def check_pack_index(pack_root='.'):
+    """Checks that the index hash in pack.toml matches the index. Returns the pack.toml data."""
+    check_pack_signature(pack_root)
+    with open(os.path.join(pack_root, PACKWIZ_CONFIG_FILE), 'r') as f:
+        pack_data = toml.load(f)
+    index = pack_data['index']
+    index_path = os.path.join(pack_root, index['file'])
+    digest, _ = compute_hash(index_path, index.get('hash-format', 'sha256'))
+    if digest != index.get('hash'):
+        print(f"Error: '{index_path}' does not match the hash in {PACKWIZ_CONFIG_FILE}.")
+        exit(1)
+    return pack_data
+
+def expected_files(pack_root='.', side='both'):
+    """
+    Lists the files an instance of one side should have, from the pack index
+    and the .pw.toml files it lists. Returns the expected files keyed on
+    their path relative to the instance, and the number of mods left out.
+    """
+    sides = INSTANCE_SIDES[side]
+    with open(os.path.join(pack_root, PACKWIZ_CONFIG_FILE), 'r') as f:
+        index_format = toml.load(f)['index'].get('hash-format', 'sha256')
+    expected = {}
+    other_side = 0
+    for entry in read_pack_index(pack_root):
+        rel_path = entry['file']
+        if not entry.get('metafile'):
+            expected[rel_path] = ExpectedFile(rel_path, entry.get('hash-format', index_format), entry['hash'],
+                                              entry.get('preserve', False), os.path.join(pack_root, rel_path))
+            continue
+
+        with open(os.path.join(pack_root, rel_path), 'r') as f:
+            mod = ModFile(rel_path, f.read())
+        if mod.data.get('side', 'both') not in sides:
+            other_side += 1
+            continue
+        download = mod.data.get('download', {})
+        dest_path = os.path.join(os.path.dirname(rel_path), mod.data['filename']).replace(os.sep, '/')
+        expected[dest_path] = ExpectedFile(dest_path, download.get('hash-format', ''), download.get('hash', ''))
+    return expected, other_side
+
+def find_extra_files(target_dir, expected, directories=VERIFY_EXTRA_DIRS):
+    """Lists the files in the pack's own directories of an instance that the pack does not install."""
+    extra = []
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(os.path.join(target_dir, directory)):
+            for filename in filenames:
+                rel_path = os.path.relpath(os.path.join(dirpath, filename), target_dir).replace(os.sep, '/')
+                if rel_path not in expected:
+                    extra.append(rel_path)
+    return sorted(extra)
+
+def check_files(target_dir, expected, hash_cache):
+    """
+    Hashes every expected file in the instance, grouped by hash format so
+    each group is hashed in parallel. Files whose size, mtime and inode match
+    the cache are not read again. Returns the missing and corrupted paths
+    and the paths whose hash format cannot be checked.
+    """
+    missing = []
+    corrupted = []
+    unchecked = []
+    by_algorithm = {}
+    for rel_path, file in sorted(expected.items()):
+        target_path = os.path.join(target_dir, rel_path)
+        if not os.path.isfile(target_path):
+            missing.append(rel_path)
+        elif file.preserve:
+            # The game or its players may change preserved files, so only their presence is checked
+            continue
+        elif file.algorithm not in SUPPORTED_HASH_FORMATS:
+            unchecked.append(rel_path)
+        else:
+            by_algorithm.setdefault(file.algorithm, []).append(rel_path)
+
+    for algorithm, rel_paths in by_algorithm.items():
+        hashes = hash_cache.hash_files([os.path.join(target_dir, rel_path) for rel_path in rel_paths], algorithm)
+        for rel_path in rel_paths:
+            if hashes[os.path.join(target_dir, rel_path)] != expected[rel_path].digest:
+                corrupted.append(rel_path)
+    return missing, sorted(corrupted), unchecked
+
+def repair_file(target_dir, file, store, pack_hash_cache):
+    """
+    Restores one file from the pack or the content store, checking the
+    source's hash first. Returns False if no good copy is available.
+    """
+    if file.pack_path is not None:
+        source_path = file.pack_path
+        if not os.path.isfile(source_path) or file.algorithm not in SUPPORTED_HASH_FORMATS:
+            return False
+        if pack_hash_cache.hash_file(source_path, file.algorithm) != file.digest:
+            return False
+    else:
+        source_path = store.path_for(file.algorithm, file.digest)
+        if not os.path.isfile(source_path):
+            return False
+    copy_file(source_path, os.path.join(target_dir, file.rel_path))
+    return True
+
+def verify_instance(target_dir, pack_root='.', side='both', repair=False):
+    """
+    Checks an installed instance against the pack: pack.toml must match its
+    signature, the index must match the hash in pack.toml, and every file it
+    lists must be present with the right hash. Files in the pack's own
+    directories that it does not install are reported as extra. With
+    `repair`, missing and corrupted files are restored from the pack or the
+    content store and extra files are removed.
+    Returns the number of problems left.
+    """
+    start = time.perf_counter()
+    check_pack_index(pack_root)
+    expected, other_side = expected_files(pack_root, side)
+    hash_cache = HashCache(os.path.join(target_dir, VERIFY_CACHE_NAME))
+    missing, corrupted, unchecked = check_files(target_dir, expected, hash_cache)
+    extra = find_extra_files(target_dir, expected)
+
+    for rel_path in missing:
+        print(f"Missing: {rel_path}")
+    for rel_path in corrupted:
+        print(f"Corrupted: {rel_path}")
+    for rel_path in extra:
+        print(f"Extra: {rel_path}")
+    for rel_path in unchecked:
+        print(f"Warning: Cannot check '{rel_path}', its hash format '{expected[rel_path].algorithm}' is not supported.")
+
+    problems = len(missing) + len(corrupted) + len(extra)
+    if repair and problems:
+        store = ContentStore()
+        pack_hash_cache = HashCache()
+        unrepaired = 0
+        for rel_path in missing + corrupted:
+            if not repair_file(target_dir, expected[rel_path], store, pack_hash_cache):
+                print(f"Error: No good copy of '{rel_path}' in the pack or the content store.")
+                unrepaired += 1
+        for rel_path in extra:
+            os.remove(os.path.join(target_dir, rel_path))
+        print(f"Restored {len(missing) + len(corrupted) - unrepaired} files and removed {len(extra)} extra files.")
+        problems = unrepaired
+        pack_hash_cache.save()
+
+    hash_cache.save()
+    print(f"Checked {len(expected)} files ({other_side} mods for other sides skipped) in "
+          f"{time.perf_counter() - start:.2f}s: {len(missing)} missing, {len(corrupted)} corrupted, "
+          f"{len(extra)} extra. Hash cache: {hash_cache.hits} hits, {hash_cache.misses} misses.")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks an installed instance against the pack's index.")
+    parser.add_argument("target", help="The instance directory, e.g. a server's root or a client's minecraft folder.")
+    parser.add_argument("--side", choices=sorted(INSTANCE_SIDES), default="both",
+                        help="Which side's mods the instance has.")
+    parser.add_argument("--pack", default=".", help="The pack directory holding pack.toml.")
+    parser.add_argument("--repair", action="store_true",
+                        help="Restore missing and corrupted files from the pack or the content store, and remove extra files.")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.target):
+        print(f"Error: The directory '{args.target}' does not exist.")
+        exit(1)
+    if verify_instance(args.target, args.pack, args.side, args.repair):
+        exit(1)
+
+if __name__ == "__main__":
+    main()
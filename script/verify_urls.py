@@ -0,0 +1,214 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import argparse
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import (MODS_DIR, VERIFY_CONCURRENCY, VERIFY_PER_HOST, VERIFY_RETRIES, VERIFY_TIMEOUT,
+                    VERIFIED_URLS_FILE)
+from mod_model import load_mods
+from content_store import ContentStore, HashMismatchError
+from http_client import HttpClient, HttpError, upstream_url, with_retries
+
+# --upstream fetches every download from <upstream>/<host>/<path> instead of
+# its own URL, so the check can be tried without the network against a local
+# stand-in holding some or all of the jars under their host and path:
+#
+#     python -m http.server 8000 --directory upstream &
+#     python script/verify_urls.py --full --upstream http://127.0.0.1:8000
+#
+# Results against a stand-in say nothing about the real URLs, so they are
+# neither skipped as verified nor recorded.
+
+# Hash formats packwiz supports that hashlib can compute.
+SUPPORTED_HASH_FORMATS = {'sha1', 'sha256', 'sha512', 'md5'}
+
+# Statuses for which a HEAD request is retried as a one byte ranged GET.
+HEAD_UNSUPPORTED_STATUSES = {403, 405, 501}
+
+class Download:
+    """A mod download to verify: its URL and expected hash."""
+
+    def __init__(self, mod_path, url, hash_format, digest):
+        self.mod_path = mod_path
+        self.url = url
+        self.hash_format = hash_format
+        self.digest = digest.lower()
+
+    @property
+    def key(self):
+        return f"{self.hash_format}:{self.digest}"
+
+def collect_downloads(mods):
+    """
+    Returns the downloads of every mod with a URL, and the number of mods
+    skipped because they have none (e.g. CurseForge metadata downloads).
+    """
+    downloads = []
+    skipped = 0
+    for mod in mods:
+        try:
+            download = mod.data.get('download', {})
+        except Exception as e:
+            print(f"Error parsing TOML in {mod.path}: {e}")
+            continue
+        if not download.get('url'):
+            skipped += 1
+            continue
+        downloads.append(Download(mod.path, download['url'], download.get('hash-format', ''),
+                                  download.get('hash', '')))
+    return downloads, skipped
+
+def load_verified(verified_path=VERIFIED_URLS_FILE):
+    """Loads the hashes of previously verified downloads and the URL they were verified at."""
+    if not os.path.exists(verified_path):
+        return {}
+    try:
+        with open(verified_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_verified(verified, verified_path=VERIFIED_URLS_FILE):
+    os.makedirs(os.path.dirname(verified_path) or '.', exist_ok=True)
+    tmp_path = verified_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(verified, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, verified_path)
+
+async def check_url(client, download):
+    """Checks that a URL resolves, without downloading the body."""
+    async with client.request('HEAD', download.url) as response:
+        status = response.status
+    if status in HEAD_UNSUPPORTED_STATUSES:
+        async with client.request('GET', download.url, headers={'Range': 'bytes=0-0'}) as response:
+            status = response.status
+            await response.read()
+    if status >= 500:
+        raise HttpError(f"HTTP {status}")
+    if status >= 400:
+        return f"HTTP {status}"
+    return None
+
+async def verify_hash(client, download, store):
+    """
+    Streams a download and checks it against its expected hash, keeping the
+    body in the content store if one is given.
+    """
+    if download.hash_format not in SUPPORTED_HASH_FORMATS:
+        return f"unsupported hash format '{download.hash_format}'"
+
+    async with client.request('GET', download.url) as response:
+        if response.status >= 500:
+            raise HttpError(f"HTTP {response.status}")
+        if response.status >= 400:
+            return f"HTTP {response.status}"
+
+        writer = store.writer(download.hash_format, download.digest) if store else None
+        file_hash = hashlib.new(download.hash_format)
+        try:
+            async for chunk in response.iter_chunks():
+                file_hash.update(chunk)
+                if writer:
+                    writer.write(chunk)
+        except BaseException:
+            if writer:
+                writer.abort()
+            raise
+
+    if file_hash.hexdigest() != download.digest:
+        if writer:
+            writer.abort()
+        return f"hash mismatch: expected {download.digest}, got {file_hash.hexdigest()}"
+    if writer:
+        try:
+            writer.commit()
+        except HashMismatchError as e:
+            return f"hash mismatch: {e}"
+    return None
+
+async def verify_downloads(downloads, full=False, store=None, concurrency=VERIFY_CONCURRENCY,
+                           per_host=VERIFY_PER_HOST, retries=VERIFY_RETRIES, timeout=VERIFY_TIMEOUT):
+    """
+    Verifies every download concurrently. Returns a list of (download, error)
+    pairs, where error is None for downloads that passed.
+    """
+    limit = asyncio.Semaphore(concurrency)
+
+    async with HttpClient(max_per_host=per_host, timeout=timeout) as client:
+        async def verify(download):
+            async with limit:
+                check = (lambda: verify_hash(client, download, store)) if full else (lambda: check_url(client, download))
+                try:
+                    return download, await with_retries(check, retries)
+                except Exception as e:
+                    return download, f"{type(e).__name__}: {e}"
+
+        return await asyncio.gather(*(verify(download) for download in downloads))
+
+def verify_mods(mods, full=False, keep=True, upstream=None):
+    """
+    Verifies the download URL of every mod, and in full mode its hash too.
+    Downloads verified by an earlier full run at the same URL are skipped.
+    With an upstream mirror, every download is fetched from it instead.
+    Returns the number of failures.
+    """
+    downloads, no_url = collect_downloads(mods)
+    verified = load_verified() if not upstream else {}
+    if full:
+        pending = [download for download in downloads if verified.get(download.key) != download.url]
+    else:
+        pending = downloads
+    mode = "hashes" if full else "URLs"
+    print(f"Verifying {len(pending)} download {mode} "
+          f"({len(downloads) - len(pending)} already verified, {no_url} mods without a URL)...")
+    if upstream:
+        pending = [Download(download.mod_path, upstream_url(download.url, upstream), download.hash_format,
+                            download.digest) for download in pending]
+
+    start = time.perf_counter()
+    store = ContentStore() if full and keep else None
+    results = asyncio.run(verify_downloads(pending, full, store))
+
+    failures = 0
+    for download, error in results:
+        if error is None:
+            if full and not upstream:
+                verified[download.key] = download.url
+        else:
+            failures += 1
+            print(f"Error: {download.mod_path}: {download.url}: {error}")
+    if full and not upstream:
+        save_verified(verified)
+
+    print(f"Verified {len(results) - failures} of {len(results)} downloads in {time.perf_counter() - start:.2f}s, "
+          f"{failures} failed.")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifies that every mod download URL resolves.")
+    parser.add_argument('--full', action='store_true',
+                        help="Download every mod and check it against its download hash.")
+    parser.add_argument('--no-store', action='store_true',
+                        help="Do not keep downloaded jars in the content store.")
+    parser.add_argument('--mods-dir', default=MODS_DIR, help="The directory of .pw.toml files to verify.")
+    parser.add_argument('--upstream', help="Fetch downloads from <upstream>/<host>/<path> instead of their own URLs.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.mods_dir):
+        print(f"Error: The directory '{args.mods_dir}' does not exist.")
+        exit(1)
+
+    failures = verify_mods(load_mods(args.mods_dir), args.full, keep=not args.no_store, upstream=args.upstream)
+    exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
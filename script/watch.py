@@ -0,0 +1,188 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory to the system path
+sys.path.append(parent_dir)
+
+from config import WATCH_POLL_INTERVAL
+
+# inotify event flags, from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+              IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+
+EVENT_HEADER = struct.Struct('iIII')
+
+def is_within(path, root):
+    """Checks whether a path is the root itself or lies below it."""
+    return path == root or path.startswith(root.rstrip(os.sep) + os.sep)
+
+class PollingWatcher:
+    """
+    Detects changes by comparing the size and mtime of every watched file
+    between scans. Used where inotify is not available.
+    """
+
+    def __init__(self, trees, files):
+        self.trees = [os.path.abspath(tree) for tree in trees]
+        self.files = [os.path.abspath(file_path) for file_path in files]
+        self.snapshot = self.scan()
+
+    def scan(self):
+        snapshot = {}
+        paths = list(self.files)
+        for tree in self.trees:
+            for dirpath, _, filenames in os.walk(tree):
+                paths.extend(os.path.join(dirpath, filename) for filename in filenames)
+        for file_path in paths:
+            try:
+                stat = os.stat(file_path)
+            except OSError:
+                continue
+            snapshot[file_path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def poll(self, timeout):
+        """Returns the paths that changed, waiting up to `timeout` seconds for one."""
+        deadline = time.monotonic() + (timeout if timeout is not None else float('inf'))
+        while True:
+            snapshot = self.scan()
+            changed = {path for path in snapshot.keys() | self.snapshot.keys()
+                       if snapshot.get(path) != self.snapshot.get(path)}
+            self.snapshot = snapshot
+            if changed or time.monotonic() >= deadline:
+                return changed
+            time.sleep(max(0.0, min(WATCH_POLL_INTERVAL, deadline - time.monotonic())))
+
+    def close(self):
+        pass
+
+class InotifyWatcher:
+    """
+    Watches directory trees recursively, and single files through their
+    parent directory, with Linux inotify. New directories are watched as
+    soon as they appear.
+    """
+
+    def __init__(self, trees, files):
+        import ctypes
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.directories = {}
+        self.files = {os.path.abspath(file_path) for file_path in files}
+        self.trees = [os.path.abspath(tree) for tree in trees]
+        for tree in self.trees:
+            self.add_tree(tree)
+        for file_path in self.files:
+            self.add_directory(os.path.dirname(file_path))
+
+    def add_directory(self, directory):
+        if directory in self.directories.values() or not os.path.isdir(directory):
+            return
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), WATCH_MASK)
+        if wd >= 0:
+            self.directories[wd] = directory
+
+    def add_tree(self, tree):
+        for dirpath, _, _ in os.walk(tree):
+            self.add_directory(dirpath)
+
+    def is_watched(self, path):
+        return path in self.files or any(is_within(path, tree) for tree in self.trees)
+
+    def read_events(self):
+        """Reads every pending event, returning the watched paths they touched."""
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    return changed
+                raise
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                offset += EVENT_HEADER.size
+                name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost, so report every tree as changed
+                    changed.update(self.trees)
+                    changed.update(self.files)
+                    continue
+                if mask & IN_IGNORED:
+                    self.directories.pop(wd, None)
+                    continue
+
+                directory = self.directories.get(wd)
+                if directory is None:
+                    continue
+                path = os.path.join(directory, name) if name else directory
+                if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path)
+                if self.is_watched(path):
+                    changed.add(path)
+
+    def poll(self, timeout):
+        """Returns the paths that changed, waiting up to `timeout` seconds for one."""
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        while True:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            ready, _, _ = select.select([self.fd], [], [], remaining)
+            changed = self.read_events() if ready else set()
+            if changed or not ready:
+                return changed
+
+    def close(self):
+        os.close(self.fd)
+
+def create_watcher(trees, files):
+    """Returns an inotify watcher where supported, falling back to polling."""
+    trees = [tree for tree in trees if os.path.isdir(tree)]
+    if sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(trees, files)
+        except (OSError, AttributeError) as e:
+            print(f"Warning: inotify is not available ({e}). Falling back to polling.")
+    return PollingWatcher(trees, files)
+
+def wait_for_changes(watcher, debounce):
+    """
+    Blocks until something changes, then keeps collecting changes until none
+    arrive for `debounce` seconds, so a burst of saves causes one rebuild.
+    """
+    changed = set()
+    while not changed:
+        changed = watcher.poll(None)
+    while True:
+        more = watcher.poll(debounce)
+        if not more:
+            return changed
+        changed |= more
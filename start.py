@@ -2,31 +2,104 @@
 # Copyright (C) 2025 Ubayd Khan
 
 import os
-import shutil
+import sys
 import subprocess
-import hashlib
+import argparse
+import importlib
+import threading
+import zipfile
+import sqlite3
 import toml
 from config import *
 
-def run_script(script_name):
-    """A helper function to run other Python scripts."""
-    print(f"\n--- Running {script_name} ---")
+# Make the pipeline scripts importable so they can be run in-process
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "script"))
+
+from mod_model import ModFile, load_mods, write_mods
+from hash_cache import HashCache
+from refresh import refresh_pack
+from build_trace import BuildTrace
+from scheduler import ScheduledStage, StageCancelled, run_stages
+from sync_tree import sync_tree, sync_paths, is_in_sync, copy_file
+from watch import create_watcher, wait_for_changes, is_within
+from sanitise_filenames import sanitise_filename
+from verify_urls import verify_mods
+from release_delta import publish_release
+from install_bundle import build_bundle
+from pack_db import record_build
+from signify import SignifyError, sign_files, verify_files, read_unsup_public_key, signature_path
+from jar_index import analyse_mods
+from profiles import build_profiles, pack_index_file
+from canonicalise_configs import ConfigCanonicaliser
+from normalise_packs import PackNormaliser
+from build_manifest import (hash_text, config_fingerprint, empty_manifest, load_manifest,
+                            save_manifest, is_up_to_date, make_record)
+
+def load_script(script_name):
+    """Imports one of the pipeline scripts."""
     try:
-        # Use python3 to ensure the correct interpreter is used
-        subprocess.run(["python3", "script/" + script_name], check=True)
-    except FileNotFoundError:
-        print(f"Error: Python interpreter 'python3' or script '{script_name}' not found.")
-        exit(1)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running {script_name}: {e}")
+        return importlib.import_module(os.path.splitext(script_name)[0])
+    except ImportError as e:
+        print(f"Error: Script '{script_name}' could not be imported: {e}")
         exit(1)
 
-def copy_items(source_root, destination_root, items):
+def run_script(script_name, mods):
+    """
+    A helper function to run other Python scripts in-process.
+    Scripts providing a `transform` function are applied to the shared
+    in-memory mod model, any other script has its `main` function called.
+    """
+    print(f"\n--- Running {script_name} ---")
+    module = load_script(script_name)
+    if hasattr(module, "transform"):
+        module.transform(mods)
+    else:
+        module.main()
+
+def transform_scripts():
+    """The SCRIPTS that transform the mod model, run in order by the mods stage."""
+    return [script for script in SCRIPTS if hasattr(load_script(script), "transform")]
+
+def script_stages(state):
+    """
+    The SCRIPTS run through their `main` function, each as a stage of its
+    own. A script declares the paths it touches with READS and WRITES, and
+    one that does not is assumed to touch the whole pack.
+    """
+    stages = []
+    for script in SCRIPTS:
+        module = load_script(script)
+        if not hasattr(module, "transform"):
+            stages.append(ScheduledStage(script, lambda script=script: traced_script(state, script),
+                                         reads=getattr(module, "READS", ["."]), writes=getattr(module, "WRITES", ["."])))
+    return stages
+
+def traced_script(state, script):
+    with state.trace.stage(script):
+        run_script(script, [])
+
+def sanitised_path(rel_path):
+    """
+    Maps a path inside one of the SANITISE_DIRS to the name it ends up with
+    after sanitise_filenames.py, so sanitised files are not copied again.
+    """
+    if os.path.dirname(rel_path) == "" and rel_path.endswith(".zip"):
+        return sanitise_filename(rel_path)
+    return rel_path
+
+def copy_items(source_root, destination_root, items, hash_cache, converters=None, cancel=None):
     """
     Copies a list of files or directories from a source root to a destination root.
-    If a destination item exists, it is updated.
+    If a destination item exists, it is updated: only new or changed files are
+    copied, and files no longer in the source are deleted. `converters` maps
+    directory items to a converter that writes some of their files instead.
+    Stops between items once `cancel` is set.
+    Returns the number of files copied.
     """
+    total_copied = 0
     for item in items:
+        if cancel is not None and cancel.is_set():
+            raise StageCancelled()
         source_path = os.path.join(source_root, item)
         dest_path = os.path.join(destination_root, item)
         
@@ -35,24 +108,36 @@ def copy_items(source_root, destination_root, items):
             continue
         
         if os.path.isdir(source_path):
-            # Remove existing destination directory to ensure a clean copy
-            if os.path.exists(dest_path):
-                shutil.rmtree(dest_path)
-            shutil.copytree(source_path, dest_path)
-            print(f"Copied directory '{item}' to '{dest_path}'.")
-        else:
-            shutil.copy2(source_path, dest_path)
+            rename = sanitised_path if item in SANITISE_DIRS else None
+            copied, removed = sync_tree(source_path, dest_path, hash_cache, rename,
+                                        converter=converters.get(item) if converters else None)
+            print(f"Synced directory '{item}' to '{dest_path}' ({copied} copied, {removed} removed).")
+            total_copied += copied
+        elif not is_in_sync(source_path, dest_path, hash_cache):
+            copy_file(source_path, dest_path)
             print(f"Copied file '{item}' to '{dest_path}'.")
+            total_copied += 1
+        else:
+            print(f"File '{item}' is up to date.")
+    return total_copied
 
-def generate_toml_for_unknown_mods():
+def generate_toml_for_unknown_mods(hash_cache):
     """
-    Creates .pw.toml files for unknown mods and copies them to the mods directory.
+    Creates .pw.toml contents for unknown mods.
+    JAR hashes come from the hash cache, so unchanged JARs are never re-read.
+    Returns a mapping of .pw.toml filename to TOML text.
     """
     print(f"\n--- Processing unknown mods in '{UNKNOWN_MODS_DIR}' ---")
+    generated = {}
     
     if not os.path.exists(UNKNOWN_MODS_DIR):
         print(f"Warning: Directory '{UNKNOWN_MODS_DIR}' not found. Skipping unknown mods.")
-        return
+        return generated
+
+    # Hash every JAR up front so new or changed JARs are hashed in parallel
+    jar_paths = [os.path.join(UNKNOWN_MODS_DIR, mod_data['filename']) for mod_data in UNKNOWN_MODS_TOML_DATA
+                 if mod_data.get('filename') and os.path.exists(os.path.join(UNKNOWN_MODS_DIR, mod_data['filename']))]
+    jar_hashes = hash_cache.hash_files(jar_paths)
 
     for mod_data in UNKNOWN_MODS_TOML_DATA:
         filename = mod_data.get('filename')
@@ -68,12 +153,6 @@ def generate_toml_for_unknown_mods():
             print(f"Warning: JAR file '{filename}' not found in '{UNKNOWN_MODS_DIR}'. Skipping.")
             continue
 
-        # Calculate SHA256 hash of the JAR file
-        sha256_hash = hashlib.sha256()
-        with open(mod_jar_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
-                sha256_hash.update(byte_block)
-        
         # Construct the TOML content
         toml_content = {
             "name": name,
@@ -81,90 +160,535 @@ def generate_toml_for_unknown_mods():
             "side": side,
             "download": {
                 "url": f"{UNKNOWN_MODS_URL_BASE}{filename}",
-                "hash": sha256_hash.hexdigest(),
+                "hash": jar_hashes[mod_jar_path],
                 "hash-format": "sha256",
                 "mode": "url"
             }
         }
         
-        # Write the TOML content to a new file in the mods directory
         toml_filename = f"{os.path.splitext(filename)[0]}.pw.toml"
-        toml_path = os.path.join(MODS_DIR, toml_filename)
+        generated[toml_filename] = toml.dumps(toml_content)
         
-        with open(toml_path, "w") as toml_file:
-            toml.dump(toml_content, toml_file)
-        
-        print(f"Created TOML file for '{filename}' at '{toml_path}'.")
+        print(f"Generated TOML for '{filename}' as '{toml_filename}'.")
 
-def main():
-    """Main function to run the modpack construction pipeline."""
-    
-    # --- Step 1: Clear and Copy Files ---
-    print(f"--- Step 1: Clearing existing {MODS_DIR} and copying files ---")
-    
-    # Clear existing mods folder
-    if os.path.exists(MODS_DIR):
-        print(f"Clearing existing {MODS_DIR} directory...")
-        shutil.rmtree(MODS_DIR)
-    os.makedirs(MODS_DIR)
+    return generated
+
+def read_mod_sources(source_mods_path):
+    """
+    Reads the source .pw.toml files.
+    Returns a mapping of .pw.toml filename to its source text.
+    """
+    sources = {}
+    for filename in os.listdir(source_mods_path):
+        if filename.endswith(".pw.toml"):
+            with open(os.path.join(source_mods_path, filename), "r") as f:
+                sources[filename] = f.read()
+    return sources
+
+def update_mod_sources(sources, source_mods_path, changed_paths):
+    """
+    Re-reads only the given source .pw.toml files, dropping any that were
+    deleted. A change to the source mods directory itself, such as the
+    watcher reporting lost events, re-reads every file. Returns the number
+    of files read.
+    """
+    if source_mods_path in changed_paths:
+        sources.clear()
+        sources.update(read_mod_sources(source_mods_path))
+        return len(sources)
+
+    files_read = 0
+    for path in changed_paths:
+        filename = os.path.basename(path)
+        if os.path.dirname(path) != source_mods_path or not filename.endswith(".pw.toml"):
+            continue
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                sources[filename] = f.read()
+            files_read += 1
+        else:
+            sources.pop(filename, None)
+    return files_read
+
+def plan_mod_builds(sources, manifest):
+    """
+    Removes mods that are no longer in the source and loads the mods whose
+    source changed since the last build into the in-memory model.
+    Returns the list of loaded mods and their source hashes.
+    """
+    for filename in os.listdir(MODS_DIR):
+        if filename.endswith(".pw.toml") and filename not in sources:
+            os.remove(os.path.join(MODS_DIR, filename))
+            manifest['mods'].pop(filename, None)
+            print(f"Removed '{filename}', which is no longer in the pack.")
+
+    mods = []
+    source_hashes = {}
+    for filename, text in sorted(sources.items()):
+        dest_path = os.path.join(MODS_DIR, filename)
+        source_hash = hash_text(text)
+        if is_up_to_date(manifest['mods'].get(filename), source_hash, dest_path):
+            continue
+
+        mod = ModFile(dest_path, text)
+        # Compare against what is on disk so unchanged output is not rewritten
+        mod.original_text = None
+        if os.path.exists(dest_path):
+            with open(dest_path, "r") as f:
+                mod.original_text = f.read()
+        mods.append(mod)
+        source_hashes[mod.path] = source_hash
 
-    # Copy additional directories and files
-    copy_items(ROOT_COPY_PATH, ".", ADDITIONAL_COPY_PATHS)
+    return mods, source_hashes
 
-    # Copy .pw.toml files from the source mods location into the MODS_DIR
+class BuildState:
+    """
+    Everything a build keeps in memory: the build manifest, the hash cache,
+    the source .pw.toml texts, the generated unknown mod TOML and the model of
+    every built mod shared by the later stages. Watch mode
+    keeps a single BuildState alive so every rebuild starts warm.
+    """
+
+    def __init__(self, manifest, hash_cache):
+        self.manifest = manifest
+        self.hash_cache = hash_cache
+        self.sources = None
+        self.generated = {}
+        self.pack_mods = []
+        self.trace = None
+        # Stages run concurrently: the manifest lock guards the build manifest,
+        # and cancel is set when a stage fails
+        self.manifest_lock = threading.Lock()
+        self.cancel = threading.Event()
+
+    def check_cancelled(self):
+        if self.cancel.is_set():
+            raise StageCancelled()
+
+def copy_converters(state):
+    """
+    Returns the converters for the copied directories: with CANONICALISE_CONFIGS
+    set configs are canonicalised, and with NORMALISE_PACKS set pack zips are
+    repacked. Their outputs are recorded in the build manifest.
+    """
+    converters = {}
+    with state.manifest_lock:
+        # Converters update copies of their records, merged back once they are done
+        if CANONICALISE_CONFIGS:
+            canonicaliser = ConfigCanonicaliser(state.hash_cache, dict(state.manifest.get(ConfigCanonicaliser.MANIFEST_KEY, {})))
+            converters.update((item, canonicaliser) for item in CANONICALISE_DIRS)
+        if NORMALISE_PACKS:
+            normaliser = PackNormaliser(state.hash_cache, dict(state.manifest.get(PackNormaliser.MANIFEST_KEY, {})))
+            converters.update((item, normaliser) for item in NORMALISE_PACK_DIRS)
+    return converters
+
+def save_converter_records(state, converters):
+    """Drops the records of outputs that no longer exist, saves the manifest and reports what was converted."""
+    if not converters:
+        return
+    unique_converters = {id(converter): converter for converter in converters.values()}.values()
+    with state.manifest_lock:
+        for converter in unique_converters:
+            state.manifest[converter.MANIFEST_KEY] = {dest_path: record for dest_path, record in converter.records.items()
+                                   if os.path.exists(dest_path)}
+        save_manifest(state.manifest)
+
+    for converter in unique_converters:
+        converter.report()
+
+def copy_stage(state, items=ADDITIONAL_COPY_PATHS):
+    """Copies the additional directories and files."""
+    with state.trace.stage("copy") as stage:
+        converters = copy_converters(state)
+        stage.files_written = copy_items(ROOT_COPY_PATH, ".", items, state.hash_cache, converters, state.cancel)
+        save_converter_records(state, converters)
+
+def read_mods_stage(state, changed_paths=None):
+    """
+    Reads the .pw.toml files from the source mods location. If the sources
+    are already in memory, only the changed paths are re-read.
+    """
     source_mods_path = os.path.join(ROOT_COPY_PATH, SOURCE_MODS_DIR_NAME)
-    print(f"Copying .pw.toml files from {source_mods_path}...")
+    print(f"Reading .pw.toml files from {source_mods_path}...")
     
     if not os.path.exists(source_mods_path):
         print(f"Error: Source mods directory '{source_mods_path}' not found.")
         exit(1)
-    
-    for filename in os.listdir(source_mods_path):
-        if filename.endswith(".pw.toml"):
-            source_path = os.path.join(source_mods_path, filename)
-            dest_path = os.path.join(MODS_DIR, filename)
-            shutil.copy2(source_path, dest_path)
-    print(f"Copied .pw.toml files from {source_mods_path} to {MODS_DIR}.")
 
-    # --- Process unknown mods ---
-    generate_toml_for_unknown_mods()
+    with state.trace.stage("read mods") as stage:
+        if state.sources is None or changed_paths is None:
+            state.sources = read_mod_sources(source_mods_path)
+            stage.files_read = len(state.sources)
+        else:
+            stage.files_read = update_mod_sources(state.sources, os.path.abspath(source_mods_path), changed_paths)
+
+def unknown_mods_stage(state):
+    """Generates the TOML for the unknown mods."""
+    with state.trace.stage("unknown mods") as stage:
+        state.generated = generate_toml_for_unknown_mods(state.hash_cache)
+        stage.files_written = len(state.generated)
+
+def mods_stage(state):
+    """
+    Runs the transform scripts over every mod whose source changed since the
+    last build and writes the results to the mods directory. The build
+    manifest is held for the whole stage, as copying records its outputs there too.
+    """
+    with state.manifest_lock:
+        build_mods(state)
+
+def build_mods(state):
+    manifest = state.manifest
+    fingerprint = config_fingerprint()
+    if manifest['config'] != fingerprint:
+        # The scripts or patch lists changed, so no previous output can be trusted
+        manifest['mods'] = {}
+
+    os.makedirs(MODS_DIR, exist_ok=True)
+    # Unknown mods take precedence over source files of the same name
+    sources = dict(state.sources)
+    sources.update(state.generated)
+
+    with state.trace.stage("plan mods") as stage:
+        mods, source_hashes = plan_mod_builds(sources, manifest)
+        stage.files_read = len(mods)
+    print(f"\n{len(mods)} of {len(sources)} mods changed since the last build.")
     
     # --- Step 2: Run Scripts ---
     print(f"\n--- Step 2: Running scripts ---")
 
-    for script in SCRIPTS:
-        run_script(script)
+    # Share the model of changed mods between all scripts, recording the
+    # output of each stage in the build manifest
+    stage_hashes = {mod.path: {} for mod in mods}
+    for script in transform_scripts():
+        state.check_cancelled()
+        with state.trace.stage(script):
+            run_script(script, mods)
+        for mod in mods:
+            stage_hashes[mod.path][script] = hash_text(mod.text)
 
-    # --- Step 3: Run packwiz refresh ---
-    print(f"\n--- Step 3: Running packwiz refresh ---")
-    try:
-        subprocess.run(["packwiz", "refresh"], check=True)
-    except FileNotFoundError:
-        print("Error: 'packwiz' command not found. Make sure it's in your PATH.")
-        exit(1)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running packwiz refresh: {e}")
-        exit(1)
+    with state.trace.stage("write mods") as stage:
+        stage.files_written = write_mods(mods)
+    print(f"\nWrote {stage.files_written} changed .pw.toml files to {MODS_DIR}.")
 
-    # --- Step 4: Sign pack.toml ---
-    print(f"\n--- Step 4: Signing {PACKWIZ_CONFIG_FILE} ---")
-    # Remove existing unsup.sig file if it exists
-    if os.path.exists(SIG_FILE):
-        os.remove(SIG_FILE)
-        print(f"Removed existing {SIG_FILE}.")
+    for mod in mods:
+        record = make_record(source_hashes[mod.path], mod.path, hash_text(mod.text))
+        record['stages'] = stage_hashes[mod.path]
+        manifest['mods'][mod.filename] = record
+    manifest['config'] = fingerprint
+    save_manifest(manifest)
 
-    # Run signify to create the new signature
-    try:
-        subprocess.run(["signify", "-S", "-s", SIGNIFY_SECRET_KEY, "-m", PACKWIZ_CONFIG_FILE, "-x", SIG_FILE], check=True)
-    except FileNotFoundError:
-        print("Error: 'signify' command not found. Make sure it's installed and in your PATH.")
+    # Load the model of every built mod once, reusing the mods already in memory
+    built = {mod.filename: mod for mod in mods}
+    state.pack_mods = [built.get(mod.filename, mod) for mod in load_mods(MODS_DIR)]
+
+def analyse_jars_stage(state):
+    """Checks the mod jars for duplicate mod IDs, missing dependencies and side mismatches."""
+    print(f"\n--- Analysing mod jars ---")
+    with state.trace.stage("analyse jars") as stage:
+        stage.files_read = len(state.pack_mods)
+        # Problems are reported but do not stop the build, as the side checks are heuristics
+        analyse_mods(state.pack_mods)
+
+def verify_stage(state, full=False):
+    """Checks that every mod download resolves, and in full mode matches its hash."""
+    print(f"\n--- Verifying mod downloads ---")
+    with state.trace.stage("verify") as stage:
+        stage.files_read = len(state.pack_mods)
+        failures = verify_mods(state.pack_mods, full)
+    if failures:
+        print(f"Error: {failures} mod downloads failed verification.")
         exit(1)
-    except subprocess.CalledProcessError as e:
-        print(f"Error running signify: {e}")
+
+def refresh_stage(state):
+    """Refreshes pack.toml and its index."""
+    print(f"\n--- Step 3: Refreshing {PACKWIZ_CONFIG_FILE} and its index ---")
+    hash_cache = state.hash_cache
+    with state.trace.stage("refresh") as stage:
+        try:
+            stage.files_written = refresh_pack(hash_cache)
+        except (OSError, KeyError, ValueError) as e:
+            print(f"Error refreshing the packwiz index: {e}")
+            exit(1)
+    hash_cache.save()
+    print(f"Hash cache: {hash_cache.hits} hits, {hash_cache.misses} misses, {hash_cache.bytes_hashed} bytes hashed.")
+
+def pack_db_stage(state):
+    """Records the build's mods and files in the pack database."""
+    with state.trace.stage("pack db") as stage:
+        try:
+            build_id, mods_changed, files_changed = record_build(state.pack_mods)
+        except (sqlite3.Error, OSError) as e:
+            # The database only answers queries, so a failure does not stop the build
+            print(f"Warning: Could not record the build in {PACK_DB_FILE}: {e}")
+            return
+        stage.files_written = mods_changed + files_changed
+    if mods_changed or files_changed:
+        print(f"Recorded build {build_id} in {PACK_DB_FILE}: {mods_changed} mod and {files_changed} file rows changed.")
+
+def profiles_stage(state):
+    """Builds the profile packs from the shared mod model."""
+    if not PROFILES:
+        return
+    print(f"\n--- Building profiles: {', '.join(PROFILES)} ---")
+    with state.trace.stage("profiles"):
+        build_profiles(state.pack_mods, state.hash_cache)
+    state.hash_cache.save()
+
+def release_stage(state):
+    """Publishes the compressed index and a delta manifest from the previous release."""
+    with state.trace.stage("release") as stage:
+        release_number, delta = publish_release()
+        if release_number is None:
+            print("\nThe index has not changed since the last release.")
+            return
+        stage.files_written = 1 if delta is None else 2
+    if delta is None:
+        print(f"\nPublished release {release_number} to {RELEASES_DIR}.")
+    else:
+        print(f"\nPublished release {release_number} to {RELEASES_DIR}: {len(delta['added'])} added, "
+              f"{len(delta['changed'])} changed, {len(delta['removed'])} removed since the last release.")
+
+def bundle_stage(state):
+    """Bundles the pack's files other than mods for first installs."""
+    with state.trace.stage("bundle") as stage:
+        try:
+            manifest, compressed, reused = build_bundle()
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            print(f"Error: Could not build the install bundle: {e}")
+            exit(1)
+        if manifest is None:
+            return
+        stage.files_read = compressed
+        stage.files_written = 2
+    print(f"\nBundled {len(manifest['files'])} files into {BUNDLE_FILE} ({manifest['bundle-size'] / 1024:.0f} KiB): "
+          f"{compressed} compressed, {reused} reused from the last bundle.")
+
+def signed_files():
+    """Every file a signed build signs, with the signature file it gets."""
+    pack_roots = ["."] + [profile["output"] for profile in PROFILES.values()]
+    pairs = [(os.path.normpath(os.path.join(pack_root, PACKWIZ_CONFIG_FILE)),
+              os.path.normpath(os.path.join(pack_root, SIG_FILE))) for pack_root in pack_roots]
+    index_file, _ = pack_index_file(".")
+    for file_path in [index_file, RELEASE_INDEX_FILE, BUNDLE_MANIFEST_FILE]:
+        if os.path.exists(file_path):
+            pairs.append((file_path, signature_path(file_path)))
+    return pairs
+
+def sign_stage(state):
+    """
+    Signs pack.toml, the pack.toml of every profile and the release files in
+    one go, then checks every signature against the public key in unsup.ini
+    so a build signed with the wrong key never goes out.
+    """
+    print(f"\n--- Step 4: Signing {PACKWIZ_CONFIG_FILE} and the release files ---")
+    pairs = signed_files()
+    with state.trace.stage("sign") as stage:
+        try:
+            in_process = sign_files(pairs)
+            failures = verify_files(pairs, read_unsup_public_key())
+        except FileNotFoundError as e:
+            if e.filename != "signify":
+                raise
+            print("Error: 'signify' command not found. It is needed for a secret key with a passphrase. "
+                  "Make sure it's installed and in your PATH.")
+            exit(1)
+        except subprocess.CalledProcessError as e:
+            print(f"Error running signify: {e}")
+            exit(1)
+        except (SignifyError, OSError) as e:
+            print(f"Error signing: {e}")
+            exit(1)
+        stage.files_written = len(pairs)
+    for file_path, reason in failures:
+        print(f"Error: {file_path}: {reason}. Is {SIGNIFY_SECRET_KEY} the key for {UNSUP_CONFIG_FILE}?")
+    if failures:
         exit(1)
-    print(f"Successfully signed {PACKWIZ_CONFIG_FILE} and created {SIG_FILE}.")
-    
+    print(f"Signed {len(pairs)} files{'' if in_process else ' with signify'}: "
+          f"{', '.join(file_path for file_path, _ in pairs)}.")
+
+def stage_paths(name):
+    """
+    The paths a stage reads and writes, which decide what it can run
+    alongside. In-memory state shared between stages is named 'state:<name>'.
+    Copying and the mods stage both record outputs in the build manifest,
+    which they share through the manifest lock instead.
+    """
+    index_file, _ = pack_index_file(".")
+    pack_files = [PACKWIZ_CONFIG_FILE, index_file, HASH_CACHE_FILE]
+    return {
+        "copy": ([os.path.join(ROOT_COPY_PATH, item) for item in ADDITIONAL_COPY_PATHS], ADDITIONAL_COPY_PATHS),
+        "read mods": ([os.path.join(ROOT_COPY_PATH, SOURCE_MODS_DIR_NAME)], ["state:sources"]),
+        "unknown mods": ([UNKNOWN_MODS_DIR], ["state:generated"]),
+        "mods": (["state:sources", "state:generated", MODS_DIR] + SIDE_RULE_INPUTS,
+                 [MODS_DIR, "state:pack_mods", SIDE_RULES_REPORT_FILE]),
+        "analyse jars": (["state:pack_mods", UNKNOWN_MODS_DIR, os.path.join(ROOT_COPY_PATH, os.path.dirname(SOURCE_MODS_DIR_NAME)),
+                          CONTENT_STORE_DIR], [JAR_INDEX_FILE]),
+        "verify": (["state:pack_mods"], [VERIFIED_URLS_FILE, CONTENT_STORE_DIR]),
+        "refresh": (["."], pack_files),
+        "pack db": ([PACKWIZ_CONFIG_FILE, index_file, "state:pack_mods"], [PACK_DB_FILE]),
+        "profiles": (["."] + pack_files + ["state:pack_mods"], [profile["output"] for profile in PROFILES.values()] + [HASH_CACHE_FILE]),
+        "release": ([PACKWIZ_CONFIG_FILE, index_file], [RELEASES_DIR]),
+        "bundle": (["."], [BUNDLE_FILE, BUNDLE_MANIFEST_FILE]),
+        "sign": ([PACKWIZ_CONFIG_FILE, index_file, RELEASE_INDEX_FILE, BUNDLE_MANIFEST_FILE, UNSUP_CONFIG_FILE]
+                 + [profile["output"] for profile in PROFILES.values()],
+                 [SIG_FILE, SIGNATURES_DIR] + [os.path.join(profile["output"], SIG_FILE) for profile in PROFILES.values()]),
+    }[name]
+
+def scheduled(name, run):
+    reads, writes = stage_paths(name)
+    return ScheduledStage(name, run, reads, writes)
+
+def finishing_stages(state, sign, release=True):
+    """
+    The stages after the mods are built: refreshing, recording the build,
+    profiles, and for signed builds releasing, bundling and signing.
+    """
+    stages = [
+        scheduled("refresh", lambda: refresh_stage(state)),
+        scheduled("pack db", lambda: pack_db_stage(state)),
+        scheduled("profiles", lambda: profiles_stage(state)),
+    ]
+    # Only signed builds are releases, local test builds publish nothing
+    if sign and release:
+        stages.append(scheduled("release", lambda: release_stage(state)))
+        stages.append(scheduled("bundle", lambda: bundle_stage(state)))
+    if sign:
+        stages.append(scheduled("sign", lambda: sign_stage(state)))
+    return stages
+
+def build(state, sign=True, verify=None):
+    """
+    Runs every step of the modpack construction pipeline. `verify` optionally
+    checks the mod downloads before the pack is refreshed: 'urls' checks that
+    they resolve and 'hashes' downloads and hashes every one.
+    Stages that touch separate paths run concurrently.
+    """
+    # --- Step 1: Copy Files ---
+    print(f"--- Step 1: Copying changed files into {MODS_DIR} and {', '.join(ADDITIONAL_COPY_PATHS)} ---")
+    stages = [
+        scheduled("copy", lambda: copy_stage(state)),
+        scheduled("read mods", lambda: read_mods_stage(state)),
+        # --- Process unknown mods ---
+        scheduled("unknown mods", lambda: unknown_mods_stage(state)),
+        scheduled("mods", lambda: mods_stage(state)),
+    ]
+    stages += script_stages(state)
+    stages.append(scheduled("analyse jars", lambda: analyse_jars_stage(state)))
+    if verify:
+        stages.append(scheduled("verify", lambda: verify_stage(state, full=verify == "hashes")))
+    stages += finishing_stages(state, sign)
+    run_stages(stages, cancel=state.cancel)
+
+    if not sign:
+        print("\n--- Skipping Step 4: signing is disabled ---")
     print("\n--- Modpack construction complete! ---")
 
+def sync_changed_stage(state, copied_items):
+    """Syncs only the changed paths of each copied item."""
+    with state.trace.stage("copy") as stage:
+        converters = copy_converters(state)
+        for item, rel_paths in copied_items.items():
+            state.check_cancelled()
+            rename = sanitised_path if item in SANITISE_DIRS else None
+            if "." in rel_paths:
+                copied, removed = sync_tree(os.path.join(ROOT_COPY_PATH, item), item, state.hash_cache, rename,
+                                            converter=converters.get(item))
+            else:
+                copied, removed = sync_paths(os.path.join(ROOT_COPY_PATH, item), item, rel_paths,
+                                             state.hash_cache, rename, converter=converters.get(item))
+            print(f"Synced {len(rel_paths)} changed paths in '{item}' ({copied} copied, {removed} removed).")
+            stage.files_written += copied
+        save_converter_records(state, converters)
+
+def rebuild(state, changed_paths, sign=True):
+    """
+    Re-runs only the stages affected by the changed paths, reusing the
+    in-memory state of the previous build.
+    """
+    source_mods_path = os.path.abspath(os.path.join(ROOT_COPY_PATH, SOURCE_MODS_DIR_NAME))
+    patch_files = {os.path.abspath(path) for path in SIDE_RULE_INPUTS}
+
+    copied_items = {}
+    for item in ADDITIONAL_COPY_PATHS:
+        item_root = os.path.abspath(os.path.join(ROOT_COPY_PATH, item))
+        rel_paths = [os.path.relpath(path, item_root) for path in changed_paths if is_within(path, item_root)]
+        if rel_paths:
+            copied_items[item] = rel_paths
+    mods_changed = [path for path in changed_paths if is_within(path, source_mods_path)]
+    unknown_changed = any(is_within(path, os.path.abspath(UNKNOWN_MODS_DIR)) for path in changed_paths)
+    patches_changed = any(path in patch_files for path in changed_paths)
+
+    stages = []
+    if copied_items:
+        stages.append(scheduled("copy", lambda: sync_changed_stage(state, copied_items)))
+    if mods_changed:
+        stages.append(scheduled("read mods", lambda: read_mods_stage(state, mods_changed)))
+    if unknown_changed:
+        stages.append(scheduled("unknown mods", lambda: unknown_mods_stage(state)))
+    if mods_changed or unknown_changed or patches_changed:
+        stages.append(scheduled("mods", lambda: mods_stage(state)))
+    if copied_items or mods_changed or unknown_changed or patches_changed:
+        stages += script_stages(state)
+    stages += finishing_stages(state, sign, release=False)
+    run_stages(stages, cancel=state.cancel)
+
+def traced(state, profile, func, *args):
+    """Runs a build function under a fresh build trace, writing it out afterwards."""
+    state.trace = BuildTrace(state.hash_cache, profile=profile)
+    try:
+        func(state, *args)
+    finally:
+        # Write the trace even if a stage failed, so slow failures can be seen too
+        state.trace.write()
+        state.trace.print_summary()
+        print(f"\nBuild trace written to {BUILD_TRACE_FILE}.")
+
+def watch(state, profile, sign=True):
+    """
+    Keeps rebuilding as the instance changes. Bursts of changes are debounced
+    into a single rebuild that only re-runs the affected stages.
+    """
+    watched_trees = [os.path.join(ROOT_COPY_PATH, SOURCE_MODS_DIR_NAME), UNKNOWN_MODS_DIR]
+    watched_trees += [os.path.join(ROOT_COPY_PATH, item) for item in ADDITIONAL_COPY_PATHS]
+    watcher = create_watcher(watched_trees, SIDE_RULE_INPUTS)
+    print(f"\n--- Watching {ROOT_COPY_PATH} for changes (Ctrl+C to stop) ---")
+
+    try:
+        while True:
+            changed_paths = wait_for_changes(watcher, WATCH_DEBOUNCE)
+            print(f"\n--- {len(changed_paths)} changed paths, rebuilding ---")
+            try:
+                traced(state, profile, rebuild, changed_paths, sign)
+            except SystemExit:
+                print("Error: Rebuild failed. Waiting for further changes.")
+            except Exception as e:
+                print(f"Error: Rebuild failed: {e}. Waiting for further changes.")
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        watcher.close()
+
+def main():
+    """Main function to run the modpack construction pipeline."""
+    parser = argparse.ArgumentParser(description="Builds the modpack from the PrismLauncher instance.")
+    parser.add_argument("--clean", action="store_true",
+                        help="Ignore the build manifest and rebuild every mod and file.")
+    parser.add_argument("--profile", action="store_true",
+                        help=f"Run every stage under cProfile, writing the profiles to '{PROFILE_DIR}'.")
+    parser.add_argument("--no-sign", action="store_true",
+                        help=f"Skip signing {PACKWIZ_CONFIG_FILE}, e.g. for local test builds.")
+    parser.add_argument("--watch", action="store_true",
+                        help="After building, keep rebuilding incrementally as the instance changes.")
+    parser.add_argument("--verify", choices=["urls", "hashes"],
+                        help="Check that every mod download URL resolves, or download and check every hash.")
+    args = parser.parse_args()
+
+    manifest = empty_manifest() if args.clean else load_manifest()
+    state = BuildState(manifest, HashCache())
+    traced(state, args.profile, build, not args.no_sign, args.verify)
+    if args.watch:
+        watch(state, args.profile, not args.no_sign)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
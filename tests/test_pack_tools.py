@@ -0,0 +1,186 @@
+import os
+import sys
+import threading
+import http.client
+import pytest
+import toml
+
+# Get the path of the parent directory
+parent_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Add the parent directory and the scripts to the system path
+sys.path.append(parent_dir)
+sys.path.append(os.path.join(parent_dir, 'script'))
+
+import pw_toml
+from signify import ed25519_public_key, ed25519_sign, ed25519_verify
+from serve_pack import PackServer, parse_range
+
+MOD_TEXT = '''name = "Example Mod"
+filename = 'example-1.0.jar'
+side  =  "both"
+
+[download]
+url = "https://cdn.modrinth.com/data/AAAA/versions/1.0/example-1.0.jar"
+hash-format = "sha1"
+hash = "0123456789abcdef0123456789abcdef01234567"
+
+[update]
+[update.modrinth]
+mod-id = "AAAA"
+version = "1.0"
+'''
+
+def test_pw_toml_reads_like_toml():
+    assert pw_toml.loads(MOD_TEXT) == toml.loads(MOD_TEXT)
+
+def test_pw_toml_writes_unchanged_document_back_as_it_was():
+    assert pw_toml.dumps(pw_toml.loads(MOD_TEXT), MOD_TEXT) == MOD_TEXT
+
+def test_pw_toml_edit_only_rewrites_the_edited_value():
+    data = pw_toml.loads(MOD_TEXT)
+    data['side'] = 'client'
+    data['update']['modrinth']['version'] = '1.1'
+    expected = MOD_TEXT.replace('side  =  "both"', 'side  =  "client"').replace('version = "1.0"', 'version = "1.1"')
+    assert pw_toml.dumps(data, MOD_TEXT) == expected
+
+def test_pw_toml_removed_and_added_keys():
+    data = pw_toml.loads(MOD_TEXT)
+    del data['download']['hash-format']
+    data['update']['modrinth']['x-added'] = "it's added"
+    text = pw_toml.dumps(data, MOD_TEXT)
+    assert toml.loads(text) == data
+    assert 'hash-format' not in text
+    assert text.startswith(MOD_TEXT.split('[download]')[0])
+
+# RFC 8032 section 7.1, test 1
+RFC8032_SEED = bytes.fromhex('9d61b19deffd5a60ba844af492ec2cc44449c5697b326919703bac031cae7f60')
+RFC8032_PUBLIC_KEY = bytes.fromhex('d75a980182b10ab7d54bfed3c964073a0ee172f3daa62325af021a68f707511a')
+RFC8032_SIGNATURE = bytes.fromhex('e5564300c360ac729086e2cc806e828a84877f1eb8e5d974d873e065224901555f'
+                                  'b8821590a33bacc61e39701cf9b46bd25bf5f0595bbe24655141438e7a100b')
+
+def test_ed25519_rfc8032_vector():
+    assert ed25519_public_key(RFC8032_SEED) == RFC8032_PUBLIC_KEY
+    assert ed25519_sign(RFC8032_SEED, b'') == RFC8032_SIGNATURE
+    assert ed25519_verify(RFC8032_PUBLIC_KEY, b'', RFC8032_SIGNATURE)
+
+def test_ed25519_rejects_tampered_signatures():
+    tampered = bytes([RFC8032_SIGNATURE[0] ^ 1]) + RFC8032_SIGNATURE[1:]
+    assert not ed25519_verify(RFC8032_PUBLIC_KEY, b'', tampered)
+    assert not ed25519_verify(RFC8032_PUBLIC_KEY, b'x', RFC8032_SIGNATURE)
+
+@pytest.mark.parametrize('header, expected', [
+    (None, None),
+    ('bytes=0-0', (0, 1)),
+    ('bytes=2-5', (2, 6)),
+    ('bytes=5-', (5, 10)),
+    ('bytes=0-99', (0, 10)),
+    ('bytes=-3', (7, 10)),
+    ('bytes=-99', (0, 10)),
+    ('bytes=10-', False),
+    ('bytes=-0', False),
+    ('bytes=5-2', None),
+    ('bytes=0-1,3-4', None),
+    ('items=0-1', None),
+    ('bytes=a-b', None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 10) == expected
+
+CONFIG_BODY = b'0123456789'
+
+@pytest.fixture
+def pack_server(tmp_path, monkeypatch):
+    """Serves a pack of one config file from a temporary directory."""
+    (tmp_path / 'config').mkdir()
+    (tmp_path / 'config' / 'x.cfg').write_bytes(CONFIG_BODY)
+    (tmp_path / 'index.toml').write_text('hash-format = "sha256"\n\n[[files]]\nfile = "config/x.cfg"\nhash = "00"\n')
+    (tmp_path / 'pack.toml').write_text('name = "T"\npack-format = "packwiz:1.1.0"\n\n[index]\nfile = "index.toml"\n'
+                                        'hash-format = "sha256"\nhash = "00"\n')
+    # The jar cache is the content store under the working directory
+    monkeypatch.chdir(tmp_path)
+    server = PackServer(('127.0.0.1', 0), 'http://127.0.0.1', pack_root=str(tmp_path))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def get(server, path, headers=None, method='GET'):
+    connection = http.client.HTTPConnection(*server.server_address, timeout=10)
+    try:
+        connection.request(method, path, headers=headers or {})
+        response = connection.getresponse()
+        return response, response.read()
+    finally:
+        connection.close()
+
+@pytest.mark.parametrize('path', ['/config/x.cfg', '/pack.toml'])
+def test_serve_whole_file(pack_server, path):
+    response, body = get(pack_server, path)
+    assert response.status == 200
+    assert response.getheader('Accept-Ranges') == 'bytes'
+    assert int(response.getheader('Content-Length')) == len(body)
+    assert response.getheader('ETag')
+    if path == '/config/x.cfg':
+        assert body == CONFIG_BODY
+
+def test_serve_range(pack_server):
+    response, body = get(pack_server, '/config/x.cfg', {'Range': 'bytes=2-5'})
+    assert response.status == 206
+    assert response.getheader('Content-Range') == 'bytes 2-5/10'
+    assert body == b'2345'
+
+def test_serve_suffix_range_from_memory(pack_server):
+    _, whole = get(pack_server, '/pack.toml')
+    response, body = get(pack_server, '/pack.toml', {'Range': 'bytes=-4'})
+    assert response.status == 206
+    assert response.getheader('Content-Range') == f"bytes {len(whole) - 4}-{len(whole) - 1}/{len(whole)}"
+    assert body == whole[-4:]
+
+def test_serve_unsatisfiable_range(pack_server):
+    response, body = get(pack_server, '/config/x.cfg', {'Range': 'bytes=10-'})
+    assert response.status == 416
+    assert response.getheader('Content-Range') == 'bytes */10'
+    assert body == b''
+
+def test_serve_if_none_match(pack_server):
+    response, _ = get(pack_server, '/config/x.cfg')
+    etag = response.getheader('ETag')
+    response, body = get(pack_server, '/config/x.cfg', {'If-None-Match': f'"other", {etag}'})
+    assert response.status == 304
+    assert response.getheader('ETag') == etag
+    assert body == b''
+    response, _ = get(pack_server, '/config/x.cfg', {'If-None-Match': '"other"'})
+    assert response.status == 200
+
+def test_serve_if_modified_since(pack_server):
+    response, _ = get(pack_server, '/config/x.cfg')
+    last_modified = response.getheader('Last-Modified')
+    response, _ = get(pack_server, '/config/x.cfg', {'If-Modified-Since': last_modified})
+    assert response.status == 304
+    response, _ = get(pack_server, '/config/x.cfg', {'If-Modified-Since': 'Thu, 01 Jan 1970 00:00:00 GMT'})
+    assert response.status == 200
+
+def test_serve_if_range(pack_server):
+    response, _ = get(pack_server, '/config/x.cfg')
+    etag = response.getheader('ETag')
+    last_modified = response.getheader('Last-Modified')
+    for validator in (etag, last_modified):
+        response, body = get(pack_server, '/config/x.cfg', {'Range': 'bytes=0-1', 'If-Range': validator})
+        assert response.status == 206
+        assert body == b'01'
+    # A range of another version of the file is answered with the whole file
+    response, body = get(pack_server, '/config/x.cfg', {'Range': 'bytes=0-1', 'If-Range': '"stale"'})
+    assert response.status == 200
+    assert body == CONFIG_BODY
+
+def test_serve_head_and_missing(pack_server):
+    response, body = get(pack_server, '/config/x.cfg', method='HEAD')
+    assert response.status == 200
+    assert response.getheader('Content-Length') == '10'
+    assert body == b''
+    response, _ = get(pack_server, '/missing.cfg')
+    assert response.status == 404
+    response, _ = get(pack_server, '/store/sha1/00/x.jar')
+    assert response.status == 404